@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Writes synthetic projects of a given size, for the benchmarks.
+import argparse
+import csv
+import os
+import random
+from datetime import date
+
+FIRST_DAY = date(2016, 1, 1).toordinal()
+
+
+def user_names(users):
+    return ['user{}'.format(i) for i in range(users)]
+
+
+def write_ledger(path, rows, users, seed=0, rows_per_day=50):
+    rng = random.Random(seed)
+    with open(path, 'w') as fd:
+        writer = csv.writer(fd)
+        writer.writerow(['Description', 'Date'] + user_names(users))
+        for i in range(rows):
+            amounts = [''] * users
+            # most contributions are made by one user, some by two
+            for j in rng.sample(range(users), min(users, rng.choice((1, 1,
+                                                                    2)))):
+                amounts[j] = '{:.2f}'.format(rng.uniform(1, 200))
+            writer.writerow(['contribution {}'.format(i),
+                             date.fromordinal(FIRST_DAY + i // rows_per_day)
+                             .isoformat()] + amounts)
+
+
+def write_project(data_dir, name, rows, users, total=None, seed=0):
+    if total is None:
+        filename = '{}.csv'.format(name)
+    else:
+        filename = '{}_({}).csv'.format(name, total)
+    write_ledger(os.path.join(data_dir, filename), rows, users, seed)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes synthetic SRMLF '
+                                     'projects')
+    parser.add_argument('data_dir', help='Directory to write the projects in')
+    parser.add_argument('-r', '--rows', help='Rows by project (default: '
+                        '100000)', type=int, default=100000)
+    parser.add_argument('-u', '--users', help='Users by project (default: '
+                        '10)', type=int, default=10)
+    parser.add_argument('-p', '--projects', help='Number of projects '
+                        '(default: 1)', type=int, default=1)
+    parser.add_argument('-s', '--seed', help='Random seed (default: 0)',
+                        type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    for i in range(args.projects):
+        write_project(args.data_dir, 'bench{}'.format(i), args.rows,
+                      args.users, seed=args.seed + i)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# Times the main operations of SRMLF on a synthetic project, and writes the
+# results as JSON. Each benchmark runs on a fresh copy of the project.
+#
+#     python benchmarks/run.py --rows 100000 --users 10 -o results.json
+#     python benchmarks/run.py --compare results.json
+import argparse
+import json
+import locale
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+from contextlib import redirect_stderr, redirect_stdout
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+import ledger  # noqa
+from srmlf import project  # noqa
+from srmlf.srmlf import main  # noqa
+
+PROJECT = 'bench'
+BENCHMARKS = OrderedDict()
+
+
+# A benchmark is given the name of the project and returns the function to
+# time, so that its setup is not timed.
+def benchmark(func):
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+
+@benchmark
+def bench_init(name):
+    return lambda: project.Project(name)
+
+
+@benchmark
+def bench_init_lazy(name):
+    return lambda: project.Project(name, lazy=True)
+
+
+@benchmark
+def bench_add_save(name):
+    def add_save():
+        p = project.Project(name, lazy=True)
+        p.add_contribs('benchmark', [('user0', 1.5)])
+        p.save(append=True)
+    return add_save
+
+
+@benchmark
+def bench_add_save_rewrite(name):
+    def add_save():
+        p = project.Project(name)
+        p.add_contribs('benchmark', [('user0', 1.5)])
+        p.save()
+    return add_save
+
+
+@benchmark
+def bench_total_contribs(name):
+    p = project.Project(name, lazy=True)
+    return p.get_total_contribs
+
+
+@benchmark
+def bench_total_contribs_loaded(name):
+    p = project.Project(name)
+    return p.get_total_contribs
+
+
+@benchmark
+def bench_prettify(name):
+    p = project.Project(name)
+    return lambda: str(p.prettify())
+
+
+def run_main(*argv):
+    with patch('sys.argv', ['srmlf'] + list(argv)):
+        main()
+
+
+@benchmark
+def bench_main_view(name):
+    return lambda: run_main('view', name)
+
+
+@benchmark
+def bench_main_add(name):
+    return lambda: run_main('add', name, 'benchmark', 'user0:1.5')
+
+
+def run(names, rows, users, repeat):
+    results = OrderedDict()
+    source = tempfile.mkdtemp(prefix='srmlf-bench-')
+    devnull = open(os.devnull, 'w')
+    try:
+        ledger.write_project(source, PROJECT, rows, users)
+        for name in names:
+            data_dir = os.path.join(tempfile.mkdtemp(prefix='srmlf-bench-'),
+                                    'data')
+            shutil.copytree(source, data_dir)
+            with patch('srmlf.project.DATA_DIR', data_dir), \
+                    patch('srmlf.srmlf.DATA_DIR', data_dir), \
+                    redirect_stdout(devnull), redirect_stderr(devnull):
+                times = timeit.repeat(BENCHMARKS[name](PROJECT), number=1,
+                                      repeat=repeat)
+            shutil.rmtree(os.path.dirname(data_dir))
+            results[name] = OrderedDict([('min', min(times)),
+                                         ('median', statistics.median(times)),
+                                         ('times', times)])
+            print('{:<24} {:10.4f}s'.format(name, min(times)),
+                  file=sys.stderr)
+    finally:
+        devnull.close()
+        shutil.rmtree(source)
+    return results
+
+
+# Benchmarks whose best time grew by more than tolerance (a ratio) since the
+# baseline results
+def regressions(results, baseline, tolerance):
+    for name, result in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is not None and \
+                result['min'] > before['min'] * (1 + tolerance):
+            yield name, before['min'], result['min']
+
+
+def main_bench():
+    # like srmlf.main(), amounts and dates are formatted with the locale
+    pref_locale = locale.getlocale()[0]
+    locale.setlocale(locale.LC_TIME, pref_locale)
+    locale.setlocale(locale.LC_MONETARY, pref_locale)
+
+    parser = argparse.ArgumentParser(description='SRMLF benchmarks')
+    parser.add_argument('-r', '--rows', help='Rows of the project (default: '
+                        '100000)', type=int, default=100000)
+    parser.add_argument('-u', '--users', help='Users of the project '
+                        '(default: 10)', type=int, default=10)
+    parser.add_argument('-n', '--repeat', help='Runs of each benchmark '
+                        '(default: 5)', type=int, default=5)
+    parser.add_argument('-o', '--output', help='File to write the JSON '
+                        'results to (default: standard output)')
+    parser.add_argument('-c', '--compare', help='JSON results to compare '
+                        'with, exits with an error on regressions')
+    parser.add_argument('-t', '--tolerance', help='Slowdown allowed by '
+                        '--compare, as a ratio (default: 0.2)', type=float,
+                        default=0.2)
+    parser.add_argument('benchmarks', help='Benchmarks to run, among {} '
+                        '(default: all of them)'.format(', '.join(BENCHMARKS)),
+                        nargs='*')
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('Unknown benchmarks: {}'.format(', '.join(unknown)))
+
+    results = OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('rows', args.rows),
+        ('users', args.users),
+        ('repeat', args.repeat),
+        ('benchmarks', run(args.benchmarks or list(BENCHMARKS), args.rows,
+                           args.users, args.repeat)),
+    ])
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(results, fd, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as fd:
+            baseline = json.load(fd)
+        slower = list(regressions(results, baseline, args.tolerance))
+        for name, before, after in slower:
+            print('{} is slower: {:.4f}s -> {:.4f}s'
+                  .format(name, before, after), file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -1 +1,2 @@
 from .srmlf import main  # noqa
+from .workspace import Workspace  # noqa
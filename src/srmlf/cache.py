@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import locale
+import logging
+import os
+
+from .columns import META_FIELDS
+
+# size of the blocks read to hash the file up to the cached offset, which
+# detects files that were modified instead of appended to
+BLOCK_SIZE = 1 << 16
+CACHE_KEYS = {'fieldnames', 'totals', 'days', 'count', 'size', 'mtime',
+              'offset', 'hash'}
+
+logger = logging.getLogger('srmlf')
+
+
+def cache_path(path):
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, '.{}.totals'.format(basename))
+
+
+# Adds the amounts of the rows to totals, and to the totals of their day in
+# days (keyed by ISO date) when given.
+def sum_csv(fd, fieldnames, totals, days=None):
+    users = [(i, f) for i, f in enumerate(fieldnames)
+             if f not in META_FIELDS]
+    date_index = fieldnames.index('Date') if 'Date' in fieldnames else None
+    count = 0
+    for row in csv.reader(fd):
+        if not row:
+            continue
+        count += 1
+        day = None
+        if days is not None and date_index is not None:
+            day = days.setdefault(row[date_index][:10], {})
+        for i, user in users:
+            if i < len(row) and row[i]:
+                totals[user] = totals.get(user, 0.0) + float(row[i])
+                if day is not None:
+                    day[user] = day.get(user, 0.0) + float(row[i])
+    return count
+
+
+# Drops the cache of a file changed in place, whose unchanged end would
+# otherwise pass for an append
+def invalidate(path):
+    try:
+        os.remove(cache_path(path))
+    except FileNotFoundError:
+        pass
+
+
+# Updates hasher with the bytes of fd from start to end, and returns it
+def _hash_region(fd, start, end, hasher=None):
+    import hashlib
+    hasher = hashlib.sha1() if hasher is None else hasher
+    fd.seek(start)
+    while start < end:
+        block = fd.read(min(BLOCK_SIZE, end - start))
+        if not block:
+            break
+        hasher.update(block)
+        start += len(block)
+    return hasher
+
+
+# Raw reader of fd from its position up to the offset end, so that rows
+# appended while reading are left to the next call
+class _Region(io.RawIOBase):
+    def __init__(self, fd, end):
+        self.fd = fd
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = max(0, min(len(buffer), self.end - self.fd.tell()))
+        data = self.fd.read(size)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _read_cache(path):
+    try:
+        with open(cache_path(path), 'r') as fd:
+            cached = json.load(fd)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or not CACHE_KEYS <= set(cached):
+        return None
+    return cached
+
+
+def _write_cache(path, cached):
+    tmp_path = '{}.{}.tmp'.format(cache_path(path), os.getpid())
+    try:
+        with open(tmp_path, 'w') as fd:
+            json.dump(cached, fd)
+        os.replace(tmp_path, cache_path(path))
+    except OSError as e:
+        logger.debug('Unable to write totals cache of %s: %s', path, e)
+
+
+# Returns the fieldnames, the totals by user and the row count of a project
+# file. Only the rows appended since the cached offset are parsed when the
+# cache is still valid.
+def load_totals(path):
+    cached = _load(path)
+    return cached['fieldnames'], cached['totals'], cached['count']
+
+
+# Returns the fieldnames and the totals by user of each day of a project
+# file, as a dict keyed by ISO date.
+def load_days(path):
+    cached = _load(path)
+    return cached['fieldnames'], cached['days']
+
+
+def _load(path):
+    st = os.stat(path)
+    cached = _read_cache(path)
+    if cached is not None and cached['size'] == st.st_size and \
+            cached['mtime'] == st.st_mtime_ns:
+        return cached
+
+    with open(path, 'rb') as fd:
+        header = fd.readline()
+        encoding = locale.getpreferredencoding(False)
+        fieldnames = next(csv.reader([header.decode(encoding)]), [])
+        # the whole file up to the cached offset is hashed, as a change
+        # anywhere before it would otherwise pass for an append
+        hasher = None
+        if cached is not None and cached['offset'] is not None and \
+                cached['fieldnames'] == fieldnames and \
+                cached['offset'] <= st.st_size:
+            hasher = _hash_region(fd, 0, cached['offset'])
+            if hasher.hexdigest() != cached['hash']:
+                hasher = None
+        if hasher is not None:
+            offset = cached['offset']
+            totals = cached['totals']
+            days = cached['days']
+            count = cached['count']
+            logger.debug('Reading %s from offset %d', path, offset)
+        else:
+            offset = len(header)
+            hasher = _hash_region(fd, 0, offset)
+            totals = {}
+            days = {}
+            count = 0
+        # only the size seen by stat() is read, which is what the cache is
+        # recorded for
+        size = st.st_size
+        fd.seek(offset)
+        region = io.BufferedReader(_Region(fd, size), BLOCK_SIZE)
+        text = io.TextIOWrapper(region, encoding=encoding, newline='')
+        count += sum_csv(text, fieldnames, totals, days)
+
+        # a last line without newline may still be completed, so the end of
+        # such a file cannot be used as a starting point
+        complete = False
+        if size > 0:
+            fd.seek(size - 1)
+            complete = fd.read(1) in (b'\n', b'\r')
+        cached = {'fieldnames': fieldnames,
+                  'totals': totals,
+                  'days': days,
+                  'count': count,
+                  'size': st.st_size,
+                  'mtime': st.st_mtime_ns,
+                  'offset': size if complete else None,
+                  'hash': _hash_region(fd, offset, size,
+                                       hasher).hexdigest()}
+        _write_cache(path, cached)
+    return cached
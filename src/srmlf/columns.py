@@ -0,0 +1,252 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from operator import mul
+
+# number of CSV rows converted at once by ColumnStore.extend_csv
+CHUNK_SIZE = 4096
+# the fields which are not users. The Currency column only exists in projects
+# with contributions in other currencies than the one of the locale.
+META_FIELDS = ('Description', 'Date', 'Currency')
+
+
+# Dates are stored as YYYY-MM-DD, and many rows share the same day, hence the
+# hand written parser and the cache in front of it.
+@lru_cache(maxsize=4096)
+def parse_date(val):
+    # rows written by save() may hold a time part
+    val = val[:10]
+    if len(val) == 10 and val[4] == '-' and val[7] == '-' and \
+            val[:4].isdigit() and val[5:7].isdigit() and val[8:].isdigit():
+        try:
+            return datetime(int(val[:4]), int(val[5:7]), int(val[8:]))
+        except ValueError:
+            pass
+    return datetime.strptime(val, '%Y-%m-%d')
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(val):
+    return parse_date(val).toordinal()
+
+
+# Descriptions (and currencies) are kept in lists, dates as day ordinals and
+# amounts in one array of doubles per user. Rows are given back as
+# OrderedDict views.
+# A user column only starts at the row it was added at (its offset), earlier
+# rows read as 0.0, so adding a user does not depend on the number of rows.
+class ColumnStore(Sequence):
+
+    def __init__(self, fieldnames=()):
+        self.fieldnames = []
+        self.descriptions = []
+        self.dates = array('i')
+        self.amounts = OrderedDict()
+        self.offsets = {}
+        # currency code of each row, '' for the one of the locale, None until
+        # the Currency column is added
+        self.currencies = None
+        # whether the rows are in date order, which allows date lookups by
+        # binary search
+        self.sorted = True
+        for field in fieldnames:
+            self.add_column(field)
+
+    # Builds a store on existing columns, like the memory views of a
+    # snapshot. They are copied on the first change of the rows.
+    @classmethod
+    def from_columns(cls, fieldnames, descriptions, dates, amounts,
+                     in_order=True):
+        store = cls()
+        store.fieldnames = list(fieldnames)
+        store.descriptions = descriptions
+        store.dates = dates
+        store.amounts = OrderedDict(amounts)
+        store.offsets = {field: 0 for field in store.amounts}
+        store.sorted = in_order
+        return store
+
+    def _materialize(self):
+        if isinstance(self.dates, array):
+            return
+        self.descriptions = list(self.descriptions)
+        self.dates = array('i', self.dates)
+        for field, column in self.amounts.items():
+            self.amounts[field] = array('d', column)
+
+    def add_column(self, field):
+        if field in self.fieldnames:
+            return
+        self.fieldnames.append(field)
+        if field == 'Currency':
+            self.currencies = [''] * len(self)
+        elif field not in META_FIELDS:
+            self.amounts[field] = array('d')
+            self.offsets[field] = len(self)
+
+    def append(self, row):
+        self._materialize()
+        for field in row:
+            if field not in self.fieldnames:
+                self.add_column(field)
+        self._extend_dates([row['Date'].toordinal()])
+        self.descriptions.append(row.get('Description', ''))
+        if self.currencies is not None:
+            self.currencies.append(row.get('Currency') or '')
+        for field, column in self.amounts.items():
+            column.append(float(row.get(field) or 0.0))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def extend_csv(self, rows, fieldnames):
+        self._materialize()
+        for field in fieldnames:
+            self.add_column(field)
+        width = len(fieldnames)
+        positions = [(fieldnames.index(field), column)
+                     for field, column in self.amounts.items()
+                     if field in fieldnames]
+        missing = [column for field, column in self.amounts.items()
+                   if field not in fieldnames]
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            # blank lines are skipped, short rows are padded
+            chunk = [row if len(row) >= width else row + [''] * (width -
+                                                                 len(row))
+                     for row in chunk if row]
+            if not chunk:
+                continue
+            values = list(zip(*chunk))
+            self.descriptions.extend(values[fieldnames.index('Description')])
+            self._extend_dates([date_ordinal(v)
+                                for v in values[fieldnames.index('Date')]])
+            if self.currencies is not None:
+                self.currencies.extend(
+                    values[fieldnames.index('Currency')]
+                    if 'Currency' in fieldnames else [''] * len(chunk))
+            for i, column in positions:
+                column.extend([float(v) if v else 0.0 for v in values[i]])
+            for column in missing:
+                column.extend([0.0] * len(chunk))
+
+    def set_row(self, i, row):
+        self._materialize()
+        for field in row:
+            if field not in self.fieldnames:
+                self.add_column(field)
+        self.descriptions[i] = row.get('Description', '')
+        self.dates[i] = row['Date'].toordinal()
+        if self.currencies is not None:
+            self.currencies[i] = row.get('Currency') or ''
+        for field, column in self.amounts.items():
+            offset = self.offsets[field]
+            value = float(row.get(field) or 0.0)
+            if i < offset:
+                if not value:
+                    continue
+                # the column now starts at this row
+                column[0:0] = array('d', [0.0] * (offset - i))
+                offset = self.offsets[field] = i
+            column[i - offset] = value
+        if self.sorted:
+            self.sorted = (i == 0 or self.dates[i - 1] <= self.dates[i]) and \
+                (i == len(self) - 1 or self.dates[i] <= self.dates[i + 1])
+
+    def delete_row(self, i):
+        self._materialize()
+        del self.descriptions[i]
+        del self.dates[i]
+        if self.currencies is not None:
+            del self.currencies[i]
+        for field, column in self.amounts.items():
+            offset = self.offsets[field]
+            if i >= offset:
+                del column[i - offset]
+            else:
+                self.offsets[field] = offset - 1
+
+    def _extend_dates(self, ordinals):
+        if self.sorted and ordinals:
+            previous = self.dates[-1] if self.dates else ordinals[0]
+            self.sorted = previous <= ordinals[0] and all(
+                a <= b for a, b in zip(ordinals, islice(ordinals, 1, None)))
+        self.dates.extend(ordinals)
+
+    # Indexes of the rows dated between since and until (both included, None
+    # meaning unbounded).
+    def date_range(self, since=None, until=None):
+        since = since.toordinal() if since is not None else None
+        until = until.toordinal() if until is not None else None
+        if self.sorted:
+            start = bisect_left(self.dates, since) if since is not None \
+                else 0
+            stop = bisect_right(self.dates, until) if until is not None \
+                else len(self)
+            return range(start, max(start, stop))
+        return [i for i, date in enumerate(self.dates)
+                if (since is None or date >= since) and
+                (until is None or date <= until)]
+
+    def row(self, i):
+        line = OrderedDict()
+        for field in self.fieldnames:
+            if field == 'Description':
+                line[field] = self.descriptions[i]
+            elif field == 'Currency':
+                line[field] = self.currencies[i]
+            elif field == 'Date':
+                line[field] = datetime.fromordinal(self.dates[i])
+            else:
+                line[field] = self.get(field, i)
+        return line
+
+    def get(self, field, i):
+        offset = self.offsets[field]
+        return self.amounts[field][i - offset] if i >= offset else 0.0
+
+    # Sums of the columns of users, their amounts being multiplied by the
+    # factor of their row when factors (one by row) are given
+    def column_sums(self, users, factors=None):
+        if factors is None:
+            return [sum(self.amounts[user]) if user in self.amounts else 0.0
+                    for user in users]
+        return [sum(map(mul, self.amounts[user],
+                        islice(factors, self.offsets[user], None)))
+                if user in self.amounts else 0.0 for user in users]
+
+    # Adds the amounts of users of each day to days, keyed by day ordinal,
+    # multiplied by the factor of their row when factors are given
+    def day_sums(self, users, days=None, factors=None):
+        days = {} if days is None else days
+        columns = [(j, self.amounts[user], self.offsets[user])
+                   for j, user in enumerate(users) if user in self.amounts]
+        for i, ordinal in enumerate(self.dates):
+            sums = days.get(ordinal)
+            if sums is None:
+                sums = days[ordinal] = [0.0] * len(users)
+            factor = factors[i] if factors is not None else 1.0
+            for j, column, offset in columns:
+                if i >= offset:
+                    sums[j] += column[i - offset] * factor
+        return days
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('row index out of range')
+        return self.row(i)
+
+    def __len__(self):
+        return len(self.descriptions)
@@ -16,3 +16,11 @@ class ProjectFileUnreadableException(SRMLFException, PermissionError):
 
 class CorruptedProjectException(SRMLFException):
     pass
+
+
+class InvalidRecordException(SRMLFException):
+    pass
+
+
+class RateNotFoundException(SRMLFException):
+    pass
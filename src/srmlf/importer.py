@@ -0,0 +1,62 @@
+import argparse
+import csv
+import json
+from datetime import datetime
+
+from .exceptions import InvalidRecordException
+from .srmlf import valid_date, valid_user_contrib
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.json')) else 'csv'
+
+
+# CSV records are 'label,date,user:amount,…' lines, JSON Lines records are
+# {"label": …, "date": …, "contribs": ["user:amount", …]} objects. An empty
+# date stands for today.
+def _parse_csv(fd):
+    for row in csv.reader(fd):
+        if row:
+            if len(row) < 3:
+                raise ValueError('expected a label, a date and contributions')
+            yield row[0], row[1], row[2:]
+
+
+def _parse_jsonl(fd):
+    for line in fd:
+        if line.strip():
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('expected a JSON object')
+            contribs = record.get('contribs')
+            if isinstance(contribs, dict):
+                contribs = ['{}:{}'.format(user, amount)
+                            for user, amount in contribs.items()]
+            if not isinstance(contribs, list) or not contribs:
+                raise ValueError('expected a list of contributions')
+            yield record.get('label', ''), record.get('date') or '', contribs
+
+
+def read_records(fd, fmt='csv'):
+    parser = _parse_jsonl if fmt == 'jsonl' else _parse_csv
+    count = 0
+    try:
+        for label, date, contribs in parser(fd):
+            record = (str(label),
+                      [valid_user_contrib(str(c)) for c in contribs],
+                      valid_date(str(date)) if date else datetime.now())
+            count += 1
+            yield record
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        raise InvalidRecordException('Record {}: {}'.format(count + 1, e))
+
+
+def import_records(project, records):
+    # records are all read and checked before the project is modified
+    records = list(records)
+    for label, contribs, date in records:
+        project.add_contribs(label, contribs, date)
+    project.save(append=True)
+    return len(records)
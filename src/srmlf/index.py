@@ -0,0 +1,85 @@
+import glob
+import json
+import logging
+import os
+import re
+
+# Projects with a fixed total are stored in '<name>_(<total>).csv' files. The
+# index maps each project name to its files, so finding a project does not
+# need to scan DATA_DIR. It is rebuilt when missing or when one of the files
+# it lists has disappeared.
+INDEX_FILENAME = '.index.json'
+TOTAL_FILE_RE = re.compile(r'^(?P<base>.+)_\((?P<total>[^()]*)\)\.csv$')
+
+logger = logging.getLogger('srmlf')
+
+
+def index_path(data_dir):
+    return os.path.join(data_dir, INDEX_FILENAME)
+
+
+def parse_total(filename):
+    match = TOTAL_FILE_RE.match(os.path.basename(filename))
+    if match is None:
+        return None
+    return float(match.group('total'))
+
+
+def _read(data_dir):
+    try:
+        with open(index_path(data_dir), 'r') as fd:
+            index = json.load(fd)
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def _write(data_dir, index):
+    tmp_path = '{}.{}.tmp'.format(index_path(data_dir), os.getpid())
+    try:
+        with open(tmp_path, 'w') as fd:
+            json.dump(index, fd)
+        os.replace(tmp_path, index_path(data_dir))
+    except OSError as e:
+        logger.debug('Unable to write project index: %s', e)
+
+
+def rebuild(data_dir):
+    logger.debug('Rebuilding project index of %s', data_dir)
+    index = {}
+    for path in glob.glob(os.path.join(glob.escape(data_dir), '*.csv')):
+        filename = os.path.basename(path)
+        match = TOTAL_FILE_RE.match(filename)
+        if match is not None:
+            index.setdefault(match.group('base'), []).append(filename)
+    _write(data_dir, index)
+    return index
+
+
+def find(data_dir, base_filename):
+    index = _read(data_dir)
+    filenames = index.get(base_filename) if index is not None else None
+    if filenames is None or not all(
+            os.path.isfile(os.path.join(data_dir, f)) for f in filenames):
+        filenames = rebuild(data_dir).get(base_filename, [])
+    return filenames
+
+
+def add(data_dir, filename):
+    match = TOTAL_FILE_RE.match(filename)
+    index = _read(data_dir)
+    if match is None or index is None:
+        return
+    filenames = index.setdefault(match.group('base'), [])
+    if filename not in filenames:
+        filenames.append(filename)
+        _write(data_dir, index)
+
+
+def list_projects(data_dir):
+    names = set()
+    for path in glob.glob(os.path.join(glob.escape(data_dir), '*.csv')):
+        filename = os.path.basename(path)
+        match = TOTAL_FILE_RE.match(filename)
+        names.add(match.group('base') if match else filename[:-len('.csv')])
+    return sorted(names)
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import zlib
+
+from .columns import parse_date
+from .exceptions import SRMLFException
+
+# The journal of a project file holds the changes made since the file was
+# last written, so that adding a contribution only costs the write and fsync
+# of a small record. Its first line gives the size and mtime of the project
+# file it applies to. Before the file is rewritten (by `srmlf compact` or a
+# full save), a compacted record gives those of the new file, so that the
+# journal is ignored once merged, even when compacting is interrupted before
+# removing it. A file changed by anything else leaves an orphaned journal,
+# still read but not written to until merged.
+#
+# Each following line is a record of an added, changed or deleted row, rows
+# being numbered in the order of the file then of the journal. A record is
+# written as the CRC32 of its JSON text followed by the text. A record
+# interrupted by a crash fails the check, and is ignored along with anything
+# after it.
+#
+# Nothing is appended after a compacted record which applies to the file, so
+# whether the journal applies is told by its first and last lines only, and
+# appending does not read the records.
+
+logger = logging.getLogger('srmlf')
+
+# size of the blocks read backwards from the end of the journal to find its
+# last line
+BLOCK_SIZE = 4096
+
+
+def journal_path(path):
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, '.{}.journal'.format(basename))
+
+
+def _line(record):
+    text = json.dumps(record, separators=(',', ':'))
+    return '{:08x} {}\n'.format(zlib.crc32(text.encode('utf-8')), text)
+
+
+def _parse(line):
+    crc, _, text = line.rstrip('\n').partition(' ')
+    if not line.endswith('\n') or \
+            '{:08x}'.format(zlib.crc32(text.encode('utf-8'))) != crc:
+        raise ValueError('Invalid journal record')
+    return json.loads(text)
+
+
+def _base(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def _read_lines(path):
+    try:
+        with open(journal_path(path), 'r', encoding='utf-8') as fd:
+            return fd.readlines()
+    except FileNotFoundError:
+        return []
+
+
+def _records(path, lines):
+    records = []
+    for line in lines:
+        try:
+            records.append(_parse(line))
+        except ValueError:
+            logger.warning('Ignoring an incomplete record of %s',
+                           journal_path(path))
+            break
+    return records
+
+
+# The last line of fd, which does not start before offset start
+def _last_line(fd, start):
+    end = fd.seek(0, os.SEEK_END)
+    size = BLOCK_SIZE
+    while True:
+        offset = max(start, end - size)
+        fd.seek(offset)
+        data = fd.read(end - offset)
+        i = data.rfind(b'\n', 0, len(data) - 1)
+        if i >= 0:
+            return data[i + 1:]
+        if offset == start:
+            return data
+        size *= 2
+
+
+def _parse_bytes(line):
+    try:
+        return _parse(line.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+# State of the journal of the file at path: None when there is no journal,
+# or when it has been merged into the file (which then has the size and mtime
+# of its last, compacted, record), 'live' when it applies to the file, and
+# 'orphaned' when the file has been changed by something else since the
+# journal was started
+def _state(path):
+    try:
+        with open(journal_path(path), 'rb') as fd:
+            header = fd.readline()
+            last = _last_line(fd, len(header)) if header else b''
+    except FileNotFoundError:
+        return None
+    if not header:
+        return None
+    base = _base(path)
+    if last and _parse_bytes(last) == dict(base, op='compacted'):
+        return None
+    return 'live' if _parse_bytes(header) == base else 'orphaned'
+
+
+# The records of the journal of the project file at path. Those of an
+# orphaned journal are still given, until it is merged by compacting.
+def read(path):
+    state = _state(path)
+    if state is None:
+        return []
+    if state == 'orphaned':
+        logger.warning('%s has changed since its journal was started, run '
+                       'srmlf compact to merge it', path)
+    return [record for record in _records(path, _read_lines(path)[1:])
+            if record.get('op') != 'compacted']
+
+
+# Whether the file has a journal still to be merged into it
+def is_live(path):
+    return _state(path) is not None
+
+
+def _write(path, data, mode):
+    with open(journal_path(path), mode, encoding='utf-8') as fd:
+        fd.write(data)
+        fd.flush()
+        os.fsync(fd.fileno())
+
+
+# Writes the records to the journal, starting a new one if needed. Callers
+# hold the lock of the project.
+def append(path, records):
+    data = ''.join(_line(record) for record in records)
+    state = _state(path)
+    if state == 'orphaned':
+        raise SRMLFException('{} has changed since its journal was started, '
+                             'run srmlf compact to merge it first'
+                             .format(os.path.basename(path)))
+    if state == 'live':
+        _write(path, data, 'a')
+        return
+    tmp_path = '{}.{}.tmp'.format(journal_path(path), os.getpid())
+    with open(tmp_path, 'w', encoding='utf-8') as fd:
+        fd.write(_line(_base(path)) + data)
+        fd.flush()
+        os.fsync(fd.fileno())
+    os.replace(tmp_path, journal_path(path))
+
+
+# Records that the journal is about to be merged into the file at new_path,
+# which is going to replace the file at path, so that it is not replayed over
+# that file if it is not removed afterwards
+def mark_compacted(path, new_path):
+    if _state(path) is not None:
+        st = os.stat(new_path)
+        _write(path, _line({'op': 'compacted', 'size': st.st_size,
+                            'mtime': st.st_mtime_ns}), 'a')
+
+
+def remove(path):
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def _row_record(op, line, users):
+    record = {'op': op,
+              'description': line['Description'],
+              'date': line['Date'].strftime('%Y-%m-%d'),
+              'amounts': {user: line[user] for user in users if line[user]}}
+    if line.get('Currency'):
+        record['currency'] = line['Currency']
+    return record
+
+
+def add_record(line, users):
+    return _row_record('add', line, users)
+
+
+# Record of the change of the row numbered number (from 1) to line, or of its
+# deletion when line is None
+def change_record(number, line, users):
+    if line is None:
+        return {'op': 'rm', 'row': number}
+    record = _row_record('edit', line, users)
+    record['row'] = number
+    return record
+
+
+def appends_only(records):
+    return all(record.get('op') == 'add' for record in records)
+
+
+# Applies the records to a ColumnStore
+def replay(records, store):
+    for record in records:
+        op = record.get('op')
+        if op not in ('add', 'edit', 'rm'):
+            raise ValueError('Unknown journal operation: {}'.format(op))
+        if op != 'add' and not 1 <= record['row'] <= len(store):
+            raise ValueError('No row {} to change'.format(record['row']))
+        if op == 'rm':
+            store.delete_row(record['row'] - 1)
+            continue
+        row = {'Description': record['description'],
+               'Date': parse_date(record['date'])}
+        row.update(record['amounts'])
+        if 'currency' in record:
+            row['Currency'] = record['currency']
+        if op == 'edit':
+            store.set_row(record['row'] - 1, row)
+        else:
+            store.append(row)
@@ -1,175 +1,842 @@
 import csv
+import io
 import os
 import logging
 import locale
 from collections import OrderedDict
-import glob
-from datetime import datetime
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
 
-import prettytable
-from termcolor import colored
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
+from . import index, journal, rates, rowindex, snapshot
+from .cache import load_days, load_totals
+from .columns import META_FIELDS, ColumnStore, date_ordinal, parse_date
 from .exceptions import \
-    (ProjectNotFoundException, ProjectDuplicateException,
+    (SRMLFException, ProjectNotFoundException, ProjectDuplicateException,
      ProjectFileUnreadableException, CorruptedProjectException)
 
 DATA_DIR = os.path.join(os.getcwd(), 'srmlf_data')
 
 
+# termcolor and prettytable are imported on first use, so that commands which
+# do not render anything do not pay for them
+def colored(*args, **kwargs):
+    from termcolor import colored
+    return colored(*args, **kwargs)
+
+
+# Amounts in another currency than the one of the locale are followed by its
+# code
+def format_amount(v, currency=''):
+    if not currency:
+        return locale.currency(v)
+    return '{} {}'.format(locale.currency(v, symbol=False), currency)
+
+
+# Formats the cells of one rendering. The locale date format is looked up
+# once, and dates and amounts, which are often repeated, are only formatted
+# once each. Without color, cells are not wrapped in ANSI sequences.
+class CellFormatter:
+
+    def __init__(self, color=True):
+        self.color = color
+        self.date_format = locale.nl_langinfo(locale.D_FMT)
+        self.dates = {}
+        self.amounts = {}
+
+    def colored(self, v, *args, **kwargs):
+        return colored(v, *args, **kwargs) if self.color else v
+
+    def format(self, k, v, currency=''):
+        if k == 'Description':
+            return self.colored(v, 'blue')
+        elif k == 'Date':
+            return self.date(v)
+        elif k == 'Currency':
+            return v
+        else:
+            return self.amount(v, currency)
+
+    def date(self, v):
+        cell = self.dates.get(v)
+        if cell is None:
+            if not isinstance(v, datetime):
+                raise ValueError('{} is not a valid date'.format(v))
+            cell = self.colored(v.strftime(self.date_format), 'cyan')
+            self.dates[v] = cell
+        return cell
+
+    def amount(self, v, currency=''):
+        if not v:
+            return ''
+        cell = self.amounts.get((v, currency))
+        if cell is None:
+            cell = self.amounts[v, currency] = format_amount(v, currency)
+        return cell
+
+    def row(self, line, fieldnames):
+        currency = line.get('Currency') or ''
+        return [self.format(k, line.get(k, 0.0), currency)
+                for k in fieldnames]
+
+
+def _check_fieldnames(fieldnames):
+    if fieldnames is None or 'Description' not in fieldnames or\
+            'Date' not in fieldnames:
+        raise KeyError('Invalid CSV fieldnames')
+
+
+def _parse_rows(reader, fieldnames):
+    for item in reader:
+        ordered_item = OrderedDict()
+        for field in fieldnames:
+            # rows older than a user column are shorter than the header
+            val = item.get(field) or ''
+            if field == 'Date':
+                val = parse_date(val)
+            elif field not in META_FIELDS:
+                val = float(val) if val != '' else 0.0
+            ordered_item[field] = val
+        yield ordered_item
+
+
+def _sum_rows(rows, users, totals=None):
+    totals = [0.0] * len(users) if totals is None else totals
+    count = 0
+    for item in rows:
+        count += 1
+        for i, user in enumerate(users):
+            val = item.get(user)
+            if val:
+                totals[i] += float(val)
+    return totals, count
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as fd:
+        fd.seek(0, os.SEEK_END)
+        if fd.tell() == 0:
+            return True
+        fd.seek(-1, os.SEEK_END)
+        return fd.read(1) in (b'\n', b'\r')
+
+
+# size and modification time of a file, None when it does not exist
+def _stat_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
 class Project:
 
-    def __init__(self, project_name):
-        self.data = []
+    # Callables called with the name, the wall time (in seconds, without the
+    # time of the phases nested in it) and the memory peak (in bytes, None
+    # unless tracemalloc is tracing) of each phase of the work on projects:
+    # resolve, parse, add_user, totals, format, render and save.
+    hooks = []
+    # time spent in the nested phases of each phase under way
+    _running = []
+    # currency the totals are converted to, None for the one of the locale
+    currency = None
+    # whether a binary snapshot of the rows is kept next to the CSV file, to
+    # be mapped in memory instead of parsing the file (see snapshot.py)
+    snapshot = False
+    # whether contributions are appended to the journal of the project, to be
+    # merged into the CSV file by compact() (see journal.py)
+    journal = False
+    # whether the journal is still to be read, lazy projects only reading it
+    # once their users or rows are needed, so that adding rows does not
+    # read it
+    _journal_unread = False
+
+    def __init__(self, project_name, lazy=False, data_dir=None):
+        # when lazy and until loaded, self.data only holds the rows added
+        # since opening which are not in the file (the unsaved and, once it
+        # is read, journaled ones)
+        self.data = ColumnStore()
+        self.data_dir = data_dir if data_dir is not None else DATA_DIR
+        self.loaded = False
         self.fieldnames = []
         self.logger = logging.getLogger('srmlf')
         self.name = project_name
         base_filename = project_name.replace('/', '-').replace(' ', '_')
         self.filename = '{}.csv'.format(base_filename)
         self.total = None
-        if not os.path.isfile(os.path.join(DATA_DIR, self.filename)):
-            g = glob.glob(os.path.join(DATA_DIR,
-                                       '{}_(*).csv'.format(base_filename)))
-            if len(g) != 1:
-                if len(g) == 0:
-                    raise ProjectNotFoundException('Project {} is not found.'
-                                                   .format(project_name))
-                else:
-                    raise ProjectDuplicateException(('Project {} has been '
-                                                     'found in many files')
-                                                    .format(project_name))
-            self.filename = g[0]
-            self.total = float(os.path.basename(self.filename)
-                               .replace('{}_('.format(base_filename), '')
-                               .replace(').csv', ''))
+        # number of rows of self.data already written in the CSV file or in
+        # its journal, the first _journaled ones being in the journal
+        self._saved = 0
+        self._journaled = 0
+        self._lock_fd = None
+        self._lock_depth = 0
+        with self.phase('resolve'):
+            self._resolve(base_filename)
+
+        self._stamp = self._file_stamp()
+        with self.phase('parse'), self._open_reader() as self.reader:
+            if lazy:
+                # only the header is read, rows are streamed when needed
+                self.fieldnames = self.reader.fieldnames
+                _check_fieldnames(self.fieldnames)
+                self._journal_unread = True
+                return
+            records = journal.read(self.path)
+            if self.snapshot:
+                self.fieldnames = self.reader.fieldnames
+                self.data = self._read_rows(self.reader)
+                self._replay_journal(records)
+                self.loaded = True
+            else:
+                self._consume_reader()
+                self._replay_journal(records)
+                self.loaded = True
+            self._saved = len(self.data)
+
+    def _resolve(self, base_filename):
+        if os.path.isfile(self.path):
+            return
+        g = index.find(self.data_dir, base_filename)
+        if len(g) != 1:
+            if len(g) == 0:
+                raise ProjectNotFoundException('Project {} is not found.'
+                                               .format(self.name))
+            else:
+                raise ProjectDuplicateException(('Project {} has been '
+                                                 'found in many files')
+                                                .format(self.name))
+        self.filename = g[0]
+        self.total = index.parse_total(self.filename)
+
+    @property
+    def path(self):
+        return os.path.join(self.data_dir, self.filename)
+
+    # The users of the journal are only known once it is read
+    @property
+    def fieldnames(self):
+        self._read_journal()
+        return self._fieldnames
+
+    @fieldnames.setter
+    def fieldnames(self, fieldnames):
+        self._fieldnames = fieldnames
+
+    # Stamps of the file and of its journal, taken before reading them, tell
+    # whether another process changed them since
+    def _file_stamp(self):
+        return (_stat_stamp(self.path),
+                _stat_stamp(journal.journal_path(self.path)))
+
+    def _is_current(self):
+        return self._stamp is None or self._stamp == self._file_stamp()
+
+    @classmethod
+    def add_hook(cls, hook):
+        cls.hooks.append(hook)
+
+    @classmethod
+    def remove_hook(cls, hook):
+        cls.hooks.remove(hook)
 
+    @contextmanager
+    def phase(self, name):
+        if not self.hooks:
+            yield
+            return
+        import tracemalloc
+        tracing = tracemalloc.is_tracing()
+        # the peak of the phase a phase is nested in would be lost
+        if tracing and not self._running and \
+                hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        nested = [0.0]
+        self._running.append(nested)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._running.pop()
+            if self._running:
+                self._running[-1][0] += duration
+            peak = tracemalloc.get_traced_memory()[1] if tracing else None
+            for hook in list(self.hooks):
+                hook(name, duration - nested[0], peak)
+
+    @contextmanager
+    def _open_reader(self):
+        with self._file_errors():
+            self.logger.debug('Opening %s', self.path)
+            with open(self.path, 'r') as fd:
+                yield csv.DictReader(fd)
+
+    @contextmanager
+    def _file_errors(self):
         try:
-            self.logger.debug('Opening %s',
-                              os.path.join(DATA_DIR, self.filename))
-            with open(os.path.join(DATA_DIR, self.filename), 'r') as fd:
-                self.reader = csv.DictReader(fd)
-                try:
-                    self._consume_reader()
-                except (KeyError, ValueError) as e:
-                    raise CorruptedProjectException(e)
+            try:
+                yield
+            except (KeyError, ValueError) as e:
+                raise CorruptedProjectException(e)
         except FileNotFoundError:
             raise ProjectNotFoundException('Project {} is not found.'
-                                           .format(project_name))
+                                           .format(self.name))
         except PermissionError:
             raise ProjectFileUnreadableException('Project {} is not found.'
-                                                 .format(project_name))
+                                                 .format(self.name))
 
     def _consume_reader(self):
         self.fieldnames = self.reader.fieldnames
-        if 'Description' not in self.fieldnames or 'Date' not in\
-                self.fieldnames:
-            raise KeyError('Invalid CSV fieldnames')
-        for item in self.reader:
-            ordered_item = OrderedDict()
-            for field in self.fieldnames:
-                val = item.get(field, '')
-                if field == 'Date':
-                    val = datetime.strptime(val, '%Y-%m-%d')
-                elif field != 'Description':
-                    val = float(val) if val != '' else 0.0
-                ordered_item[field] = val
-            self.data.append(ordered_item)
+        _check_fieldnames(self.fieldnames)
+        # the header has been read, the raw rows are left in reader.reader
+        self.data.extend_csv(self.reader.reader, self.fieldnames)
+
+    # Rows of the file, mapped from its snapshot when it is up to date. The
+    # file is checked before reading it, so that a snapshot never claims to
+    # hold rows appended while it was read.
+    def _read_rows(self, reader):
+        _check_fieldnames(reader.fieldnames)
+        if self.snapshot:
+            st = os.stat(self.path)
+            data = snapshot.read(self.path, reader.fieldnames)
+            if data is not None:
+                return data
+        data = ColumnStore(reader.fieldnames)
+        data.extend_csv(reader.reader, reader.fieldnames)
+        if self.snapshot:
+            snapshot.write(self.path, data, st)
+        return data
+
+    # Applies the records of the journal to self.data, and adds their users to
+    # the fieldnames. Returns the number of records.
+    def _replay_journal(self, records):
+        with self._file_errors():
+            journal.replay(records, self.data)
+        for field in self.data.fieldnames:
+            if field not in self._fieldnames:
+                self._fieldnames.append(field)
+        return len(records)
+
+    # Reads the journal of a lazy project. Its added rows go before the unsaved
+    # ones, its changed and deleted rows need the whole project.
+    def _read_journal(self):
+        if not self._journal_unread:
+            return
+        self._journal_unread = False
+        self._stamp = self._file_stamp()
+        with self._file_errors():
+            records = journal.read(self.path)
+        if not journal.appends_only(records):
+            self._reload(records)
+            return
+        pending = self.data[self._saved:]
+        self.data = ColumnStore(self._fieldnames)
+        self._journaled = self._saved = self._replay_journal(records)
+        self.data.extend(pending)
+
+    def load(self):
+        self._read_journal()
+        if self.loaded:
+            return
+        # the journal was read on opening
+        self._stamp = _stat_stamp(self.path), self._stamp[1]
+        with self.phase('parse'), self._open_reader() as reader:
+            data = self._read_rows(reader)
+        for field in self.fieldnames:
+            data.add_column(field)
+        # the rows added since opening which were saved are in the file,
+        # except for the journaled ones
+        data.extend(self.data[:self._journaled])
+        pending = self.data[self._saved:]
+        self._saved = len(data)
+        self._journaled = 0
+        data.extend(pending)
+        self.data = data
+        self.loaded = True
+
+    # Reads the file and its journal (unless its records are given) again,
+    # keeping the unsaved rows. Returns the number of journal records.
+    def _reload(self, records=None):
+        pending = self.data[self._saved:]
+        if records is None:
+            self._stamp = self._file_stamp()
+            with self._file_errors():
+                records = journal.read(self.path)
+        self.data = ColumnStore()
+        self.loaded = False
+        self._journal_unread = False
+        self._saved = self._journaled = 0
+        self.load()
+        self._replay_journal(records)
+        self._saved = len(self.data)
+        self.data.extend(pending)
+        return len(records)
+
+    # Loads the project, again if another process saved it since it was read.
+    # Only sound under lock().
+    def _load_current(self):
+        self.load()
+        if not self._is_current():
+            self.logger.debug('Reloading %s, changed since read', self.path)
+            self._reload()
+
+    def iter_data(self):
+        self._read_journal()
+        if not self.loaded:
+            with self._open_reader() as reader:
+                store = snapshot.read(self.path, reader.fieldnames) \
+                    if self.snapshot else None
+                if store is not None:
+                    # the rows of the snapshot miss the users added since
+                    for line in store:
+                        for user in self.users:
+                            line.setdefault(user, 0.0)
+                        yield line
+                else:
+                    _check_fieldnames(reader.fieldnames)
+                    yield from _parse_rows(reader, self.fieldnames)
+        yield from self.data
+
+    @property
+    def users(self):
+        return [f for f in self.fieldnames if f not in META_FIELDS]
 
     def _format(self, k, v):
-        if k == 'Description':
-            return colored(v, 'blue')
-        elif k == 'Date':
-            if not isinstance(v, datetime):
-                raise ValueError('\s is not a valid date', v)
-            date = v.strftime(locale.nl_langinfo(locale.D_FMT))
-            return colored(date, 'cyan')
-        else:
-            if v != 0:
-                return locale.currency(v)
-            else:
-                return ''
+        return CellFormatter().format(k, v)
 
     def add_user(self, user):
-        if user in self.fieldnames:
+        if user in META_FIELDS:
+            raise SRMLFException('{} can not be the name of a user'
+                                 .format(user))
+        self._add_field(user)
+
+    # Adding rows does not read the journal, hence self._fieldnames
+    def _add_field(self, field):
+        if field in self._fieldnames:
             return
-        self.fieldnames.append(user)
-        for i, line in enumerate(self.data):
-            self.data[i][user] = 0
+        with self.phase('add_user'):
+            self._fieldnames.append(field)
+            self.data.add_column(field)
 
     def add_contribs(self, name, contribs, date=None):
         if date is None:
             date = datetime.now()
         line = OrderedDict()
-        for field in self.fieldnames:
+        for field in self._fieldnames:
             line[field] = 0.0
         line['Description'] = name
         line['Date'] = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        for user, amount in contribs:
-            if user not in self.fieldnames:
-                self.add_user(user)
-            line[user] = float(amount)
+        if 'Currency' in line:
+            line['Currency'] = ''
+        self._set_amounts(line, contribs)
         self.data.append(line)
 
+    # Sets the amounts of contribs, (user, amount) or (user, amount, currency)
+    # tuples, on line. A contribution is in a single currency.
+    def _set_amounts(self, line, contribs):
+        currencies = set()
+        for contrib in contribs:
+            user, amount = contrib[:2]
+            currencies.add(contrib[2] if len(contrib) > 2 else None)
+            self.add_user(user)
+            line[user] = float(amount)
+        if len(currencies) > 1:
+            raise SRMLFException('The amounts of a contribution must all be '
+                                 'in the same currency')
+        currency = currencies.pop() if currencies else None
+        if currency is not None:
+            # the Currency column is added like a user
+            self._add_field('Currency')
+            line['Currency'] = currency
+
     def get_total_contribs(self):
-        contribs = OrderedDict()
-        for item in self.data:
-            for k, v in item.items():
-                if k not in ['Description', 'Date'] and v != '':
-                    contribs[k] = contribs.get(k, 0) + float(v)
-        return list(contribs.values())
-
-    def save(self):
-        with open(os.path.join(DATA_DIR, self.filename), 'w') as fd:
+        with self.phase('totals'):
+            factors = self._factors()
+            if factors is not None:
+                return self.data.column_sums(self.users, factors) \
+                    if len(self.data) else []
+            return self._total_contribs()
+
+    # Currency the totals are in
+    def _target_currency(self):
+        return self.currency or rates.local_currency()
+
+    # Factors converting the amounts of each row to the currency of the
+    # totals, or None when they all are in it already
+    def _factors(self):
+        local = rates.local_currency()
+        target = self._target_currency()
+        if 'Currency' not in self.fieldnames and target == local:
+            return None
+        self.load()
+        currencies = self.data.currencies or [''] * len(self.data)
+        return rates.load(self.data_dir).factors(
+            [currency or local for currency in currencies], self.data.dates,
+            target)
+
+    # Total amount to reach, in the currency of the totals at today's rate
+    def target_total(self):
+        local = rates.local_currency()
+        target = self._target_currency()
+        if self.total is None or target == local:
+            return self.total
+        return self.total * rates.load(self.data_dir).factor(
+            local, date.today().toordinal(), target)
+
+    def _total_contribs(self):
+        self._read_journal()
+        if self.loaded:
+            totals = self.data.column_sums(self.users)
+            count = len(self.data)
+        else:
+            with self._file_errors():
+                fieldnames, file_totals, count = \
+                    load_totals(self.path)
+                _check_fieldnames(fieldnames)
+            totals = [file_totals.get(user, 0.0) for user in self.users]
+            totals, pending = _sum_rows(self.data, self.users, totals)
+            count += pending
+        return totals if count else []
+
+    # Totals by user of each day, as an OrderedDict of day ordinals sorted by
+    # date. The days of the file come from the totals cache.
+    def get_daily_contribs(self):
+        self._read_journal()
+        days = {}
+        factors = self._factors()
+        if not self.loaded:
+            with self._file_errors():
+                fieldnames, file_days = \
+                    load_days(self.path)
+                _check_fieldnames(fieldnames)
+                for day, sums in file_days.items():
+                    days[date_ordinal(day)] = [sums.get(user, 0.0)
+                                               for user in self.users]
+        self.data.day_sums(self.users, days, factors)
+        return OrderedDict(sorted(days.items()))
+
+    def get_shares(self, contribs=None):
+        if contribs is None:
+            contribs = self.get_total_contribs()
+        base = self.target_total() if self.total else sum(contribs)
+        return [(c / base) * 100 for c in contribs]
+
+    @contextmanager
+    def lock(self):
+        # exclusive advisory lock on the project, held by save() and by
+        # callers wanting to load, modify and save the project atomically
+        if self._lock_depth == 0:
+            self._acquire_lock()
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                self._release_lock()
+
+    def _acquire_lock(self):
+        path = self.path
+        lock_path = os.path.join(os.path.dirname(path), '.{}.lock'.format(
+            os.path.basename(path)))
+        try:
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            self.logger.debug('Unable to lock %s: %s', path, e)
+            return
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _release_lock(self):
+        if self._lock_fd is not None:
+            # closing the file descriptor releases the lock
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def save(self, append=False):
+        with self.phase('save'), self.lock():
+            # the stamp can only follow the changes made here when no other
+            # process saved the project in between
+            current = self._is_current()
+            # once started, the journal takes every append until compacted,
+            # the file must not change under it
+            if append and (self.journal or journal.is_live(self.path)):
+                self._append_journal()
+            elif append:
+                self._append()
+                if not self.loaded:
+                    # the file is read when the rows are needed
+                    self.data = ColumnStore(self._fieldnames)
+            else:
+                self._rewrite()
+            if current:
+                self._stamp = self._file_stamp()
+        self._saved = len(self.data)
+
+    def _append_journal(self):
+        users = [f for f in self._fieldnames if f not in META_FIELDS]
+        journal.append(self.path, [journal.add_record(line, users)
+                                   for line in self.data[self._saved:]])
+        if self._journal_unread:
+            # they are read along with the journal when needed
+            self.data = ColumnStore(self._fieldnames)
+        elif not self.loaded:
+            self._journaled = len(self.data)
+
+    # Merges the journal into the file, along with the unsaved rows. Returns
+    # the number of merged journal records.
+    def compact(self):
+        with self.phase('save'), self.lock():
+            # the journal may have grown since the project was opened
+            count = self._reload()
+            if count or len(self.data) > self._saved:
+                self._rewrite()
+            else:
+                journal.remove(self.path)
+        self._saved = len(self.data)
+        return count
+
+    # Number (from 1) of the saved row with this date and description
+    def find_row(self, date, description):
+        self.load()
+        numbers = [i + 1 for i in self.data.date_range(date, date)
+                   if i < self._saved and
+                   self.data.descriptions[i] == description]
+        if len(numbers) != 1:
+            raise SRMLFException('{} rows of {} match {} on {}'.format(
+                'No' if not numbers else 'Several', self.name, description,
+                date.strftime('%Y-%m-%d')))
+        return numbers[0]
+
+    def _saved_row(self, number):
+        if not 1 <= number <= self._saved:
+            raise SRMLFException('Project {} has no row {}'
+                                 .format(self.name, number))
+        return self.data[number - 1]
+
+    # Whether the rows of the file are changed through their offset (see
+    # rowindex.py), without loading the project. A journal needs it loaded.
+    def _in_file(self):
+        return not self.loaded and not self.journal and \
+            not journal.is_live(self.path)
+
+    # The saved row numbered number (from 1), only read from the file when the
+    # project is not loaded
+    def _row(self, number):
+        if not self._in_file():
+            self._load_current()
+            return self._saved_row(number)
+        with self.phase('parse'), self._file_errors():
+            text = rowindex.read_row(self.path, number)
+            if text is None:
+                raise SRMLFException('Project {} has no row {}'
+                                     .format(self.name, number))
+            encoding = locale.getpreferredencoding(False)
+            reader = csv.DictReader(io.StringIO(text.decode(encoding),
+                                                newline=''))
+            _check_fieldnames(reader.fieldnames)
+            line = next(_parse_rows(reader, reader.fieldnames))
+        # with the users added since opening
+        for field in self._fieldnames:
+            line.setdefault(field, 0.0)
+        return line
+
+    # Changes the description, date or amounts (given like for add_contribs)
+    # of the saved row numbered number (from 1)
+    def edit_row(self, number, description=None, date=None, contribs=()):
+        with self.lock():
+            line = self._row(number)
+            if description is not None:
+                line['Description'] = description
+            if date is not None:
+                line['Date'] = date.replace(hour=0, minute=0, second=0,
+                                            microsecond=0)
+            self._set_amounts(line, contribs)
+            self._change_row(number, line)
+
+    def delete_row(self, number):
+        with self.lock():
+            self._row(number)
+            self._change_row(number, None)
+
+    # Writes the change of a row to the journal when there is one, else in
+    # the file from the offset of the row on, then applies it to self.data
+    # when loaded
+    def _change_row(self, number, line):
+        with self.phase('save'):
+            path = self.path
+            if self._in_file():
+                if not rowindex.replace_row(path, number, line):
+                    # the line has users the file does not have yet
+                    self._extend_header()
+                    rowindex.replace_row(path, number, line)
+                self._stamp = self._file_stamp()
+                return
+            if self.journal or journal.is_live(path):
+                journal.append(path, [journal.change_record(number, line,
+                                                            self.users)])
+                in_place = True
+            else:
+                in_place = rowindex.replace_row(path, number, line,
+                                                self._saved)
+            if line is None:
+                self.data.delete_row(number - 1)
+                self._saved -= 1
+            else:
+                self.data.set_row(number - 1, line)
+            if not in_place:
+                # the line has users the file does not have yet
+                self._rewrite()
+            self._stamp = self._file_stamp()
+
+    def _rewrite(self):
+        self._load_current()
+        path = self.path
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as fd:
             writer = csv.DictWriter(fd, self.fieldnames)
             writer.writeheader()
             for line in self.data:
                 writer.writerow(line)
+            fd.flush()
+            os.fsync(fd.fileno())
+        # the journal does not apply to the new file anymore
+        journal.mark_compacted(path, tmp_path)
+        os.replace(tmp_path, path)
+        journal.remove(path)
+        self._stamp = self._file_stamp()
+        # appends leave the snapshot stale instead, it is written again when
+        # the project is next loaded
+        if self.snapshot:
+            snapshot.write(path, self.data, os.stat(path))
+
+    def _rewrite_header(self, fieldnames):
+        path = self.path
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(path, 'r', newline='') as src, \
+                open(tmp_path, 'w', newline='') as dst:
+            src.readline()
+            csv.writer(dst).writerow(fieldnames)
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, path)
+
+    # Adds the users of the project missing from the header of the file,
+    # which another process may have extended since the project was opened
+    def _extend_header(self):
+        with open(self.path, 'r', newline='') as fd:
+            current = next(csv.reader(fd), [])
+        fieldnames = current + [f for f in self._fieldnames
+                                if f not in current]
+        if fieldnames != current:
+            self._rewrite_header(fieldnames)
+        self._fieldnames[:] = fieldnames
+        return fieldnames
+
+    def _append(self):
+        path = self.path
+        fieldnames = self._extend_header()
+        for field in fieldnames:
+            self.data.add_column(field)
+
+        # rows are written at once, so that a crash does not leave half of
+        # them in the file
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames)
+        if not _ends_with_newline(path):
+            buf.write(writer.writer.dialect.lineterminator)
+        for line in self.data[self._saved:]:
+            writer.writerow(line)
+        with open(path, 'a') as fd:
+            fd.write(buf.getvalue())
+            fd.flush()
+            os.fsync(fd.fileno())
+
+    # Rows dated between since and until, then the last ones of them, then a
+    # page of page_size rows (pages start at 1).
+    def select_rows(self, since=None, until=None, last=None, page=None,
+                    page_size=50):
+        self.load()
+        indexes = self.data.date_range(since, until)
+        if last is not None:
+            indexes = indexes[max(0, len(indexes) - last):]
+        if page is not None:
+            indexes = indexes[(page - 1) * page_size:page * page_size]
+        return (self.data[i] for i in indexes)
 
-    def prettify(self):
-        p = prettytable.PrettyTable([colored(f, 'red')
+    # rows defaults to every row of the project, the TOTAL and percentage
+    # lines are always computed over the whole project
+    def prettify(self, totals_only=False, rows=None, color=True):
+        import prettytable
+        formatter = CellFormatter(color)
+        p = prettytable.PrettyTable([formatter.colored(f, 'red')
                                      for f in self.fieldnames])
-        for line in self.data:
-            p.add_row([self._format(k, v) for k, v in line.items()])
+        if not totals_only:
+            fieldnames = self.fieldnames
+            with self.phase('format'):
+                for line in self.iter_data() if rows is None else rows:
+                    p.add_row(formatter.row(line, fieldnames))
 
         # sum up the total
         # p.hrules = prettytable.ALL
-        contribs = self.get_total_contribs()
-        total1 = [locale.currency(float(v)) for v in contribs]
-        total2 = []
-        for i, amount in enumerate(contribs):
-            if self.total:
-                total2.append('{:.2f}%'.format((contribs[i] / self.total)*100))
-            else:
-                total2.append('{:.2f}%'
-                              .format((contribs[i] / sum(contribs))*100))
-        p.add_row(['',
-                   colored('TOTAL', attrs=['bold'])] +
-                  [colored(str(c), attrs=['bold']) for c in total1])
-        p.add_row(['',
-                   colored('({})'.format(locale.currency(self.total)),
-                           attrs=['bold'])
-                   if self.total is not None else ''] +
-                  [colored(str(c), attrs=['bold']) for c in total2])
+        for line in self.total_rows(formatter):
+            p.add_row(line)
         return p
 
+    # TOTAL and percentage lines of the table
+    def total_rows(self, formatter):
+        contribs = self.get_total_contribs()
+        target = self._target_currency()
+        # amounts in the currency of the locale are shown without code
+        currency = target if target != rates.local_currency() else ''
+        cells = {'Date': ('TOTAL', '({})'.format(format_amount(
+            self.target_total(), currency)) if self.total is not None else '')}
+        for user, c, share in zip(self.users, contribs,
+                                  self.get_shares(contribs)):
+            cells[user] = (format_amount(float(c), currency),
+                           '{:.2f}%'.format(share))
+        if contribs and 'Currency' in self.fieldnames:
+            cells['Currency'] = (target, '')
+        fieldnames = [f for f in self.fieldnames
+                      if f == 'Description' or f in cells]
+        return [[formatter.colored(cells[f][i], attrs=['bold'])
+                 if f in cells and cells[f][i] else '' for f in fieldnames]
+                for i in (0, 1)]
+
     def __str__(self):
-        return self.prettify().__str__()
+        table = self.prettify()
+        with self.phase('render'):
+            return table.__str__()
 
     @staticmethod
-    def create(project_name, users, total=None):
+    def create(project_name, users, total=None, data_dir=None):
+        data_dir = data_dir if data_dir is not None else DATA_DIR
         base_filename = project_name.replace('/', '-').replace(' ', '_')
         filename = '{}.csv'.format(base_filename)
-        if os.path.isfile(os.path.join(DATA_DIR, filename)):
+        if os.path.isfile(os.path.join(data_dir, filename)):
             raise ProjectDuplicateException('Project {} already exists'
                                             .format(project_name))
-        g = glob.glob(os.path.join(DATA_DIR,
-                      '{}_(*).csv'.format(base_filename)))
-        if len(g) > 1:
+        if len(index.find(data_dir, base_filename)) > 1:
             raise ProjectDuplicateException(('Project {} has been '
                                              'found in many files')
                                             .format(project_name))
         if total is not None:
             filename = '{}_({}).csv'.format(base_filename, total)
-        with open(os.path.join(DATA_DIR, filename), 'w') as fd:
+        with open(os.path.join(data_dir, filename), 'w') as fd:
             writer = csv.DictWriter(fd, ['Description', 'Date'] + users)
             writer.writeheader()
-        return Project(project_name)
+        index.add(data_dir, filename)
+        return Project(project_name, data_dir=data_dir)
+
+    @staticmethod
+    def list_projects(data_dir=None):
+        return index.list_projects(data_dir if data_dir is not None
+                                   else DATA_DIR)
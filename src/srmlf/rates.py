@@ -0,0 +1,117 @@
+import csv
+import locale
+import logging
+import os
+import re
+from array import array
+from bisect import bisect_right
+from datetime import date
+
+from .columns import date_ordinal
+from .exceptions import SRMLFException, RateNotFoundException
+
+# Exchange rates are kept in DATA_DIR/.rates.csv, one rate by line:
+#
+#     Date,Currency,EUR
+#     2016-01-01,USD,0.92
+#     2016-01-01,GBP,1.36
+#
+# The header names the reference currency, the rates being the value of one
+# unit of each currency in it. The rate of a currency on a day is its last
+# rate on or before that day. The file is hidden, like the other files of the
+# data directory which are not projects.
+RATES_FILENAME = '.rates.csv'
+CURRENCY_RE = re.compile(r'^[A-Z]{3}$')
+
+logger = logging.getLogger('srmlf')
+
+# loaded tables, by path, along with the size and mtime of their file
+_tables = {}
+
+
+def rates_path(data_dir):
+    return os.path.join(data_dir, RATES_FILENAME)
+
+
+# ISO code of the currency of the locale, which amounts without currency are
+# in, or '' when the locale has none
+def local_currency():
+    return locale.localeconv()['int_curr_symbol'].strip()
+
+
+class RateTable:
+
+    def __init__(self, reference=None, rates=None):
+        self.reference = reference
+        # day ordinals and rates of each currency, by date
+        self.rates = rates if rates is not None else {}
+        # conversion factors already looked up, by (currency, day, target),
+        # rows of a project sharing few of them
+        self._factors = {}
+
+    def rate(self, currency, ordinal):
+        if currency == self.reference:
+            return 1.0
+        days, rates = self.rates.get(currency, ((), ()))
+        i = bisect_right(days, ordinal)
+        if not i:
+            raise RateNotFoundException('No {} rate on or before {} in {}'
+                                        .format(currency or 'local currency',
+                                                date.fromordinal(ordinal),
+                                                RATES_FILENAME))
+        return rates[i - 1]
+
+    # Value in target of one unit of currency on the day
+    def factor(self, currency, ordinal, target):
+        key = (currency, ordinal, target)
+        factor = self._factors.get(key)
+        if factor is None:
+            factor = 1.0 if currency == target else \
+                self.rate(currency, ordinal) / self.rate(target, ordinal)
+            self._factors[key] = factor
+        return factor
+
+    # Conversion factors to target of rows of the given currencies and day
+    # ordinals
+    def factors(self, currencies, ordinals, target):
+        return array('d', map(self.factor, currencies, ordinals,
+                              [target] * len(ordinals)))
+
+
+def _parse(fd):
+    reader = csv.reader(fd)
+    header = next(reader, [])
+    if len(header) != 3 or header[:2] != ['Date', 'Currency'] or \
+            not CURRENCY_RE.match(header[2]):
+        raise ValueError('Invalid header')
+    rates = {}
+    for row in reader:
+        if row:
+            day, currency, rate = row
+            rates.setdefault(currency, []).append((date_ordinal(day),
+                                                   float(rate)))
+    for currency, values in rates.items():
+        values.sort()
+        rates[currency] = (array('i', [d for d, _ in values]),
+                           array('d', [r for _, r in values]))
+    return RateTable(header[2], rates)
+
+
+# The rate table of the data directory, empty when it has none
+def load(data_dir):
+    path = rates_path(data_dir)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return RateTable()
+    stamp = (st.st_size, st.st_mtime_ns)
+    table = _tables.get(path)
+    if table is None or table[0] != stamp:
+        logger.debug('Reading exchange rates from %s', path)
+        try:
+            with open(path, 'r', newline='') as fd:
+                table = _tables[path] = (stamp, _parse(fd))
+        except ValueError as e:
+            raise SRMLFException('Invalid {}: {}'
+                                 .format(RATES_FILENAME, e))
+    return table[1]
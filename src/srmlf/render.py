@@ -0,0 +1,97 @@
+import csv
+import json
+from collections import OrderedDict
+
+from .project import CellFormatter
+
+# Outputs of the view command besides the PrettyTable one. They write rows as
+# they are read, instead of building the whole table in memory.
+OUTPUTS = ['table', 'stream', 'csv', 'tsv', 'jsonl']
+
+
+def _center(cell, length, width):
+    # cells may hold ANSI sequences, so their printed length is given. The
+    # odd space goes where str.center, used by PrettyTable, puts it.
+    excess = width - length
+    left = excess // 2 + (excess & width & 1)
+    return ' ' * left + cell + ' ' * (excess - left)
+
+
+def _border(widths):
+    return '+' + '+'.join('-' * (w + 2) for w in widths) + '+\n'
+
+
+def _line(cells, lengths, widths):
+    return '| ' + ' | '.join(_center(c, n, w) for c, n, w in
+                             zip(cells, lengths, widths)) + ' |\n'
+
+
+# Writes the same table as Project.prettify(). Column widths are computed by
+# a first pass over the rows, cheap since formatted dates and amounts are
+# memoized, and rows are written by a second one.
+def stream_table(project, fd, rows=None, totals_only=False, color=True):
+    formatter = CellFormatter(color)
+    plain = CellFormatter(False) if color else formatter
+    fieldnames = list(project.fieldnames)
+    totals = project.total_rows(plain)
+
+    if rows is not None:
+        rows = list(rows)
+    with project.phase('format'):
+        widths = [len(f) for f in fieldnames]
+        for line in totals:
+            widths = [max(w, len(c)) for w, c in zip(widths, line)]
+        if not totals_only:
+            for line in project.iter_data() if rows is None else rows:
+                widths = [max(w, len(c)) for w, c in
+                          zip(widths, plain.row(line, fieldnames))]
+
+    with project.phase('render'):
+        fd.write(_border(widths))
+        fd.write(_line([formatter.colored(f, 'red') for f in fieldnames],
+                       [len(f) for f in fieldnames], widths))
+        fd.write(_border(widths))
+        if not totals_only:
+            for line in project.iter_data() if rows is None else rows:
+                lengths = [len(c) for c in plain.row(line, fieldnames)]
+                fd.write(_line(formatter.row(line, fieldnames), lengths,
+                               widths))
+        for line in totals:
+            fd.write(_line([formatter.colored(c, attrs=['bold']) if c else ''
+                            for c in line], [len(c) for c in line], widths))
+        fd.write(_border(widths))
+
+
+def _raw(line, fieldnames):
+    return OrderedDict((k, line[k].strftime('%Y-%m-%d') if k == 'Date'
+                        else line.get(k, 0.0)) for k in fieldnames)
+
+
+def write_delimited(project, fd, rows=None, delimiter=','):
+    fieldnames = list(project.fieldnames)
+    writer = csv.DictWriter(fd, fieldnames, delimiter=delimiter,
+                            lineterminator='\n')
+    writer.writeheader()
+    for line in project.iter_data() if rows is None else rows:
+        writer.writerow(_raw(line, fieldnames))
+
+
+def write_jsonl(project, fd, rows=None):
+    fieldnames = list(project.fieldnames)
+    for line in project.iter_data() if rows is None else rows:
+        fd.write(json.dumps(_raw(line, fieldnames)) + '\n')
+
+
+def render(project, output, fd, rows=None, totals_only=False, color=True):
+    if output == 'table':
+        table = project.prettify(totals_only=totals_only, rows=rows,
+                                 color=color)
+        with project.phase('render'):
+            fd.write('{}\n'.format(table))
+    elif output == 'stream':
+        stream_table(project, fd, rows, totals_only, color)
+    elif output == 'jsonl':
+        write_jsonl(project, fd, rows)
+    else:
+        write_delimited(project, fd, rows,
+                        '\t' if output == 'tsv' else ',')
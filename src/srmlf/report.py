@@ -0,0 +1,65 @@
+import json
+import locale
+from collections import OrderedDict
+from datetime import datetime
+
+from .project import colored
+
+PERIODS = ['week', 'month', 'year']
+
+
+def period_of(date, by):
+    if by == 'year':
+        return '{:04d}'.format(date.year)
+    elif by == 'month':
+        return '{:04d}-{:02d}'.format(date.year, date.month)
+    elif by == 'week':
+        year, week, _ = date.isocalendar()
+        return '{:04d}-W{:02d}'.format(year, week)
+    raise ValueError('Unknown period: {}'.format(by))
+
+
+# Totals by user of each period, along with the cumulative totals and the
+# balances (what each user has paid more than an equal share) at its end.
+# Days come sorted, so the periods are built in one pass over them.
+def report(project, by='month'):
+    users = project.users
+    periods = []
+    cumulative = [0.0] * len(users)
+    for ordinal, sums in project.get_daily_contribs().items():
+        key = period_of(datetime.fromordinal(ordinal), by)
+        if not periods or periods[-1]['period'] != key:
+            periods.append(OrderedDict([('period', key),
+                                        ('totals', [0.0] * len(users))]))
+        totals = periods[-1]['totals']
+        for i, amount in enumerate(sums):
+            totals[i] += amount
+            cumulative[i] += amount
+        periods[-1]['cumulative'] = list(cumulative)
+    for period in periods:
+        share = sum(period['cumulative']) / len(users) if users else 0.0
+        period['balances'] = [c - share for c in period['cumulative']]
+    return periods
+
+
+def format_report(users, periods):
+    import prettytable
+    p = prettytable.PrettyTable([colored(f, 'red') for f in
+                                 ['Period'] + users + ['Sum']])
+    for period in periods:
+        p.add_row([colored(period['period'], 'cyan')] +
+                  ['{}\n{}'.format(locale.currency(t) if t else '',
+                                   colored('({})'.format(locale.currency(b)),
+                                           'green' if b >= 0 else 'yellow'))
+                   for t, b in zip(period['totals'], period['balances'])] +
+                  [colored(locale.currency(sum(period['totals'])),
+                           attrs=['bold'])])
+    return p
+
+
+def write_report_jsonl(users, periods, fd):
+    for period in periods:
+        fd.write(json.dumps(OrderedDict(
+            [('period', period['period'])] +
+            [(key, OrderedDict(zip(users, period[key])))
+             for key in ('totals', 'cumulative', 'balances')])) + '\n')
@@ -0,0 +1,146 @@
+import csv
+import io
+import locale
+import os
+import struct
+from array import array
+
+from . import cache
+from .exceptions import SRMLFException
+
+# The row index of a project file holds the byte offset of each of its rows,
+# and the offset of the end of the file, so that a row can be replaced or
+# deleted by only formatting that row, the bytes around it being copied as
+# they are. It is kept in
+# .<file>.rows, after the size and mtime of the file it was built from, and
+# built again when they do not match anymore.
+HEADER = struct.Struct('<QQ')
+
+# the rows around a changed one are copied this many bytes at a time
+CHUNK_SIZE = 1 << 20
+
+
+def rowindex_path(path):
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, '.{}.rows'.format(basename))
+
+
+# A row ends at the end of a line holding an even number of quotes so far,
+# quotes inside quoted fields being doubled. Blank lines are left to the row
+# before them, like the CSV reader skips them.
+def _scan(fd):
+    offsets = array('Q')
+    fd.readline()
+    position = fd.tell()
+    start = None
+    quotes = 0
+    for line in fd:
+        if start is None and line.strip(b'\r\n'):
+            start = position
+        position += len(line)
+        if start is not None:
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                offsets.append(start)
+                start = None
+    if start is not None:
+        offsets.append(start)
+    offsets.append(position)
+    return offsets
+
+
+def _write(path, offsets):
+    st = os.stat(path)
+    tmp_path = '{}.{}.tmp'.format(rowindex_path(path), os.getpid())
+    try:
+        with open(tmp_path, 'wb') as fd:
+            fd.write(HEADER.pack(st.st_size, st.st_mtime_ns))
+            fd.write(offsets.tobytes())
+        os.replace(tmp_path, rowindex_path(path))
+    except OSError:
+        pass
+
+
+def load(path):
+    st = os.stat(path)
+    try:
+        with open(rowindex_path(path), 'rb') as fd:
+            data = fd.read()
+        if len(data) >= HEADER.size and HEADER.unpack_from(data) == \
+                (st.st_size, st.st_mtime_ns):
+            offsets = array('Q')
+            offsets.frombytes(data[HEADER.size:])
+            return offsets
+    except (OSError, ValueError):
+        pass
+    with open(path, 'rb') as fd:
+        offsets = _scan(fd)
+    _write(path, offsets)
+    return offsets
+
+
+# Bytes of the header and of the row numbered number (from 1) of the file at
+# path, a CSV file of that row only, or None when there is no such row
+def read_row(path, number):
+    offsets = load(path)
+    if not 1 <= number < len(offsets):
+        return None
+    with open(path, 'rb') as fd:
+        header = fd.readline()
+        fd.seek(offsets[number - 1])
+        return header + fd.read(offsets[number] - offsets[number - 1])
+
+
+# Copies the bytes of src from its position up to stop (to its end when None)
+# to dst, a chunk at a time
+def _copy(src, dst, stop=None):
+    while stop is None or src.tell() < stop:
+        size = CHUNK_SIZE if stop is None else \
+            min(CHUNK_SIZE, stop - src.tell())
+        chunk = src.read(size)
+        if not chunk:
+            break
+        dst.write(chunk)
+
+
+def _encode(line, fieldnames):
+    buf = io.StringIO()
+    csv.DictWriter(buf, fieldnames, extrasaction='ignore').writerow(line)
+    return buf.getvalue().encode(locale.getpreferredencoding(False))
+
+
+# Replaces the row numbered number (from 1) of the file at path by line, or
+# deletes it when line is None. count is the number of rows the caller
+# expects the file to hold, if it read them. Returns False, leaving the file
+# alone, when the line holds amounts of users missing from the header of the
+# file.
+# The new file is written aside and then replaces the old one, so that a
+# crash leaves either of them, never a mix.
+def replace_row(path, number, line, count=None):
+    with open(path, 'r', newline='') as fd:
+        fieldnames = next(csv.reader(fd), [])
+    if line is not None and any(line[f] for f in line
+                                if f not in fieldnames):
+        return False
+    offsets = load(path)
+    if count is not None and len(offsets) - 1 != count:
+        raise SRMLFException('{} has changed since it was read'
+                             .format(os.path.basename(path)))
+    start, end = offsets[number - 1], offsets[number]
+    text = _encode(line, fieldnames) if line is not None else b''
+    delta = len(text) - (end - start)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        _copy(src, dst, start)
+        dst.write(text)
+        src.seek(end)
+        _copy(src, dst)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, path)
+    cache.invalidate(path)
+    offsets = offsets[:number - 1] + \
+        (array('Q', [start]) if line is not None else array('Q')) + \
+        array('Q', [o + delta for o in offsets[number:]])
+    _write(path, offsets)
+    return True
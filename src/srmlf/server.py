@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from urllib.parse import unquote, urlsplit
+
+from . import project
+from .columns import parse_date
+from .exceptions import SRMLFException, ProjectNotFoundException
+from .workspace import Workspace, project_totals, project_view
+
+logger = logging.getLogger('srmlf')
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_contribution(body):
+    from argparse import ArgumentTypeError
+    from .srmlf import valid_user_contrib
+    try:
+        record = json.loads(body.decode('utf-8'))
+        contribs = record['contribs']
+        if isinstance(contribs, dict):
+            contribs = [valid_user_contrib('{}:{}'.format(user, amount))
+                        for user, amount in contribs.items()]
+        else:
+            contribs = [valid_user_contrib(str(c)) for c in contribs]
+        if not contribs:
+            raise ValueError('no contributions')
+        date = record.get('date')
+        date = parse_date(date) if date else datetime.now()
+        return str(record.get('label', '')), contribs, date
+    except (ValueError, KeyError, TypeError, AttributeError,
+            ArgumentTypeError) as e:
+        raise HTTPError(400, 'Invalid contribution: {}'.format(e))
+
+
+class Application:
+
+    def __init__(self, project_class, cache_size=128, data_dir=None):
+        # project_class is a storage backend, see storage.py
+        self.workspace = Workspace(data_dir if data_dir is not None
+                                   else project.DATA_DIR, project_class,
+                                   cache_size)
+
+    def handle(self, method, target, body=b''):
+        try:
+            return self.dispatch(method, target, body)
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except ProjectNotFoundException as e:
+            return 404, {'error': str(e)}
+        except SRMLFException as e:
+            return 400, {'error': str(e)}
+
+    def dispatch(self, method, target, body):
+        parts = [unquote(p) for p in urlsplit(target).path.split('/') if p]
+        if not parts or parts[0] != 'projects' or len(parts) > 3:
+            raise HTTPError(404, 'Unknown resource')
+        if len(parts) == 1:
+            self._check_method(method, 'GET')
+            return 200, {'projects': self.workspace.projects()}
+        name = parts[1]
+        if len(parts) == 2:
+            self._check_method(method, 'GET')
+            return 200, project_view(self.workspace.project(name))
+        if parts[2] == 'totals':
+            self._check_method(method, 'GET')
+            return 200, project_totals(self.workspace.project(name))
+        if parts[2] == 'contributions':
+            self._check_method(method, 'POST')
+            label, contribs, date = _parse_contribution(body)
+            self.workspace.cache.add_contribs(name, label, contribs, date)
+            return 201, {'added': 1}
+        raise HTTPError(404, 'Unknown resource')
+
+    @staticmethod
+    def _check_method(method, allowed):
+        if method != allowed:
+            raise HTTPError(405, 'Use {}'.format(allowed))
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = \
+                    request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload = self.handle(method, target, body)
+                except Exception:
+                    logger.exception('Error while handling %s %s',
+                                     method, target)
+                    status, payload = 500, {'error': 'Internal error'}
+                logger.debug('%s %s %d', method, target, status)
+
+                content = json.dumps(payload).encode('utf-8')
+                keep_alive = version == 'HTTP/1.1' and \
+                    headers.get('connection', '').lower() != 'close'
+                writer.write('{} {} {}\r\n'
+                             'Content-Type: application/json\r\n'
+                             'Content-Length: {}\r\n'
+                             'Connection: {}\r\n\r\n'
+                             .format(version, status, REASONS[status],
+                                     len(content),
+                                     'keep-alive' if keep_alive else 'close')
+                             .encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(project_class, host='127.0.0.1', port=8765, cache_size=128):
+    app = Application(project_class, cache_size)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(app.serve_client, host, port))
+    logger.info('Serving on http://%s:%d/projects', host, port)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
@@ -0,0 +1,100 @@
+import heapq
+import locale
+from collections import OrderedDict
+
+from .project import colored
+
+
+def _cents(amount):
+    return int(round(amount * 100))
+
+
+# What each user has paid more (or less, when negative) than their share. The
+# share is an equal split of the fixed total of the project when it has one,
+# of the sum of the contributions otherwise. The split is made in cents, the
+# cents left going to the first users, so that the balances cancel out.
+def balances(users, contribs, total=None):
+    if not users:
+        return OrderedDict()
+    paid = [_cents(c) for c in contribs or [0.0] * len(users)]
+    share, extra = divmod(_cents(total) if total else sum(paid), len(users))
+    return OrderedDict((user, (p - share - (1 if i < extra else 0)) / 100)
+                       for i, (user, p) in enumerate(zip(users, paid)))
+
+
+# What each user still owes toward the fixed total of a project (or has paid
+# over it, when positive), apart from what users owe each other. Nobody is
+# owed it, so that it is never netted against what a user is owed.
+def target_balances(users, contribs, total=None):
+    if not total:
+        return OrderedDict()
+    owed = balances(users, contribs)
+    return OrderedDict(
+        (user, (_cents(balance) - _cents(owed[user])) / 100)
+        for user, balance in balances(users, contribs, total).items())
+
+
+def merge_balances(all_balances):
+    merged = OrderedDict()
+    for project_balances in all_balances:
+        for user, balance in project_balances.items():
+            merged[user] = merged.get(user, 0.0) + balance
+    return merged
+
+
+# Greedy min cash flow: the largest debtor pays the largest creditor as much
+# as possible, until one of them is settled. Each transfer settles at least
+# one user, so there are less transfers than users, and the heaps make it run
+# in O(n log n). Returns the (debtor, creditor, amount) transfers and the
+# balances left when the debts and credits do not cancel out, as happens with
+# a fixed total which is not reached yet.
+def settle(user_balances):
+    # amounts are handled in cents, so that no rounding error piles up
+    cents = [(_cents(b), user) for user, b in user_balances.items()]
+    creditors = [(-c, user) for c, user in cents if c > 0]
+    debtors = [(c, user) for c, user in cents if c < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount / 100))
+        if credit + amount < 0:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if debt + amount < 0:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    left = OrderedDict((user, -c / 100) for c, user in sorted(creditors))
+    left.update((user, c / 100) for c, user in sorted(debtors))
+    return transfers, left
+
+
+# Settles several projects at once, given their summaries (see summary.py):
+# what users owe each other is netted across the projects, and what they owe
+# toward the fixed total of a project is left to them.
+def settle_all(summaries):
+    summaries = [s for s in summaries if s['error'] is None]
+    transfers, left = settle(merge_balances(
+        balances(s['users'], s['contribs']) for s in summaries))
+    targets = merge_balances(
+        target_balances(s['users'], s['contribs'], s['total'])
+        for s in summaries)
+    for user, balance in targets.items():
+        if _cents(balance):
+            left[user] = (_cents(left.get(user, 0.0)) + _cents(balance)) / 100
+    return transfers, left
+
+
+def format_transfers(transfers, left):
+    import prettytable
+    p = prettytable.PrettyTable([colored(f, 'red') for f in
+                                 ['From', 'To', 'Amount']])
+    for debtor, creditor, amount in transfers:
+        p.add_row([colored(debtor, 'blue'), colored(creditor, 'blue'),
+                   locale.currency(amount)])
+    for user, balance in left.items():
+        p.add_row([colored(user, 'blue') if balance < 0 else '',
+                   colored(user, 'blue') if balance > 0 else '',
+                   colored(locale.currency(abs(balance)), 'yellow')])
+    return p
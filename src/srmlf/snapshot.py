@@ -0,0 +1,144 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from .columns import META_FIELDS, ColumnStore
+
+# A snapshot holds the rows of a project file in binary form, so that opening
+# the project maps it in memory instead of parsing the CSV file. It is made
+# of, each part starting at a multiple of 8 bytes:
+#   - MAGIC and the length of the metadata (uint32),
+#   - the metadata, as JSON: fieldnames, row count, whether the rows are in
+#     date order, byte order, and size and mtime of the CSV file,
+#   - the dates, as int32 day ordinals,
+#   - one column of float64 amounts by user, in the order of the fieldnames,
+#   - the (rows + 1) uint64 offsets of the descriptions in the string table,
+#   - the string table, holding the UTF-8 encoded descriptions.
+# The CSV file stays the reference: a snapshot whose size, mtime or
+# fieldnames do not match it anymore is ignored, and written again.
+MAGIC = b'SRMLFSN1'
+HEADER = struct.Struct('<8sI')
+
+logger = logging.getLogger('srmlf')
+
+
+def snapshot_path(path):
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, '.{}.snapshot'.format(basename))
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+# Descriptions of a snapshot, only decoded when read
+class StringTable(Sequence):
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('description index out of range')
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]) \
+            .decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def _pad(fd):
+    fd.write(b'\0' * (_aligned(fd.tell()) - fd.tell()))
+
+
+# st is the os.stat() result of the CSV file when store was read from it
+def write(path, store, st):
+    if store.currencies is not None:
+        # projects in several currencies are always parsed
+        return
+    users = [f for f in store.fieldnames if f not in META_FIELDS]
+    meta = json.dumps({'fieldnames': store.fieldnames,
+                       'rows': len(store),
+                       'sorted': store.sorted,
+                       'byteorder': sys.byteorder,
+                       'size': st.st_size,
+                       'mtime': st.st_mtime_ns}).encode('utf-8')
+    tmp_path = '{}.{}.tmp'.format(snapshot_path(path), os.getpid())
+    try:
+        with open(tmp_path, 'wb') as fd:
+            fd.write(HEADER.pack(MAGIC, len(meta)))
+            _pad(fd)
+            fd.write(meta)
+            _pad(fd)
+            fd.write(store.dates)
+            _pad(fd)
+            for user in users:
+                # columns added after the first row start with zeros
+                fd.write(bytes(8 * store.offsets[user]))
+                fd.write(store.amounts[user])
+            blob = [d.encode('utf-8') for d in store.descriptions]
+            offsets = array('Q', [0])
+            for description in blob:
+                offsets.append(offsets[-1] + len(description))
+            fd.write(offsets)
+            fd.write(b''.join(blob))
+        os.replace(tmp_path, snapshot_path(path))
+    except OSError as e:
+        logger.debug('Unable to write snapshot of %s: %s', path, e)
+
+
+def _read_meta(buf, path):
+    magic, length = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        return None
+    start = _aligned(HEADER.size)
+    meta = json.loads(bytes(buf[start:start + length]).decode('utf-8'))
+    st = os.stat(path)
+    if meta['size'] != st.st_size or meta['mtime'] != st.st_mtime_ns or \
+            meta['byteorder'] != sys.byteorder:
+        return None
+    meta['start'] = _aligned(start + length)
+    return meta
+
+
+# Returns a ColumnStore whose columns are views of the mapped snapshot, or
+# None when there is no up to date snapshot for these fieldnames.
+def read(path, fieldnames):
+    try:
+        with open(snapshot_path(path), 'rb') as fd:
+            buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    view = memoryview(buf)
+    try:
+        meta = _read_meta(view, path)
+        if meta is None or meta['fieldnames'] != fieldnames:
+            return None
+        rows = meta['rows']
+        offset = meta['start']
+        dates = view[offset:offset + 4 * rows].cast('i')
+        offset = _aligned(offset + 4 * rows)
+        amounts = []
+        for field in fieldnames:
+            if field not in META_FIELDS:
+                amounts.append((field,
+                                view[offset:offset + 8 * rows].cast('d')))
+                offset += 8 * rows
+        offsets = view[offset:offset + 8 * (rows + 1)].cast('Q')
+        offset += 8 * (rows + 1)
+        descriptions = StringTable(offsets, view[offset:])
+    except (ValueError, KeyError, TypeError, struct.error):
+        return None
+    logger.debug('Mapped snapshot of %s', path)
+    return ColumnStore.from_columns(fieldnames, descriptions, dates,
+                                    amounts, meta['sorted'])
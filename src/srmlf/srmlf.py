@@ -2,15 +2,27 @@ import argparse
 import logging
 import os
 import locale
+import sys
+import time
 from datetime import datetime
 
-import coloredlogs
-
-from .project import Project, DATA_DIR
+from .columns import META_FIELDS, parse_date
+from .project import DATA_DIR, Project
+from .rates import CURRENCY_RE
 from .exceptions import SRMLFException
+from .render import OUTPUTS, render
+from .storage import BACKENDS, get_backend
+
+logger = logging.getLogger('srmlf')
 
 
+# Dates are ISO ones, like in the project files, or in the format of the
+# locale
 def valid_date(s):
+    try:
+        return parse_date(s)
+    except ValueError:
+        pass
     try:
         return datetime.strptime(s, locale.nl_langinfo(locale.D_FMT))
     except ValueError:
@@ -18,9 +30,23 @@ def valid_date(s):
         raise argparse.ArgumentTypeError(msg)
 
 
+# the names of the columns which are not users can not be user names
+def valid_user(s):
+    if s in META_FIELDS:
+        msg = "Not a valid user name: '{}'.".format(s)
+        raise argparse.ArgumentTypeError(msg)
+    return s
+
+
+# user:amount, the amount being followed by the code of its currency when it
+# is not in the one of the locale (like Alice:100EUR)
 def valid_user_contrib(s):
     try:
         name, amount = s.split(':')
+        name = valid_user(name)
+        currency = amount[-3:]
+        if CURRENCY_RE.match(currency):
+            return name, float(amount[:-3]), currency
         amount = float(amount)
         return name, amount
     except ValueError:
@@ -28,75 +54,384 @@ def valid_user_contrib(s):
         raise argparse.ArgumentTypeError(msg)
 
 
+def valid_currency(s):
+    if not CURRENCY_RE.match(s):
+        msg = "Not a currency code: '{}'.".format(s)
+        raise argparse.ArgumentTypeError(msg)
+    return s
+
+
+# A row number, or the date and description of a row
+def valid_row(s):
+    if s.isdigit():
+        return positive_int(s)
+    date, sep, description = s.partition(':')
+    if not sep:
+        msg = "Not a row number or DATE:LABEL: '{}'.".format(s)
+        raise argparse.ArgumentTypeError(msg)
+    return valid_date(date), description
+
+
+def positive_int(s):
+    try:
+        value = int(s)
+    except ValueError:
+        value = 0
+    if value < 1:
+        msg = "Not a positive integer: '{}'.".format(s)
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
+# coloredlogs is only worth its import time when writing to a terminal
+def install_logging():
+    if sys.stderr.isatty():
+        import coloredlogs
+        coloredlogs.install(fmt='%(message)s', level=logging.INFO)
+    else:
+        logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+
+def increase_verbosity():
+    if sys.stderr.isatty():
+        import coloredlogs
+        coloredlogs.increase_verbosity()
+    else:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+
+def init_command(args):
+    logger.info('Creating project %s…', args.project_name)
+    get_backend(args.storage).create(args.project_name, args.users,
+                                     args.total)
+
+
+def add_command(args):
+    logger.info('Adding %d contribution%s…',
+                len(args.contribs),
+                's' if len(args.contribs) > 1 else '')
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    project.add_contribs(args.label, args.contribs, args.date)
+    project.save(append=True)
+
+
+def _row_number(project, row):
+    return row if isinstance(row, int) else project.find_row(*row)
+
+
+def edit_command(args):
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    with project.lock():
+        project.edit_row(_row_number(project, args.row), args.label,
+                         args.date, args.contribs)
+
+
+def rm_command(args):
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    with project.lock():
+        project.delete_row(_row_number(project, args.row))
+
+
+def view_command(args):
+    if args.totals_only and args.output not in ('table', 'stream'):
+        raise SRMLFException('--totals-only can not be used with the {} '
+                             'output, which only has rows'.format(args.output))
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    project.currency = args.currency
+    rows = None
+    # only paginated when asked to, --page-size alone showing the first page
+    page = args.page
+    if page is None and args.page_size:
+        page = 1
+    if args.since or args.until or args.last or page:
+        rows = project.select_rows(args.since, args.until, args.last, page,
+                                   args.page_size or 50)
+    render(project, args.output, sys.stdout, rows, args.totals_only,
+           args.color)
+
+
+def import_command(args):
+    from .importer import guess_format, read_records, import_records
+    fmt = args.format or guess_format(args.source.name)
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    with args.source:
+        count = import_records(project, read_records(args.source, fmt))
+    logger.info('Imported %d contribution%s', count,
+                's' if count > 1 else '')
+
+
+def compact_command(args):
+    backend = get_backend(args.storage)
+    if args.all:
+        names = backend.list_projects()
+    elif args.project_name is not None:
+        names = [args.project_name]
+    else:
+        raise SRMLFException('A project name, or --all, is needed')
+    for name in names:
+        count = backend(name, lazy=True).compact()
+        if count:
+            logger.info('Merged %d change%s into %s', count,
+                        's' if count > 1 else '', name)
+
+
+def report_command(args):
+    from .report import report, format_report, write_report_jsonl
+    project = get_backend(args.storage)(args.project_name, lazy=True)
+    periods = report(project, args.by)
+    if args.output == 'jsonl':
+        write_report_jsonl(project.users, periods, sys.stdout)
+    else:
+        print(format_report(project.users, periods))
+
+
+def settle_command(args):
+    from .settle import balances, settle, settle_all, format_transfers
+    backend = get_backend(args.storage)
+    if args.all:
+        from .summary import summarize_all
+        summaries = summarize_all(backend.list_projects(), args.jobs,
+                                  backend)
+        for summary in summaries:
+            if summary['error'] is not None:
+                logger.warning('Skipping project %s: %s', summary['name'],
+                               summary['error'])
+        transfers, left = settle_all(summaries)
+    elif args.project_name is not None:
+        project = backend(args.project_name, lazy=True)
+        transfers, left = settle(balances(
+            project.users, project.get_total_contribs(), project.total))
+    else:
+        raise SRMLFException('A project name, or --all, is needed')
+    print(format_transfers(transfers, left))
+
+
+def summary_command(args):
+    from .summary import summarize_all, format_summary
+    backend = get_backend(args.storage)
+    summaries = summarize_all(backend.list_projects(), args.jobs, backend)
+    print(format_summary(summaries))
+
+
+def serve_command(args):
+    from .server import serve
+    serve(get_backend(args.storage), args.host, args.port, args.cache_size)
+
+
+# runs the command, with the timings of each phase and the profiling asked
+def run_command(args):
+    timings = profiler = None
+    if args.timings or args.memory:
+        from .timings import Timings
+        timings = Timings()
+        Project.add_hook(timings)
+    if args.memory:
+        import tracemalloc
+        tracemalloc.start()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        args.func(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logger.info('Profile written to %s', args.profile)
+        if timings is not None:
+            Project.remove_hook(timings)
+            peak = None
+            if args.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            sys.stderr.write(timings.format(time.perf_counter() - start,
+                                            peak))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='SRMLF is a lightweight '
+                                     'accountability tracker')
+    parser.add_argument('-v', '--verbose', help='Show debug info',
+                        action='store_true', dest='verbose')
+    parser.add_argument('--storage', help='Storage backend (default: '
+                        '$SRMLF_STORAGE or csv)', choices=list(BACKENDS),
+                        default=os.environ.get('SRMLF_STORAGE', 'csv'))
+    parser.add_argument('--snapshot', help='Keep binary snapshots of the '
+                        'CSV projects, faster to open (default: set by '
+                        '$SRMLF_SNAPSHOT=1)', action='store_true',
+                        default=os.environ.get('SRMLF_SNAPSHOT') == '1')
+    parser.add_argument('--journal', help='Add contributions to a journal '
+                        'of the CSV projects, merged into them by the compact '
+                        'command (default: set by $SRMLF_JOURNAL=1)',
+                        action='store_true',
+                        default=os.environ.get('SRMLF_JOURNAL') == '1')
+    parser.add_argument('--timings', help='Show the time of each phase of '
+                        'the command', action='store_true')
+    parser.add_argument('--memory', help='Show the time and memory peak of '
+                        'each phase of the command, traced by tracemalloc '
+                        'which slows it down', action='store_true')
+    parser.add_argument('--profile', help='Write cProfile stats of the '
+                        'command to this file', metavar='FILE')
+
+    commands = parser.add_subparsers(help='Commands help', dest='command')
+    init = commands.add_parser('init', aliases=['i'])
+    init.set_defaults(func=init_command)
+    init.add_argument('project_name', help='Project to use',
+                      action='store')
+    init.add_argument('-t', '--total', help='Total amount to reach',
+                      type=int,
+                      action='store')
+    init.add_argument('users', help='Names of users', type=valid_user,
+                      action='store', nargs='+')
+
+    add = commands.add_parser('add', aliases=['a'])
+    add.set_defaults(func=add_command)
+    add.add_argument('project_name', help='Project to use',
+                     action='store')
+    add.add_argument('-d', '--date', help='date of the contribution you '
+                     'want to create (format: YYYY-MM-DD or {})'
+                     .format(locale.nl_langinfo(locale.D_FMT)
+                             .replace('%', '%%')),
+                     default=datetime.now(),
+                     type=valid_date)
+    add.add_argument('label', help='Label of the contribution',
+                     type=str)
+    add.add_argument('contribs', type=valid_user_contrib,
+                     help='User names and amounts',
+                     action='store', nargs='+')
+
+    row_help = 'Number of the contribution (from 1, in the order of view), ' \
+        'or its date and label as DATE:LABEL (date format: YYYY-MM-DD or ' \
+        '{})'.format(locale.nl_langinfo(locale.D_FMT).replace('%', '%%'))
+    edit = commands.add_parser('edit', aliases=['e'])
+    edit.set_defaults(func=edit_command)
+    edit.add_argument('project_name', help='Project to use',
+                      action='store')
+    edit.add_argument('row', help=row_help, type=valid_row)
+    edit.add_argument('-l', '--label', help='New label of the contribution')
+    edit.add_argument('-d', '--date', help='New date of the contribution',
+                      type=valid_date)
+    # an option, as a list of positionals would end before -l or -d
+    edit.add_argument('-a', '--amount', type=valid_user_contrib,
+                      help='User name and new amount, as USER:AMOUNT (can be '
+                      'repeated)', action='append', dest='contribs',
+                      default=[])
+
+    rm = commands.add_parser('rm')
+    rm.set_defaults(func=rm_command)
+    rm.add_argument('project_name', help='Project to use',
+                    action='store')
+    rm.add_argument('row', help=row_help, type=valid_row)
+
+    view = commands.add_parser('view', aliases=['v'])
+    view.set_defaults(func=view_command)
+    view.add_argument('project_name', help='Project to use',
+                      action='store')
+    view.add_argument('--totals-only', help='Only show the totals',
+                      action='store_true', dest='totals_only')
+    view.add_argument('-o', '--output', help='Output format: table, '
+                      'stream (same table, written as rows are read), csv, '
+                      'tsv or jsonl (default: table)',
+                      choices=OUTPUTS,
+                      default='table')
+    view.add_argument('--no-color', help='Do not color the output',
+                      action='store_false', dest='color')
+    view.add_argument('-c', '--currency', help='Currency the totals are '
+                      'converted to (default: the one of the locale), see '
+                      '.rates.csv', type=valid_currency)
+    date_format = locale.nl_langinfo(locale.D_FMT).replace('%', '%%')
+    view.add_argument('--since', help='Only show the contributions made '
+                      'on or after this date (format: YYYY-MM-DD or {})'
+                      .format(date_format), type=valid_date)
+    view.add_argument('--until', help='Only show the contributions made '
+                      'on or before this date (format: YYYY-MM-DD or {})'
+                      .format(date_format), type=valid_date)
+    view.add_argument('--last', help='Only show the last N contributions',
+                      type=positive_int, metavar='N')
+    view.add_argument('--page', help='Show the Nth page of contributions',
+                      type=positive_int, metavar='N')
+    view.add_argument('--page-size', help='Number of contributions by page '
+                      '(default: 50)', type=positive_int, dest='page_size')
+
+    imp = commands.add_parser('import')
+    imp.set_defaults(func=import_command)
+    imp.add_argument('project_name', help='Project to use',
+                     action='store')
+    imp.add_argument('source', help='CSV or JSON Lines file of '
+                     'contributions, - for the standard input',
+                     type=argparse.FileType('r'))
+    imp.add_argument('-f', '--format', help='Format of the source '
+                     '(default: guessed from its extension)',
+                     choices=['csv', 'jsonl'])
+
+    compact = commands.add_parser('compact')
+    compact.set_defaults(func=compact_command)
+    compact.add_argument('project_name', help='Project to use',
+                         action='store', nargs='?')
+    compact.add_argument('-a', '--all', help='Compact every project',
+                         action='store_true')
+
+    report = commands.add_parser('report', aliases=['r'])
+    report.set_defaults(func=report_command)
+    report.add_argument('project_name', help='Project to use',
+                        action='store')
+    report.add_argument('-b', '--by', help='Length of the periods '
+                        '(default: month)', choices=['week', 'month', 'year'],
+                        default='month')
+    report.add_argument('-o', '--output', help='Output format (default: '
+                        'table)', choices=['table', 'jsonl'], default='table')
+
+    settle = commands.add_parser('settle')
+    settle.set_defaults(func=settle_command)
+    settle.add_argument('project_name', help='Project to use',
+                        action='store', nargs='?')
+    settle.add_argument('-a', '--all', help='Settle the debts of every '
+                        'project at once', action='store_true')
+    settle.add_argument('-j', '--jobs', help='Number of processes used '
+                        'to read the projects with --all (default: one per '
+                        'CPU)', type=int, action='store')
+
+    summary = commands.add_parser('summary', aliases=['s'])
+    summary.set_defaults(func=summary_command)
+    summary.add_argument('-j', '--jobs', help='Number of processes used '
+                         'to read the projects (default: one per CPU)',
+                         type=int, action='store')
+
+    serve = commands.add_parser('serve')
+    serve.set_defaults(func=serve_command)
+    serve.add_argument('--host', help='Address to listen on (default: '
+                       '127.0.0.1)', default='127.0.0.1')
+    serve.add_argument('-p', '--port', help='Port to listen on (default: '
+                       '8765)', type=int, default=8765)
+    serve.add_argument('--cache-size', help='Number of projects kept in '
+                       'memory (default: 128)', type=int, default=128,
+                       dest='cache_size')
+    return parser
+
+
 def main():
     pref_locale = locale.getlocale()[0]
     locale.setlocale(locale.LC_TIME, pref_locale)
     locale.setlocale(locale.LC_MONETARY, pref_locale)
 
-    logger = logging.getLogger('srmlf')
-    coloredlogs.install(fmt='%(message)s',
-                        level=logging.INFO)
+    install_logging()
     try:
-
-        parser = argparse.ArgumentParser(description='SRMLF is a lightweight '
-                                         'accountability tracker')
-        parser.add_argument('-v', '--verbose', help='Show debug info',
-                            action='store_true', dest='verbose')
-
-        commands = parser.add_subparsers(help='Commands help', dest='command')
-        init = commands.add_parser('init', aliases=['i'])
-        init.add_argument('project_name', help='Project to use',
-                          action='store')
-        init.add_argument('-t', '--total', help='Total amount to reach',
-                          type=int,
-                          action='store')
-        init.add_argument('users', help='Names of users', type=str,
-                          action='store', nargs='+')
-
-        add = commands.add_parser('add', aliases=['a'])
-        add.add_argument('project_name', help='Project to use',
-                         action='store')
-        add.add_argument('-d', '--date', help='date of the contribution you '
-                         'want to create (format: {})'
-                         .format(locale.nl_langinfo(locale.D_FMT)
-                                 .replace('%', '%%')),
-                         default=datetime.now(),
-                         type=valid_date)
-        add.add_argument('label', help='Label of the contribution',
-                         type=str)
-        add.add_argument('contribs', type=valid_user_contrib,
-                         help='User names and amounts',
-                         action='store', nargs='+')
-
-        view = commands.add_parser('view', aliases=['v'])
-        view.add_argument('project_name', help='Project to use',
-                          action='store')
-
+        parser = build_parser()
         args = parser.parse_args()
 
         if args.verbose:
-            coloredlogs.increase_verbosity()
+            increase_verbosity()
+        Project.snapshot = args.snapshot
+        Project.journal = args.journal
 
         if not os.path.isdir(DATA_DIR):
             logger.debug('Creating inexistant data directory (%s)', DATA_DIR)
             os.mkdir(DATA_DIR)
 
-        if args.command == 'init':
-            logger.info('Creating project %s…', args.project_name)
-            Project.create(args.project_name, args.users, args.total)
-
-        elif args.command == 'add':
-            logger.info('Adding %d contribution%s…',
-                        len(args.contribs),
-                        's' if len(args.contribs) > 1 else '')
-            project = Project(args.project_name)
-            project.add_contribs(args.label, args.date, args.contribs)
-            project.save()
-
-        elif args.command == 'view':
-            project = Project(args.project_name)
-            print(project)
-
+        if getattr(args, 'func', None) is not None:
+            run_command(args)
         else:
             parser.print_help()
 
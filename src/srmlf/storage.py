@@ -0,0 +1,291 @@
+import logging
+import os
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from itertools import groupby
+
+from . import project
+from .columns import ColumnStore, date_ordinal, parse_date
+from .exceptions import \
+    (SRMLFException, ProjectNotFoundException, ProjectDuplicateException,
+     ProjectFileUnreadableException, CorruptedProjectException)
+
+# A storage backend is a Project class. Besides the in-memory methods, it
+# provides __init__(project_name, lazy, data_dir), load(), iter_data(),
+# get_total_contribs(), save(append) and the create(project_name, users,
+# total, data_dir) and list_projects(data_dir) static methods. data_dir
+# defaults to project.DATA_DIR.
+
+DATABASE_FILENAME = 'srmlf.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    total REAL
+);
+CREATE TABLE IF NOT EXISTS users (
+    project_id INTEGER NOT NULL REFERENCES projects (id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (project_id, name)
+);
+CREATE TABLE IF NOT EXISTS contributions (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects (id),
+    description TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contributions_project_date
+    ON contributions (project_id, date);
+CREATE TABLE IF NOT EXISTS amounts (
+    contribution_id INTEGER NOT NULL REFERENCES contributions (id),
+    project_id INTEGER NOT NULL REFERENCES projects (id),
+    user TEXT NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS amounts_project_user
+    ON amounts (project_id, user);
+CREATE INDEX IF NOT EXISTS amounts_contribution
+    ON amounts (contribution_id);
+'''
+
+
+def database_path(data_dir=None):
+    return os.path.join(data_dir if data_dir is not None
+                        else project.DATA_DIR, DATABASE_FILENAME)
+
+
+@contextmanager
+def _database_errors(name):
+    import sqlite3
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if 'unable to open' in str(e) or 'readonly' in str(e):
+            raise ProjectFileUnreadableException('Project {} is not found.'
+                                                 .format(name))
+        raise CorruptedProjectException(e)
+    except sqlite3.DatabaseError as e:
+        raise CorruptedProjectException(e)
+
+
+def connect(data_dir=None):
+    import sqlite3
+    db = sqlite3.connect(database_path(data_dir))
+    db.executescript(SCHEMA)
+    return db
+
+
+# All the projects are stored in DATA_DIR/srmlf.sqlite3. Totals are computed
+# by the database, and saving only inserts the new users and rows.
+class SQLiteProject(project.Project):
+
+    def __init__(self, project_name, lazy=False, data_dir=None):
+        self.data = ColumnStore()
+        self.loaded = False
+        self.logger = logging.getLogger('srmlf')
+        self.name = project_name
+        self.data_dir = data_dir if data_dir is not None else project.DATA_DIR
+        self.filename = DATABASE_FILENAME
+        self._saved = 0
+        # the database has its own transactions
+        self._stamp = None
+        with _database_errors(project_name):
+            self.db = connect(self.data_dir)
+            row = self.db.execute('SELECT id, total FROM projects '
+                                  'WHERE name = ?',
+                                  (project_name,)).fetchone()
+            if row is None:
+                raise ProjectNotFoundException('Project {} is not found.'
+                                               .format(project_name))
+            self.project_id, self.total = row
+            self._stored_users = [user for user, in self.db.execute(
+                'SELECT name FROM users WHERE project_id = ? '
+                'ORDER BY position', (self.project_id,))]
+        self.fieldnames = ['Description', 'Date'] + self._stored_users
+        if not lazy:
+            self.load()
+
+    def _add_field(self, field):
+        if field == 'Currency':
+            raise SRMLFException('The sqlite storage only holds amounts in '
+                                 'the currency of the locale')
+        super()._add_field(field)
+
+    def _stored_rows(self):
+        with _database_errors(self.name):
+            query = self.db.execute(
+                'SELECT c.id, c.description, c.date, a.user, a.amount '
+                'FROM contributions c LEFT JOIN amounts a '
+                'ON a.contribution_id = c.id '
+                'WHERE c.project_id = ? ORDER BY c.id', (self.project_id,))
+            for _, amounts in groupby(query, key=lambda r: r[0]):
+                amounts = list(amounts)
+                line = OrderedDict((field, 0.0) for field in self.fieldnames)
+                line['Description'] = amounts[0][1]
+                line['Date'] = parse_date(amounts[0][2])
+                for _, _, _, user, amount in amounts:
+                    if user is not None:
+                        line[user] = amount
+                yield line
+
+    def load(self):
+        if self.loaded:
+            return
+        data = ColumnStore(self.fieldnames)
+        with self.phase('parse'):
+            data.extend(self._stored_rows())
+        pending = self.data[self._saved:]
+        self._saved = len(data)
+        data.extend(pending)
+        self.data = data
+        self.loaded = True
+
+    def iter_data(self):
+        if not self.loaded:
+            yield from self._stored_rows()
+        yield from self.data
+
+    def _total_contribs(self):
+        if self.loaded:
+            totals = self.data.column_sums(self.users)
+            count = len(self.data)
+        else:
+            with _database_errors(self.name):
+                count, = self.db.execute(
+                    'SELECT COUNT(*) FROM contributions WHERE project_id = ?',
+                    (self.project_id,)).fetchone()
+                sums = dict(self.db.execute(
+                    'SELECT user, SUM(amount) FROM amounts '
+                    'WHERE project_id = ? GROUP BY user',
+                    (self.project_id,)))
+            totals = [sums.get(user, 0.0) for user in self.users]
+            totals, pending = project._sum_rows(self.data, self.users, totals)
+            count += pending
+        return totals if count else []
+
+    def get_daily_contribs(self):
+        if self.loaded:
+            return super().get_daily_contribs()
+        users = self.users
+        days = {}
+        with _database_errors(self.name):
+            query = self.db.execute(
+                'SELECT c.date, a.user, SUM(a.amount) '
+                'FROM contributions c JOIN amounts a '
+                'ON a.contribution_id = c.id '
+                'WHERE c.project_id = ? GROUP BY c.date, a.user',
+                (self.project_id,))
+            for day, user, amount in query:
+                sums = days.setdefault(date_ordinal(day), [0.0] * len(users))
+                sums[users.index(user)] += amount
+        self.data.day_sums(users, days)
+        return OrderedDict(sorted(days.items()))
+
+    @contextmanager
+    def lock(self):
+        # writes are serialized by SQLite transactions
+        yield
+
+    def compact(self):
+        # rows are inserted in the database as they are saved
+        self.save()
+        return 0
+
+    def _store_users(self, users):
+        for position, user in enumerate(users):
+            if user not in self._stored_users:
+                self.db.execute('INSERT INTO users (project_id, position, '
+                                'name) VALUES (?, ?, ?)',
+                                (self.project_id, position, user))
+        self._stored_users = users
+
+    def _store_amounts(self, contribution_id, line, users):
+        self.db.executemany(
+            'INSERT INTO amounts (contribution_id, project_id, user, '
+            'amount) VALUES (?, ?, ?, ?)',
+            [(contribution_id, self.project_id, user, line[user])
+             for user in users if line[user]])
+
+    def save(self, append=False):
+        users = self.users
+        with self.phase('save'), _database_errors(self.name), self.db:
+            self._store_users(users)
+            for line in self.data[self._saved:]:
+                cursor = self.db.execute(
+                    'INSERT INTO contributions (project_id, description, '
+                    'date) VALUES (?, ?, ?)',
+                    (self.project_id, line['Description'],
+                     line['Date'].strftime('%Y-%m-%d')))
+                self._store_amounts(cursor.lastrowid, line, users)
+        if not self.loaded:
+            # the database is read when the rows are needed
+            self.data = ColumnStore(self.fieldnames)
+        self._saved = len(self.data)
+
+    def _in_file(self):
+        return False
+
+    # Rows are numbered in the order of their ids
+    def _change_row(self, number, line):
+        users = self.users
+        with self.phase('save'), _database_errors(self.name), self.db:
+            row = self.db.execute(
+                'SELECT id FROM contributions WHERE project_id = ? '
+                'ORDER BY id LIMIT 1 OFFSET ?',
+                (self.project_id, number - 1)).fetchone()
+            if row is None:
+                raise SRMLFException('Project {} has no row {}'
+                                     .format(self.name, number))
+            self.db.execute('DELETE FROM amounts WHERE contribution_id = ?',
+                            row)
+            if line is None:
+                self.db.execute('DELETE FROM contributions WHERE id = ?',
+                                row)
+            else:
+                self.db.execute('UPDATE contributions SET description = ?, '
+                                'date = ? WHERE id = ?',
+                                (line['Description'],
+                                 line['Date'].strftime('%Y-%m-%d'), row[0]))
+                self._store_users(users)
+                self._store_amounts(row[0], line, users)
+        if line is None:
+            self.data.delete_row(number - 1)
+            self._saved -= 1
+        else:
+            self.data.set_row(number - 1, line)
+
+    @staticmethod
+    def create(project_name, users, total=None, data_dir=None):
+        with _database_errors(project_name), \
+                closing(connect(data_dir)) as db:
+            with db:
+                if db.execute('SELECT 1 FROM projects WHERE name = ?',
+                              (project_name,)).fetchone() is not None:
+                    raise ProjectDuplicateException(
+                        'Project {} already exists'.format(project_name))
+                cursor = db.execute('INSERT INTO projects (name, total) '
+                                    'VALUES (?, ?)', (project_name, total))
+                db.executemany('INSERT INTO users (project_id, position, '
+                               'name) VALUES (?, ?, ?)',
+                               [(cursor.lastrowid, position, user)
+                                for position, user in enumerate(users)])
+        return SQLiteProject(project_name, data_dir=data_dir)
+
+    @staticmethod
+    def list_projects(data_dir=None):
+        if not os.path.isfile(database_path(data_dir)):
+            return []
+        with _database_errors(DATABASE_FILENAME), \
+                closing(connect(data_dir)) as db:
+            return [name for name, in db.execute(
+                'SELECT name FROM projects ORDER BY name')]
+
+
+BACKENDS = OrderedDict([('csv', project.Project),
+                        ('sqlite', SQLiteProject)])
+
+
+def get_backend(name):
+    return BACKENDS[name]
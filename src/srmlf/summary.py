@@ -0,0 +1,59 @@
+import locale
+import os
+from itertools import repeat
+
+from . import project
+from .project import colored
+from .exceptions import SRMLFException
+
+
+def summarize(name, project_class=project.Project, data_dir=None):
+    try:
+        p = project_class(name, lazy=True, data_dir=data_dir)
+        contribs = p.get_total_contribs()
+        return {'name': name,
+                'users': p.users,
+                'contribs': contribs,
+                'sum': sum(contribs),
+                'total': p.total,
+                'error': None}
+    except SRMLFException as e:
+        return {'name': name, 'error': str(e)}
+
+
+def summarize_all(names, jobs=None, project_class=project.Project,
+                  data_dir=None):
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(names) < 2:
+        return [summarize(name, project_class, data_dir) for name in names]
+    from concurrent.futures import ProcessPoolExecutor
+    # the workers may not see a DATA_DIR changed after they were started
+    data_dir = data_dir if data_dir is not None else project.DATA_DIR
+    with ProcessPoolExecutor(jobs) as executor:
+        chunksize = max(1, len(names) // (4 * jobs))
+        return list(executor.map(summarize, names, repeat(project_class),
+                                 repeat(data_dir), chunksize=chunksize))
+
+
+def format_summary(summaries):
+    import prettytable
+    p = prettytable.PrettyTable([colored(f, 'red') for f in
+                                 ['Project', 'Participants', 'Sum', 'Total',
+                                  'Progress']])
+    for summary in summaries:
+        if summary['error'] is not None:
+            p.add_row([colored(summary['name'], 'blue'),
+                       colored(summary['error'], 'yellow'), '', '', ''])
+            continue
+        total = summary['total']
+        p.add_row([colored(summary['name'], 'blue'),
+                   len(summary['users']),
+                   locale.currency(summary['sum']),
+                   locale.currency(total) if total is not None else '',
+                   '{:.2f}%'.format(summary['sum'] / total * 100)
+                   if total else ''])
+    p.add_row(['', colored('TOTAL', attrs=['bold']),
+               colored(locale.currency(sum(s['sum'] for s in summaries
+                                           if s['error'] is None)),
+                       attrs=['bold']), '', ''])
+    return p
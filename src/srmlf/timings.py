@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+
+def format_size(size):
+    if size is None:
+        return ''
+    for unit in ['B', 'KiB', 'MiB']:
+        if size < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024
+    return '{:.1f} GiB'.format(size)
+
+
+# Project hook adding up the wall time, and keeping the memory peak, of each
+# phase
+class Timings:
+
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    def __call__(self, name, duration, peak):
+        calls, total, max_peak = self.phases.get(name, (0, 0.0, None))
+        if peak is not None:
+            max_peak = max(max_peak or 0, peak)
+        self.phases[name] = (calls + 1, total + duration, max_peak)
+
+    # table of the phases, with a memory column when tracemalloc was tracing
+    def format(self, duration, peak=None):
+        peaks = [p for _, _, p in self.phases.values() if p is not None]
+        if peak is not None:
+            peaks.append(peak)
+        row = '{:<10} {:>7} {:>9.4f}s'
+        header = '{:<10} {:>7} {:>10}'.format('Phase', 'Calls', 'Time')
+        if peaks:
+            row += ' {:>12}'
+            header += ' {:>12}'.format('Peak memory')
+        lines = [header]
+        for name, (calls, total, max_peak) in self.phases.items():
+            lines.append(row.format(name, calls, total,
+                                    format_size(max_peak)))
+        lines.append(row.format('total', '', duration,
+                                format_size(max(peaks) if peaks else None)))
+        return '\n'.join(lines) + '\n'
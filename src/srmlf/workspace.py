@@ -0,0 +1,166 @@
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+
+from .journal import journal_path
+from .storage import get_backend
+
+logger = logging.getLogger('srmlf')
+
+
+def _stamp(p):
+    stamp = []
+    for path in (p.path, journal_path(p.path)):
+        try:
+            st = os.stat(path)
+        except OSError:
+            if path == p.path:
+                return None
+            continue
+        stamp += [st.st_size, st.st_mtime_ns]
+    return tuple(stamp)
+
+
+# Loaded projects are kept in a LRU cache, along with the size and mtime of
+# their file and journal when they were loaded. A project whose file changed
+# is loaded again. load is called with the name of the project to load it.
+class ProjectCache:
+
+    def __init__(self, load, size=128):
+        self.load = load
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, name):
+        entry = self.entries.get(name)
+        if entry is not None and _stamp(entry[0]) == entry[1]:
+            self.entries.move_to_end(name)
+            return entry[0]
+        logger.debug('Loading project %s', name)
+        p = self.load(name)
+        self.entries[name] = (p, _stamp(p))
+        self.entries.move_to_end(name)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return p
+
+    def add_contribs(self, name, label, contribs, date):
+        p = self.get(name)
+        with p.lock():
+            # the file may have been written to since it was checked
+            up_to_date = _stamp(p) == self.entries[name][1]
+            p.add_contribs(label, contribs, date)
+            p.save(append=True)
+            self.entries[name] = (p, _stamp(p))
+        if not up_to_date:
+            del self.entries[name]
+
+
+def _amounts(fieldnames, values):
+    return OrderedDict(zip(fieldnames, values))
+
+
+def project_totals(p):
+    contribs = p.get_total_contribs()
+    try:
+        shares = p.get_shares(contribs)
+    except ZeroDivisionError:
+        shares = []
+    return OrderedDict([('name', p.name),
+                        ('total', p.total),
+                        ('totals', _amounts(p.users, contribs)),
+                        ('shares', _amounts(p.users, shares))])
+
+
+def _row(line, fieldnames):
+    return OrderedDict(
+        (k, line[k].strftime('%Y-%m-%d') if k == 'Date' else line.get(k))
+        for k in fieldnames)
+
+
+def project_view(p, rows=None):
+    result = project_totals(p)
+    result['fieldnames'] = p.fieldnames
+    result['rows'] = [_row(line, p.fieldnames)
+                      for line in (p.iter_data() if rows is None else rows)]
+    return result
+
+
+# Projects of a data directory, for programs embedding SRMLF. Unlike the
+# command line, it neither changes the locale nor the logging configuration,
+# and it keeps the projects it read in memory. Results are made of dicts,
+# lists, strings and numbers, dates being given as YYYY-MM-DD.
+#
+#     workspace = Workspace('/srv/srmlf')
+#     workspace.add('holidays', 'Train tickets', {'Alice': 120})
+#     workspace.totals('holidays')['shares']
+class Workspace:
+
+    def __init__(self, data_dir, storage='csv', cache_size=128,
+                 create=False):
+        self.data_dir = os.path.abspath(data_dir)
+        self.backend = get_backend(storage) if isinstance(storage, str) \
+            else storage
+        if create:
+            os.makedirs(self.data_dir, exist_ok=True)
+        self.cache = ProjectCache(partial(self.backend,
+                                          data_dir=self.data_dir), cache_size)
+
+    def project(self, name):
+        return self.cache.get(name)
+
+    def projects(self):
+        return self.backend.list_projects(self.data_dir)
+
+    def create(self, name, users, total=None):
+        self.backend.create(name, list(users), total, self.data_dir)
+        return self.totals(name)
+
+    def add(self, name, label, contribs, date=None):
+        if isinstance(contribs, dict):
+            contribs = list(contribs.items())
+        self.cache.add_contribs(name, label, contribs,
+                                date if date is not None else datetime.now())
+        return self.totals(name)
+
+    def totals(self, name):
+        return project_totals(self.project(name))
+
+    # since and until are datetimes, see Project.select_rows()
+    def view(self, name, since=None, until=None, last=None, page=None,
+             page_size=50):
+        p = self.project(name)
+        rows = None
+        if since or until or last or page:
+            rows = p.select_rows(since, until, last, page, page_size)
+        return project_view(p, rows)
+
+    def report(self, name, by='month'):
+        from .report import report
+        p = self.project(name)
+        return [OrderedDict([('period', period['period'])] +
+                            [(key, _amounts(p.users, period[key]))
+                             for key in ('totals', 'cumulative', 'balances')])
+                for period in report(p, by)]
+
+    # settles the given project, or every project at once
+    def settle(self, name=None):
+        from .settle import balances, settle, settle_all
+        if name is not None:
+            p = self.project(name)
+            transfers, left = settle(balances(p.users, p.get_total_contribs(),
+                                              p.total))
+        else:
+            transfers, left = settle_all(self.summary())
+        return OrderedDict([
+            ('transfers', [OrderedDict([('from', debtor), ('to', creditor),
+                                        ('amount', amount)])
+                           for debtor, creditor, amount in transfers]),
+            ('left', left)])
+
+    def summary(self, jobs=1):
+        from .summary import summarize_all
+        return summarize_all(self.projects(), jobs, self.backend,
+                             self.data_dir)
@@ -0,0 +1,49 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+
+# data directory of the projects, without any project
+@pytest.fixture
+def empty_data_dir(tmpdir):
+    with patch('srmlf.project.DATA_DIR', str(tmpdir)):
+        yield tmpdir
+
+
+# data directory holding the project 'test', a copy of project1.csv
+@pytest.fixture
+def data_dir(empty_data_dir):
+    fixture = os.path.join('tests', 'fixtures', 'project1.csv')
+    shutil.copy(fixture, str(empty_data_dir.join('test.csv')))
+    return empty_data_dir
+
+
+@pytest.fixture
+def snapshot_dir(data_dir):
+    with patch('srmlf.project.Project.snapshot', True):
+        yield data_dir
+
+
+@pytest.fixture
+def journal_dir(data_dir):
+    with patch('srmlf.project.Project.journal', True):
+        yield data_dir
+
+
+# amounts formatted the same whatever the locale
+@pytest.fixture
+def dollars():
+    with patch('locale.currency', side_effect='${:.2f}'.format):
+        yield
+
+
+# exchange rates to EUR, the currency of the locale
+@pytest.fixture
+def rates_file(data_dir):
+    data_dir.join('.rates.csv').write('Date,Currency,EUR\n'
+                                      '2016-01-01,USD,0.5\n'
+                                      '2016-01-23,USD,0.25\n')
+    with patch('srmlf.rates.local_currency', return_value='EUR'):
+        yield data_dir
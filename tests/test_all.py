@@ -1,2 +1,47 @@
+import os
+import subprocess
+import sys
+
+# cumulative import time of the srmlf package, in times that of argparse and
+# logging, which it needs anyway, so that it does not depend on the machine
+IMPORT_TIME_BUDGET = 3
+
+
 def test_import():
     import srmlf
+
+
+def import_srmlf(code='', module='srmlf'):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                           'import {}\n'.format(module) + code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          env=env, universal_newlines=True, check=True)
+
+
+def test_deferred_imports():
+    result = import_srmlf('import sys\n'
+                          'print(" ".join(sorted(sys.modules)))')
+    modules = result.stdout.split()
+    for name in ['coloredlogs', 'prettytable', 'termcolor',
+                 'concurrent.futures']:
+        assert name not in modules
+
+
+# Shortest cumulative import time of the modules, in microseconds
+def import_time(*modules):
+    timings = []
+    for _ in range(3):
+        total = 0
+        stderr = import_srmlf(module=', '.join(modules)).stderr
+        for line in stderr.splitlines():
+            fields = [f.strip() for f in line.split('|')]
+            if len(fields) == 3 and fields[2] in modules:
+                total += int(fields[1])
+        timings.append(total)
+    return min(timings)
+
+
+def test_import_time():
+    baseline = import_time('argparse', 'logging')
+    assert import_time('srmlf') < baseline * IMPORT_TIME_BUDGET
@@ -0,0 +1,135 @@
+import csv
+import os
+import time
+import timeit
+from collections import OrderedDict
+from datetime import date, datetime
+
+from srmlf.columns import ColumnStore
+
+# use SRMLF_BENCH_ROWS=1000000 for the full size ledger
+BENCH_ROWS = int(os.environ.get('SRMLF_BENCH_ROWS', 100000))
+
+
+def build_store(rows):
+    store = ColumnStore(['Description', 'Date', 'Alice', 'Bob'])
+    date = datetime(2016, 1, 21)
+    for i in range(rows):
+        store.append({'Description': 'row', 'Date': date,
+                      'Alice': float(i), 'Bob': 1.0})
+    return store
+
+
+def time_add_user(store, users=1000):
+    names = iter(range(len(store.fieldnames), 10 ** 9))
+
+    def add_users():
+        for _ in range(users):
+            store.add_column('user{}'.format(next(names)))
+    return min(timeit.repeat(add_users, number=1, repeat=5))
+
+
+# users added to the rows in memory, saving them is timed by
+# test_add_user_saved
+def test_add_user_is_flat():
+    small = time_add_user(build_store(1000))
+    large = time_add_user(build_store(100000))
+    # a per-row cost would make the large store 100 times slower
+    assert large < small * 10
+
+
+def write_ledger(path, rows):
+    first_day = date(2016, 1, 1).toordinal()
+    with open(path, 'w') as fd:
+        writer = csv.writer(fd)
+        writer.writerow(['Description', 'Date', 'Alice', 'Bob', 'Carol'])
+        for i in range(rows):
+            writer.writerow(['row {}'.format(i),
+                             date.fromordinal(first_day + i // 50),
+                             '{:.2f}'.format(i % 97), '', '1.5'])
+
+
+def legacy_parse(reader):
+    # row parsing as done before the columnar store and the date parser
+    data = []
+    for item in reader:
+        ordered_item = OrderedDict()
+        for field in reader.fieldnames:
+            val = item.get(field, '')
+            if field == 'Date':
+                val = datetime.strptime(val, '%Y-%m-%d')
+            elif field != 'Description':
+                val = float(val) if val != '' else 0.0
+            ordered_item[field] = val
+        data.append(ordered_item)
+    return data
+
+
+def test_parse_speedup(tmpdir):
+    path = str(tmpdir.join('ledger.csv'))
+    write_ledger(path, BENCH_ROWS)
+
+    with open(path) as fd:
+        start = time.perf_counter()
+        legacy_parse(csv.DictReader(fd))
+        legacy = time.perf_counter() - start
+
+    with open(path) as fd:
+        start = time.perf_counter()
+        reader = csv.DictReader(fd)
+        store = ColumnStore(reader.fieldnames)
+        store.extend_csv(reader.reader, reader.fieldnames)
+        fast = time.perf_counter() - start
+
+    last_day = date(2016, 1, 1).toordinal() + (BENCH_ROWS - 1) // 50
+    assert len(store) == BENCH_ROWS
+    assert store[-1]['Date'].date() == date.fromordinal(last_day)
+    assert fast * 1.5 < legacy
+
+
+# Saving a new user writes the new header, which does not fit in the place
+# of the old one, and copies the rows after it byte for byte: it costs
+# O(file size), but does not parse or format any row like a rewrite does.
+def test_add_user_saved(tmpdir):
+    from unittest.mock import patch
+    from srmlf.project import Project
+    write_ledger(str(tmpdir.join('ledger.csv')), BENCH_ROWS)
+    names = iter(range(10 ** 9))
+
+    def add_user(lazy=True, append=True):
+        p = Project('ledger', lazy=lazy)
+        p.add_user('user{}'.format(next(names)))
+        p.save(append=append)
+
+    with patch('srmlf.project.DATA_DIR', str(tmpdir)):
+        appended = min(timeit.repeat(add_user, number=1, repeat=3))
+        rewritten = min(timeit.repeat(lambda: add_user(False, False),
+                                      number=1, repeat=3))
+        assert Project('ledger', lazy=True).users[-1] == \
+            'user{}'.format(next(names) - 1)
+    assert appended * 20 < rewritten
+
+
+# use SRMLF_BENCH_USERS=1000000 for the full size settlement
+BENCH_USERS = int(os.environ.get('SRMLF_BENCH_USERS', 100000))
+
+
+def test_settle_scales():
+    import random
+    from srmlf.settle import balances, settle
+    rng = random.Random(42)
+
+    def time_settle(users):
+        names = ['user{}'.format(i) for i in range(users)]
+        user_balances = balances(
+            names, [round(rng.uniform(0, 1000), 2) for _ in names])
+        start = time.perf_counter()
+        transfers, left = settle(user_balances)
+        duration = time.perf_counter() - start
+        assert len(transfers) < users
+        return duration
+
+    small = time_settle(BENCH_USERS // 100)
+    large = time_settle(BENCH_USERS)
+    # a quadratic algorithm would make it 10000 times slower
+    assert large < small * 1000
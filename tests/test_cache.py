@@ -0,0 +1,121 @@
+import os
+import shutil
+import json
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import cache
+
+
+@pytest.fixture
+def project_path(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    shutil.copy(os.path.join('tests', 'fixtures', 'project1.csv'), path)
+    return path
+
+
+def append(path, line):
+    with open(path, 'a') as fd:
+        fd.write(line)
+
+
+def test_cache_path():
+    assert cache.cache_path('/data/test_(100).csv') == \
+        '/data/.test_(100).csv.totals'
+
+
+def test_load_totals(project_path):
+    fieldnames, totals, count = cache.load_totals(project_path)
+    assert fieldnames == ['Description', 'Date', 'Alice', 'Bob']
+    assert totals == {'Alice': 10.0, 'Bob': 5.0}
+    assert count == 2
+    with open(cache.cache_path(project_path)) as fd:
+        cached = json.load(fd)
+    assert cached['count'] == 2
+    assert cached['offset'] == os.path.getsize(project_path)
+
+
+def test_load_totals_cached(project_path):
+    cache.load_totals(project_path)
+    with patch('srmlf.cache.sum_csv') as sum_csv:
+        assert cache.load_totals(project_path)[2] == 2
+        assert sum_csv.call_count == 0
+
+
+def test_load_totals_appended(project_path):
+    cache.load_totals(project_path)
+    # tamper with the cached totals to check they are reused
+    with open(cache.cache_path(project_path)) as fd:
+        cached = json.load(fd)
+    cached['totals']['Alice'] = 100.0
+    with open(cache.cache_path(project_path), 'w') as fd:
+        json.dump(cached, fd)
+    append(project_path, 'Third,2016-01-23,1.5,2\n')
+    fieldnames, totals, count = cache.load_totals(project_path)
+    assert totals == {'Alice': 101.5, 'Bob': 7.0}
+    assert count == 3
+    with open(cache.cache_path(project_path)) as fd:
+        assert json.load(fd)['offset'] == os.path.getsize(project_path)
+
+
+def test_load_totals_modified(project_path):
+    cache.load_totals(project_path)
+    with open(project_path) as fd:
+        content = fd.read()
+    with open(project_path, 'w') as fd:
+        fd.write(content.replace('10.0', '20.0'))
+    append(project_path, 'Third,2016-01-23,1,\n')
+    assert cache.load_totals(project_path)[1] == {'Alice': 21.0, 'Bob': 5.0}
+
+
+def test_load_totals_modified_start(project_path):
+    for i in range(500):
+        append(project_path, 'Row {},2016-01-23,1,\n'.format(i))
+    cache.load_totals(project_path)
+    with open(project_path, 'r+b') as fd:
+        content = fd.read()
+        fd.seek(0)
+        # same size, far from the end of the file
+        fd.write(content.replace(b'10.0', b'20.0', 1))
+    append(project_path, 'Third,2016-01-23,1,\n')
+    assert cache.load_totals(project_path)[1] == {'Alice': 521.0, 'Bob': 5.0}
+
+
+def test_load_totals_appended_while_reading(project_path):
+    sum_csv = cache.sum_csv
+
+    def sum_then_append(*args):
+        count = sum_csv(*args)
+        append(project_path, 'Third,2016-01-23,1,\n')
+        return count
+    with patch('srmlf.cache.sum_csv', side_effect=sum_then_append):
+        assert cache.load_totals(project_path)[1] == {'Alice': 10.0,
+                                                      'Bob': 5.0}
+    assert cache.load_totals(project_path)[1] == {'Alice': 11.0, 'Bob': 5.0}
+    assert cache.load_totals(project_path)[2] == 3
+
+
+def test_load_totals_incomplete_line(project_path):
+    with open(project_path) as fd:
+        content = fd.read()
+    with open(project_path, 'w') as fd:
+        fd.write(content.rstrip('\n'))
+    assert cache.load_totals(project_path)[1] == {'Alice': 10.0, 'Bob': 5.0}
+    append(project_path, '1\n')
+    assert cache.load_totals(project_path)[1] == {'Alice': 10.0, 'Bob': 5.01}
+
+
+def test_invalid_cache(project_path):
+    with open(cache.cache_path(project_path), 'w') as fd:
+        fd.write('{"count": 12}')
+    assert cache.load_totals(project_path)[2] == 2
+
+
+def test_load_days(project_path):
+    fieldnames, days = cache.load_days(project_path)
+    assert days == {'2016-01-21': {'Alice': 10.0},
+                    '2016-01-22': {'Bob': 5.0}}
+    append(project_path, 'Third,2016-01-22 00:00:00,1.5,2\n')
+    fieldnames, days = cache.load_days(project_path)
+    assert days['2016-01-22'] == {'Alice': 1.5, 'Bob': 7.0}
@@ -0,0 +1,202 @@
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import columns
+from srmlf.columns import ColumnStore
+
+
+def make_row(description, date, **amounts):
+    row = OrderedDict([('Description', description), ('Date', date)])
+    row.update(amounts)
+    return row
+
+
+@pytest.fixture
+def store():
+    s = ColumnStore(['Description', 'Date', 'Alice', 'Bob'])
+    s.append(make_row('First', datetime(2016, 1, 21), Alice=10.0, Bob=0.0))
+    s.append(make_row('Second', datetime(2016, 1, 22), Alice=0.0, Bob=5.0))
+    return s
+
+
+def test_init():
+    s = ColumnStore(['Description', 'Date', 'Alice'])
+    assert len(s) == 0
+    assert s.fieldnames == ['Description', 'Date', 'Alice']
+    assert list(s.amounts.keys()) == ['Alice']
+    assert isinstance(s.amounts['Alice'], array)
+
+
+def test_rows(store):
+    assert len(store) == 2
+    assert isinstance(store[0], OrderedDict)
+    assert list(store[0].keys()) == ['Description', 'Date', 'Alice', 'Bob']
+    assert store[0]['Date'] == datetime(2016, 1, 21)
+    assert store[-1]['Bob'] == 5.0
+    assert [r['Description'] for r in store] == ['First', 'Second']
+    assert [r['Description'] for r in store[1:]] == ['Second']
+    with pytest.raises(IndexError):
+        store[2]
+
+
+def test_append_new_column(store):
+    store.append(make_row('Third', datetime(2016, 1, 23), Carol=2.0))
+    assert store.fieldnames[-1] == 'Carol'
+    assert store[0]['Carol'] == 0.0
+    assert store[2]['Carol'] == 2.0
+    assert store[2]['Alice'] == 0.0
+
+
+def test_add_column(store):
+    store.add_column('Carol')
+    store.add_column('Alice')
+    assert store.fieldnames == ['Description', 'Date', 'Alice', 'Bob',
+                                'Carol']
+    assert store[1]['Carol'] == 0.0
+
+
+def test_column_sums(store):
+    assert store.column_sums(['Alice', 'Bob', 'Nobody']) == [10.0, 5.0, 0.0]
+
+
+def test_sparse_column(store):
+    store.add_column('Carol')
+    assert len(store.amounts['Carol']) == 0
+    assert store.offsets['Carol'] == 2
+    store.append(make_row('Third', datetime(2016, 1, 23), Carol=2.0))
+    assert len(store.amounts['Carol']) == 1
+    assert store.get('Carol', 0) == 0.0
+    assert store.get('Carol', 2) == 2.0
+    assert store.column_sums(['Carol']) == [2.0]
+
+
+def test_parse_date():
+    assert columns.parse_date('2016-01-21') == datetime(2016, 1, 21)
+    assert columns.parse_date('2016-01-21 00:00:00') == datetime(2016, 1, 21)
+    assert columns.date_ordinal('2016-01-21') == \
+        datetime(2016, 1, 21).toordinal()
+    assert columns.parse_date('2016-1-21') == datetime(2016, 1, 21)
+    for val in ['2016-02-30', '21/01/2016', '', '2016-+1-21']:
+        with pytest.raises(ValueError):
+            columns.parse_date(val)
+
+
+def test_extend_csv():
+    s = ColumnStore()
+    rows = [['First', '2016-01-21', '10.0', ''],
+            [],
+            ['Second', '2016-01-22', '', '5.0'],
+            ['Third', '2016-01-23', '1']]
+    with patch('srmlf.columns.CHUNK_SIZE', 2):
+        s.extend_csv(iter(rows), ['Description', 'Date', 'Alice', 'Bob'])
+    assert len(s) == 3
+    assert s.fieldnames == ['Description', 'Date', 'Alice', 'Bob']
+    assert s[0]['Date'] == datetime(2016, 1, 21)
+    assert s.column_sums(['Alice', 'Bob']) == [11.0, 5.0]
+
+
+def test_extend_csv_missing_column(store):
+    store.add_column('Carol')
+    store.extend_csv([['Third', '2016-01-23', '1', '2']],
+                     ['Description', 'Date', 'Alice', 'Bob'])
+    assert store[2]['Carol'] == 0.0
+    assert store[2]['Bob'] == 2.0
+
+
+def test_extend_csv_invalid():
+    with pytest.raises(ValueError):
+        ColumnStore().extend_csv([['First', '2016-01-21', 'abc']],
+                                 ['Description', 'Date', 'Alice'])
+
+
+def test_date_range(store):
+    store.append(make_row('Third', datetime(2016, 1, 22)))
+    store.append(make_row('Fourth', datetime(2016, 2, 1)))
+    assert store.sorted
+    assert store.date_range() == range(0, 4)
+    assert store.date_range(datetime(2016, 1, 22)) == range(1, 4)
+    assert store.date_range(until=datetime(2016, 1, 22)) == range(0, 3)
+    assert store.date_range(datetime(2016, 1, 23),
+                            datetime(2016, 1, 31)) == range(3, 3)
+    assert store.date_range(datetime(2016, 2, 2),
+                            datetime(2016, 1, 1)) == range(4, 4)
+
+
+def test_date_range_unsorted(store):
+    store.append(make_row('Third', datetime(2016, 1, 1)))
+    assert not store.sorted
+    assert store.date_range(datetime(2016, 1, 21)) == [0, 1]
+    assert store.date_range(until=datetime(2016, 1, 21)) == [0, 2]
+
+
+def test_extend_csv_sorted():
+    s = ColumnStore()
+    s.extend_csv([['a', '2016-01-01'], ['b', '2016-01-02']],
+                 ['Description', 'Date'])
+    assert s.sorted
+    s.extend_csv([['c', '2016-01-01']], ['Description', 'Date'])
+    assert not s.sorted
+
+
+def test_day_sums(store):
+    store.add_column('Carol')
+    store.append(make_row('Third', datetime(2016, 1, 22), Alice=1.0,
+                          Carol=2.0))
+    day = datetime(2016, 1, 22).toordinal()
+    days = store.day_sums(['Alice', 'Bob', 'Carol', 'Dave'])
+    assert days == {day - 1: [10.0, 0.0, 0.0, 0.0],
+                    day: [1.0, 5.0, 2.0, 0.0]}
+    days = store.day_sums(['Alice'], {day: [3.0]})
+    assert days[day] == [4.0]
+
+
+def test_set_row(store):
+    store.set_row(0, make_row('Changed', datetime(2016, 1, 20), Bob=1.0))
+    assert store[0] == make_row('Changed', datetime(2016, 1, 20),
+                                Alice=0.0, Bob=1.0)
+    assert store.sorted
+    store.add_column('Carol')
+    store.append(make_row('Third', datetime(2016, 1, 23), Carol=3.0))
+    # Carol's column starts at the third row
+    store.set_row(0, make_row('Changed', datetime(2016, 1, 24), Carol=2.0))
+    assert [r['Carol'] for r in store] == [2.0, 0.0, 3.0]
+    assert not store.sorted
+
+
+def test_delete_row(store):
+    store.add_column('Carol')
+    store.append(make_row('Third', datetime(2016, 1, 23), Carol=3.0))
+    store.delete_row(0)
+    assert [r['Description'] for r in store] == ['Second', 'Third']
+    assert [r['Carol'] for r in store] == [0.0, 3.0]
+    store.delete_row(1)
+    assert store.column_sums(['Alice', 'Bob', 'Carol']) == [0.0, 5.0, 0.0]
+
+
+def test_currencies(store):
+    assert store.currencies is None
+    store.append(make_row('Third', datetime(2016, 1, 23), Alice=1.0,
+                          Currency='USD'))
+    assert store.currencies == ['', '', 'USD']
+    assert store[2]['Currency'] == 'USD'
+    assert 'Currency' not in store.amounts
+    store.extend_csv([['Fourth', '2016-01-24', '', '2.0', 'GBP']],
+                     ['Description', 'Date', 'Alice', 'Bob', 'Currency'])
+    assert store.currencies == ['', '', 'USD', 'GBP']
+    store.delete_row(0)
+    assert store.currencies == ['', 'USD', 'GBP']
+
+
+def test_sums_with_factors(store):
+    store.add_column('Carol')
+    store.append(make_row('Third', datetime(2016, 1, 22), Carol=4.0))
+    factors = array('d', [2.0, 1.0, 0.5])
+    assert store.column_sums(['Alice', 'Bob', 'Carol', 'Dan'], factors) == \
+        [20.0, 5.0, 2.0, 0.0]
+    assert store.day_sums(['Alice', 'Carol'], factors=factors) == \
+        {datetime(2016, 1, 21).toordinal(): [20.0, 0.0],
+         datetime(2016, 1, 22).toordinal(): [0.0, 2.0]}
@@ -0,0 +1,81 @@
+import multiprocessing
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import project
+
+WRITERS = 8
+ADDS = 25
+
+
+def adder(writer):
+    for i in range(ADDS):
+        p = project.Project('test', lazy=True)
+        # half of the writers add a user column along the way
+        user = 'User {}'.format(writer) if writer % 2 else 'Alice'
+        p.add_contribs('{} {}'.format(writer, i), [(user, 1)],
+                       datetime(2016, 2, 1))
+        p.save(append=True)
+
+
+def test_parallel_adders(data_dir):
+    ctx = multiprocessing.get_context('fork')
+    processes = [ctx.Process(target=adder, args=(w,))
+                 for w in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    p = project.Project('test')
+    assert len(p.data) == 2 + WRITERS * ADDS
+    assert sorted(p.users) == sorted(
+        ['Alice', 'Bob'] + ['User {}'.format(w) for w in range(1, WRITERS, 2)])
+    totals = dict(zip(p.users, p.get_total_contribs()))
+    assert totals['Alice'] == 10 + ADDS * (WRITERS // 2)
+    assert totals['Bob'] == 5
+    for w in range(1, WRITERS, 2):
+        assert totals['User {}'.format(w)] == ADDS
+    descriptions = set(row['Description'] for row in p.data)
+    assert len(descriptions) == 2 + WRITERS * ADDS
+
+
+def descriptions():
+    return [row['Description'] for row in project.Project('test').data]
+
+
+@pytest.mark.parametrize('journal', [False, True])
+def test_save_after_other_append(data_dir, journal):
+    p = project.Project('test')
+    with patch.object(project.Project, 'journal', journal):
+        other = project.Project('test', lazy=True)
+        other.add_contribs('Other', [('Carol', 2)], datetime(2016, 2, 1))
+        other.save(append=True)
+    p.add_contribs('Mine', [('Alice', 1)], datetime(2016, 2, 2))
+    p.save()
+    assert descriptions() == ['First contribution', 'Second contribution',
+                              'Other', 'Mine']
+    assert project.Project('test').users == ['Alice', 'Bob', 'Carol']
+
+
+def test_delete_after_other_append(data_dir):
+    p = project.Project('test')
+    other = project.Project('test', lazy=True)
+    other.add_contribs('Other', [('Bob', 2)], datetime(2016, 2, 1))
+    other.save(append=True)
+    p.delete_row(3)
+    assert descriptions() == ['First contribution', 'Second contribution']
+
+
+def test_lock_is_reentrant(data_dir):
+    p = project.Project('test')
+    with p.lock():
+        fd = p._lock_fd
+        with p.lock():
+            assert p._lock_fd == fd
+        assert p._lock_fd == fd
+    assert p._lock_fd is None
+    assert data_dir.join('.test.csv.lock').check()
@@ -38,3 +38,11 @@ def test_corrupted_project_exception():
 
     with pytest.raises(exceptions.SRMLFException):
         raise exceptions.SRMLFException()
+
+
+def test_invalid_record_exception():
+    with pytest.raises(exceptions.InvalidRecordException):
+        raise exceptions.InvalidRecordException()
+
+    with pytest.raises(exceptions.SRMLFException):
+        raise exceptions.SRMLFException()
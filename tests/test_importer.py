@@ -0,0 +1,85 @@
+import locale
+from datetime import datetime
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import importer, project
+from srmlf.exceptions import InvalidRecordException
+
+
+def local_date(date):
+    return date.strftime(locale.nl_langinfo(locale.D_FMT))
+
+
+def test_guess_format():
+    assert importer.guess_format('export.jsonl') == 'jsonl'
+    assert importer.guess_format('export.csv') == 'csv'
+    assert importer.guess_format('<stdin>') == 'csv'
+
+
+def test_read_csv_records():
+    fd = StringIO('Rent,{},Alice:500,Bob:500\n\n"Food, drinks",,Carol:1.5\n'
+                  .format(local_date(datetime(2016, 2, 1))))
+    records = list(importer.read_records(fd, 'csv'))
+    assert records[0] == ('Rent', [('Alice', 500.0), ('Bob', 500.0)],
+                          datetime(2016, 2, 1))
+    assert records[1][:2] == ('Food, drinks', [('Carol', 1.5)])
+    assert records[1][2].date() == datetime.now().date()
+
+
+def test_read_jsonl_records():
+    fd = StringIO('{{"label": "Rent", "date": "{}", "contribs": ["Alice:5"]}}'
+                  '\n{{"label": "Food", "contribs": {{"Bob": 2}}}}\n'
+                  .format(local_date(datetime(2016, 2, 1))))
+    records = list(importer.read_records(fd, 'jsonl'))
+    assert records[0] == ('Rent', [('Alice', 5.0)], datetime(2016, 2, 1))
+    assert records[1][:2] == ('Food', [('Bob', 2.0)])
+
+
+def test_read_iso_dates():
+    fd = StringIO('Rent,2016-01-19,Alice:500\nFood,01/02/2016,Bob:2\n')
+    # a locale whose dates are not ISO ones
+    with patch('locale.nl_langinfo', return_value='%d/%m/%Y'):
+        records = list(importer.read_records(fd, 'csv'))
+    assert [record[2] for record in records] == [datetime(2016, 1, 19),
+                                                 datetime(2016, 2, 1)]
+
+
+@pytest.mark.parametrize('fmt,content', [
+    ('csv', 'Rent,,Alice:5\nFood,,Bob\n'),
+    ('csv', 'Rent,,Alice:5\nFood,nope,Bob:1\n'),
+    ('csv', 'Rent,,Alice:5\nFood,\n'),
+    ('csv', 'Rent,,Alice:5\nFood,2016-13-45,Bob:1\n'),
+    ('jsonl', '{"contribs": ["Alice:5"]}\n{"contribs": []}\n'),
+    ('jsonl', '{"contribs": ["Alice:5"]}\nnope\n'),
+])
+def test_read_invalid_records(fmt, content):
+    with pytest.raises(InvalidRecordException) as e:
+        list(importer.read_records(StringIO(content), fmt))
+    assert 'Record 2' in str(e.value)
+
+
+def test_import_records(data_dir):
+    p = project.Project('test', lazy=True)
+    fd = StringIO('Rent,,Alice:500,Bob:500\nFood,,Carol:1.5\n')
+    assert importer.import_records(p, importer.read_records(fd)) == 2
+    p = project.Project('test')
+    assert len(p.data) == 4
+    assert p.get_total_contribs() == [510.0, 505.0, 1.5]
+
+
+def test_import_invalid_records(data_dir):
+    content = data_dir.join('test.csv').read()
+    p = project.Project('test', lazy=True)
+    fd = StringIO('Rent,,Alice:500\nFood,,Carol\n')
+    with pytest.raises(InvalidRecordException):
+        importer.import_records(p, importer.read_records(fd))
+    assert data_dir.join('test.csv').read() == content
+
+
+def test_read_records_currency():
+    fd = StringIO('{"label": "Hotel", "contribs": ["Alice:100EUR"]}\n')
+    records = list(importer.read_records(fd, 'jsonl'))
+    assert records[0][1] == [('Alice', 100.0, 'EUR')]
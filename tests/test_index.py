@@ -0,0 +1,59 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import index
+
+
+@pytest.fixture
+def data_dir(tmpdir):
+    for filename in ['plain.csv', 'test_(100).csv', 'dup_(1).csv',
+                     'dup_(2).csv', '.test_(100).csv.totals', 'notes.txt']:
+        tmpdir.join(filename).write('Description,Date\n')
+    return tmpdir
+
+
+def test_parse_total():
+    assert index.parse_total('test_(100).csv') == 100.0
+    assert index.parse_total('/data/a_(1)_(2.5).csv') == 2.5
+    assert index.parse_total('test.csv') is None
+
+
+def test_rebuild(data_dir):
+    idx = index.rebuild(str(data_dir))
+    assert idx['test'] == ['test_(100).csv']
+    assert sorted(idx['dup']) == ['dup_(1).csv', 'dup_(2).csv']
+    assert 'plain' not in idx
+    with open(index.index_path(str(data_dir))) as fd:
+        assert json.load(fd) == idx
+
+
+def test_find(data_dir):
+    assert index.find(str(data_dir), 'test') == ['test_(100).csv']
+    assert index.find(str(data_dir), 'nope') == []
+    with patch('glob.glob') as glob:
+        assert index.find(str(data_dir), 'test') == ['test_(100).csv']
+        assert glob.call_count == 0
+
+
+def test_find_stale(data_dir):
+    index.rebuild(str(data_dir))
+    data_dir.join('test_(100).csv').rename(data_dir.join('test_(200).csv'))
+    assert index.find(str(data_dir), 'test') == ['test_(200).csv']
+
+
+def test_add(data_dir):
+    index.add(str(data_dir), 'new_(5).csv')
+    assert not data_dir.join(index.INDEX_FILENAME).check()
+    index.rebuild(str(data_dir))
+    data_dir.join('new_(5).csv').write('Description,Date\n')
+    index.add(str(data_dir), 'new_(5).csv')
+    index.add(str(data_dir), 'other.csv')
+    with patch('glob.glob') as glob:
+        assert index.find(str(data_dir), 'new') == ['new_(5).csv']
+        assert glob.call_count == 0
+
+
+def test_list_projects(data_dir):
+    assert index.list_projects(str(data_dir)) == ['dup', 'plain', 'test']
@@ -0,0 +1,203 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import journal, project, storage
+from srmlf.columns import ColumnStore
+from srmlf.exceptions import CorruptedProjectException, SRMLFException
+
+
+def add(name, contribs, day, lazy=True):
+    p = project.Project('test', lazy=lazy)
+    p.add_contribs(name, contribs, datetime(2016, 1, day))
+    p.save(append=True)
+    return p
+
+
+def test_journal_path():
+    assert journal.journal_path('/data/test.csv') == \
+        '/data/.test.csv.journal'
+
+
+# lines are read backwards by blocks, which may be smaller than them
+@pytest.mark.parametrize('block_size', [4096, 8])
+def test_append_read(tmpdir, block_size):
+    with patch('srmlf.journal.BLOCK_SIZE', block_size):
+        path = str(tmpdir.join('test.csv'))
+        tmpdir.join('test.csv').write('x')
+        assert journal.read(path) == []
+        assert not journal.is_live(path)
+        journal.append(path, [{'op': 'add', 'n': 1}])
+        journal.append(path, [{'op': 'add', 'n': 2}, {'op': 'add', 'n': 3}])
+        assert journal.is_live(path)
+        assert [r['n'] for r in journal.read(path)] == [1, 2, 3]
+        # the journal has been merged into a new file
+        tmpdir.join('test.csv.tmp').write('xy')
+        journal.mark_compacted(path, path + '.tmp')
+        assert [r['n'] for r in journal.read(path)] == [1, 2, 3]
+        os.replace(path + '.tmp', path)
+        assert journal.read(path) == []
+        assert not journal.is_live(path)
+        journal.append(path, [{'op': 'add', 'n': 4}])
+        assert [r['n'] for r in journal.read(path)] == [4]
+
+
+def test_orphaned_journal(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    tmpdir.join('test.csv').write('x')
+    journal.append(path, [{'op': 'add', 'n': 1}])
+    # the file changed without the journal being merged
+    os.utime(path, ns=(0, 0))
+    assert journal.is_live(path)
+    assert [r['n'] for r in journal.read(path)] == [1]
+    with pytest.raises(SRMLFException):
+        journal.append(path, [{'op': 'add', 'n': 2}])
+    assert [r['n'] for r in journal.read(path)] == [1]
+
+
+def test_torn_record(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    tmpdir.join('test.csv').write('x')
+    journal.append(path, [{'op': 'add', 'n': 1}, {'op': 'add', 'n': 2}])
+    with open(journal.journal_path(path), 'rb+') as fd:
+        fd.truncate(os.path.getsize(journal.journal_path(path)) - 3)
+    assert [r['n'] for r in journal.read(path)] == [1]
+    with open(journal.journal_path(path), 'a') as fd:
+        fd.write('00000000 {"op": "add", "n": 3}\n')
+    assert [r['n'] for r in journal.read(path)] == [1]
+
+
+def test_replay():
+    store = ColumnStore(['Description', 'Date', 'Alice'])
+    journal.replay([{'op': 'add', 'description': 'Foo', 'date': '2016-01-23',
+                     'amounts': {'Carol': 2.0}}], store)
+    assert list(store) == [{'Description': 'Foo',
+                            'Date': datetime(2016, 1, 23),
+                            'Alice': 0.0, 'Carol': 2.0}]
+    with pytest.raises(ValueError):
+        journal.replay([{'op': 'nope'}], store)
+
+
+def test_save_appends_to_journal(journal_dir):
+    csv_before = journal_dir.join('test.csv').read()
+    add('Third', [('Alice', 1)], 23)
+    add('Fourth', [('Carol', 2)], 24, lazy=False)
+    assert journal_dir.join('test.csv').read() == csv_before
+    assert len(journal.read(str(journal_dir.join('test.csv')))) == 2
+
+    for lazy in (True, False):
+        p = project.Project('test', lazy=lazy)
+        assert p.users == ['Alice', 'Bob', 'Carol']
+        assert p.get_total_contribs() == [11.0, 5.0, 2.0]
+        assert [line['Description'] for line in p.iter_data()] == \
+            ['First contribution', 'Second contribution', 'Third', 'Fourth']
+        assert list(p.get_daily_contribs().values())[-1] == [0.0, 0.0, 2.0]
+
+
+def test_journal_kept_until_compacted(journal_dir):
+    add('Third', [('Alice', 1)], 23)
+    with patch('srmlf.project.Project.journal', False):
+        add('Fourth', [('Bob', 2)], 24)
+    assert len(journal.read(str(journal_dir.join('test.csv')))) == 2
+
+
+def test_lazy_load_after_save(journal_dir):
+    p = add('Third', [('Alice', 1)], 23)
+    p.add_contribs('Fourth', [('Bob', 2)], datetime(2016, 1, 24))
+    p.load()
+    assert len(p.data) == 4
+    p.save(append=True)
+    assert project.Project('test').get_total_contribs() == [11.0, 7.0]
+
+
+def test_compact(journal_dir):
+    add('Third', [('Alice', 1)], 23)
+    p = project.Project('test', lazy=True)
+    add('Fourth', [('Carol', 2)], 24)
+    p.add_contribs('Fifth', [('Bob', 3)], datetime(2016, 1, 25))
+    assert p.compact() == 2
+    assert not os.path.exists(str(journal_dir.join('.test.csv.journal')))
+    with patch('srmlf.project.Project.journal', False):
+        p = project.Project('test')
+    assert p.get_total_contribs() == [11.0, 8.0, 2.0]
+    assert len(p.data) == 5
+    assert project.Project('test', lazy=True).compact() == 0
+
+
+def test_compact_interrupted(journal_dir):
+    add('Third', [('Alice', 1)], 23)
+    path = str(journal_dir.join('test.csv'))
+    # as if interrupted before removing the journal
+    with patch('srmlf.journal.remove'):
+        project.Project('test', lazy=True).compact()
+    assert journal_dir.join('.test.csv.journal').check()
+    assert journal.read(path) == []
+    assert project.Project('test').get_total_contribs() == [11.0, 5.0]
+
+
+def test_touched_file(journal_dir):
+    add('Third', [('Alice', 100)], 23)
+    os.utime(str(journal_dir.join('test.csv')))
+    assert project.Project('test', lazy=True).get_total_contribs() == \
+        [110.0, 5.0]
+    with pytest.raises(SRMLFException):
+        add('Fourth', [('Bob', 1)], 24)
+    assert project.Project('test', lazy=True).compact() == 1
+    add('Fourth', [('Bob', 1)], 24)
+    assert project.Project('test').get_total_contribs() == [110.0, 6.0]
+
+
+def test_add_does_not_read_records(journal_dir):
+    add('Third', [('Carol', 1)], 23)
+    with patch('srmlf.journal._records') as records, \
+            patch('srmlf.journal.replay') as replay:
+        add('Fourth', [('Alice', 1)], 24)
+        assert not records.called
+        assert not replay.called
+    # the users of the journal are known once it is read
+    p = project.Project('test', lazy=True)
+    assert p.users == ['Alice', 'Bob', 'Carol']
+    assert p.get_total_contribs() == [11.0, 5.0, 1.0]
+    assert not p.loaded
+
+
+def test_corrupted_journal(journal_dir):
+    path = str(journal_dir.join('test.csv'))
+    journal.append(path, [{'op': 'nope'}])
+    with pytest.raises(CorruptedProjectException):
+        project.Project('test')
+    # lazy projects only read the journal when needed
+    p = project.Project('test', lazy=True)
+    with pytest.raises(CorruptedProjectException):
+        p.get_total_contribs()
+
+
+def test_sqlite_compact(tmpdir):
+    with patch('srmlf.project.DATA_DIR', str(tmpdir)):
+        p = storage.SQLiteProject.create('test', ['Alice'])
+        p.add_contribs('Foo', [('Alice', 1)], datetime(2016, 1, 21))
+        assert p.compact() == 0
+        assert storage.SQLiteProject('test').get_total_contribs() == [1.0]
+
+
+def test_journal_edit_and_rm(journal_dir):
+    add('Third', [('Alice', 1)], 23)
+    project.Project('test', lazy=True).edit_row(1, contribs=[('Bob', 2)])
+    project.Project('test', lazy=True).delete_row(3)
+    path = str(journal_dir.join('test.csv'))
+    assert [r['op'] for r in journal.read(path)] == ['add', 'edit', 'rm']
+    # the changes apply to the rows of the file, read as a whole
+    p = project.Project('test', lazy=True)
+    assert p.get_total_contribs() == [10.0, 7.0]
+    assert p.loaded
+    assert p.compact() == 3
+    assert project.Project('test').get_total_contribs() == [10.0, 7.0]
+
+
+def test_journal_currency(journal_dir):
+    add('Hotel', [('Alice', 10, 'USD')], 23)
+    p = project.Project('test')
+    assert p.fieldnames[-1] == 'Currency'
+    assert [line['Currency'] for line in p.data] == ['', '', 'USD']
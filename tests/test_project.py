@@ -10,6 +10,8 @@ from datetime import datetime
 import pytest
 
 from srmlf import project
+from srmlf.columns import ColumnStore
+from srmlf.exceptions import SRMLFException
 from localemock import LocaleMock
 
 
@@ -165,7 +167,7 @@ def test_consume_reader(project_file_1_fixture):
         isfile.return_value = True
         with patch('os.path.isfile', isfile, create=True):
             p = project.Project('test')
-            assert isinstance(p.data, list)
+            assert isinstance(p.data, ColumnStore)
             assert len(p.data) == 2
             assert isinstance(p.data[0], OrderedDict)
             assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob']
@@ -191,10 +193,11 @@ def test_consume_reader_corrupt(project_file_1_fixture):
 
 def test_consume_reader_direct(project_file_1_fixture):
     proj = MagicMock()
-    proj.data = []
+    proj.data = ColumnStore()
     proj.reader = csv.DictReader(project_file_1_fixture)
     project.Project._consume_reader(proj)
-    assert isinstance(proj.data, list)
+    assert isinstance(proj.data, ColumnStore)
+    assert len(proj.data) == 2
 
 
 def test_format():
@@ -226,7 +229,9 @@ def test_add_user(project_1_fixture):
     assert len(project_1_fixture.data) > 0
     assert 'Régis' in project_1_fixture.data[0].keys()
 
-    project_1_fixture.add_user('Date')
+    for field in ('Description', 'Date', 'Currency'):
+        with pytest.raises(SRMLFException):
+            project_1_fixture.add_user(field)
     assert len(project_1_fixture.fieldnames) == 5
 
 
@@ -274,12 +279,14 @@ def test_get_total_contribs(project_1_fixture):
 
 
 def test_save(project_1_fixture):
-    with patch('srmlf.project.open', create=True):
+    with patch('srmlf.project.open', create=True), patch('os.fsync'), \
+            patch('os.replace') as replace:
         dw = Mock()
         dw_obj = MagicMock()
         dw.return_value = dw_obj
         with patch('csv.DictWriter', dw, create=True) as dw:
             project_1_fixture.save()
+            assert replace.call_count == 1
             assert dw_obj.writerow.call_count == 2
             calls = [call(OrderedDict([
                 ('Description', 'First contribution'),
@@ -353,3 +360,302 @@ def test_prettify_with_total(project_2_fixture):
                      ': 10.00%{\'attrs\': [\'bold\']}',
                      ': 5.00%{\'attrs\': [\'bold\']}'
                      ])
+
+
+def test_save_append(data_dir):
+    p = project.Project('test')
+    p.add_contribs('test', [('Alice', 30)], datetime(2016, 1, 23))
+    with patch('csv.DictWriter.writeheader') as writeheader:
+        p.save(append=True)
+        assert writeheader.call_count == 0
+    lines = data_dir.join('test.csv').read().splitlines()
+    assert len(lines) == 4
+    assert lines[-1].startswith('test,2016-01-23')
+
+    p = project.Project('test')
+    assert len(p.data) == 3
+    assert p.data[2]['Alice'] == 30.0
+    assert p.data[2]['Date'] == datetime(2016, 1, 23)
+
+
+def test_save_append_new_user(data_dir):
+    p = project.Project('test')
+    p.add_contribs('test', [('John Doe', 1)], datetime(2016, 1, 23))
+    p.save(append=True)
+    p = project.Project('test')
+    assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob',
+                            'John Doe']
+    assert len(p.data) == 3
+    assert p.data[0]['John Doe'] == 0.0
+    assert p.data[2]['John Doe'] == 1.0
+
+
+def test_save_append_missing_newline(data_dir):
+    path = str(data_dir.join('test.csv'))
+    with open(path) as fd:
+        content = fd.read()
+    with open(path, 'w') as fd:
+        fd.write(content.rstrip('\n'))
+    p = project.Project('test')
+    p.add_contribs('test', [('Bob', 2)], datetime(2016, 1, 23))
+    p.save(append=True)
+    p = project.Project('test')
+    assert len(p.data) == 3
+    assert p.data[1]['Bob'] == 5.0
+    assert p.data[2]['Bob'] == 2.0
+
+
+def test_lazy_init(data_dir):
+    p = project.Project('test', lazy=True)
+    assert not p.loaded
+    assert len(p.data) == 0
+    assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob']
+    assert p.get_total_contribs() == [10.0, 5.0]
+    assert p.get_shares() == [pytest.approx(200 / 3), pytest.approx(100 / 3)]
+    rows = list(p.iter_data())
+    assert len(rows) == 2
+    assert rows[1]['Date'] == datetime(2016, 1, 22)
+    assert len(p.data) == 0
+
+
+def test_lazy_add_contribs(data_dir):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('test', [('Alice', 30), ('John Doe', 1)],
+                   datetime(2016, 1, 23))
+    assert p.get_total_contribs() == [40.0, 5.0, 1.0]
+    assert len(list(p.iter_data())) == 3
+    p.load()
+    assert p.loaded
+    assert len(p.data) == 3
+    assert p.data[0]['John Doe'] == 0.0
+    assert p.data[2]['John Doe'] == 1.0
+    p.save(append=True)
+    p = project.Project('test')
+    assert p.get_total_contribs() == [40.0, 5.0, 1.0]
+
+
+def test_lazy_load_after_save(data_dir):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Third', [('Alice', 1)], datetime(2016, 1, 23))
+    p.save(append=True)
+    p.add_contribs('Fourth', [('Bob', 2)], datetime(2016, 1, 24))
+    p.load()
+    assert len(p.data) == 4
+    assert p.get_total_contribs() == [11.0, 7.0]
+    p.save(append=True)
+    assert project.Project('test').get_total_contribs() == [11.0, 7.0]
+
+
+@pytest.mark.parametrize('journal', [False, True])
+def test_lazy_repeated_saves(data_dir, journal):
+    descriptions = ['First contribution', 'Second contribution', 'Row 0',
+                    'Row 1', 'Row 2', 'Unsaved']
+    with patch.object(project.Project, 'journal', journal):
+        p = project.Project('test', lazy=True)
+        for i in range(3):
+            p.add_contribs('Row {}'.format(i), [('Alice', 1)],
+                           datetime(2016, 1, 23))
+            p.save(append=True)
+        p.add_contribs('Unsaved', [('Bob', 2)], datetime(2016, 1, 24))
+        assert [line['Description'] for line in p.iter_data()] == \
+            descriptions
+        assert p.get_total_contribs() == [13.0, 7.0]
+        assert sum(map(sum, p.get_daily_contribs().values())) == 20.0
+        p.load()
+        assert [line['Description'] for line in p.iter_data()] == \
+            descriptions
+        assert p.get_total_contribs() == [13.0, 7.0]
+        p.save(append=True)
+    assert project.Project('test').get_total_contribs() == [13.0, 7.0]
+
+
+def test_lazy_corrupt_file(data_dir):
+    data_dir.join('test.csv').write('Description,Date,Alice\nx,2016-01-01,a\n')
+    p = project.Project('test', lazy=True)
+    with pytest.raises(project.CorruptedProjectException):
+        p.get_total_contribs()
+
+
+def test_prettify_totals_only(data_dir, dollars):
+    p = project.Project('test', lazy=True)
+    table = p.prettify(totals_only=True, color=False)
+    assert len(table.rows) == 2
+    assert table.rows[0][:4] == ['', 'TOTAL', '$10.00', '$5.00']
+    assert 'First contribution' not in str(table)
+    # the totals come from the cache, the rows are not read
+    assert not p.loaded
+
+
+def test_lazy_save_new_user(data_dir):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('test', [('John Doe', 1)], datetime(2016, 1, 23))
+    p.save(append=True)
+    assert not p.loaded
+    lines = data_dir.join('test.csv').read().splitlines()
+    assert lines[0] == 'Description,Date,Alice,Bob,John Doe'
+    assert lines[1] == 'First contribution,2016-01-21,10.0,'
+    p = project.Project('test')
+    assert p.get_total_contribs() == [10.0, 5.0, 1.0]
+
+
+def test_create_with_total(data_dir):
+    project.Project.create('other project', ['Alice'], 100)
+    assert data_dir.join('other_project_(100).csv').check()
+    p = project.Project('other project')
+    assert p.total == 100.0
+    assert p.filename == 'other_project_(100).csv'
+    with pytest.raises(project.ProjectDuplicateException):
+        project.Project.create('test', ['Alice'])
+
+
+def test_select_rows(data_dir):
+    p = project.Project('test', lazy=True)
+    for day in range(1, 11):
+        p.add_contribs(str(day), [('Alice', day)], datetime(2016, 2, day))
+
+    def descriptions(**kwargs):
+        return [r['Description'] for r in p.select_rows(**kwargs)]
+    assert len(descriptions()) == 12
+    assert descriptions(since=datetime(2016, 2, 9)) == ['9', '10']
+    assert descriptions(until=datetime(2016, 1, 31)) == \
+        ['First contribution', 'Second contribution']
+    assert descriptions(since=datetime(2016, 2, 2), last=2) == ['9', '10']
+    assert descriptions(last=50) == descriptions()
+    assert descriptions(page=2, page_size=5) == ['4', '5', '6', '7', '8']
+    assert descriptions(page=4, page_size=5) == []
+    assert descriptions(since=datetime(2016, 2, 1), last=5, page=2,
+                        page_size=2) == ['8', '9']
+
+
+def test_prettify_rows(data_dir):
+    p = project.Project('test')
+    with patch('prettytable.PrettyTable'), \
+            patch('srmlf.project.colored', side_effect=lambda v, *a, **k: v):
+        with patch('locale.currency', side_effect=str):
+            table = p.prettify(rows=p.select_rows(last=1))
+            assert table.add_row.call_count == 3
+            table.add_row.assert_any_call(['', "TOTAL"] + ['10.0', '5.0'])
+
+
+def test_cell_formatter():
+    with patch('srmlf.project.colored',
+               side_effect=lambda v, c: '{c}: {v}'.format(v=v, c=c)):
+        with patch('locale.currency', side_effect=str) as currency:
+            formatter = project.CellFormatter()
+            line = {'Description': 'test', 'Date': datetime(2016, 1, 22),
+                    'Alice': 10.0, 'Bob': 0.0}
+            fieldnames = ['Description', 'Date', 'Alice', 'Bob']
+            row = formatter.row(line, fieldnames)
+            assert row[0] == 'blue: test'
+            assert row[1].startswith('cyan: ')
+            assert row[2:] == ['10.0', '']
+            assert formatter.row(line, fieldnames) == row
+            assert currency.call_count == 1
+            assert len(formatter.dates) == 1
+            with pytest.raises(ValueError) as e:
+                formatter.date('test')
+            assert str(e.value) == 'test is not a valid date'
+
+
+def test_cell_formatter_no_color():
+    with patch('srmlf.project.colored') as colored:
+        with patch('locale.currency', side_effect=str):
+            formatter = project.CellFormatter(color=False)
+            assert formatter.format('Description', 'test') == 'test'
+            assert formatter.format('Date', datetime(2016, 1, 22)) == \
+                datetime(2016, 1, 22).strftime(formatter.date_format)
+            assert not colored.called
+
+
+def test_prettify_no_color(data_dir):
+    p = project.Project('test')
+    with patch('srmlf.project.colored') as colored:
+        with patch('locale.currency', side_effect=str):
+            table = p.prettify(color=False)
+            assert 'TOTAL' in str(table)
+            assert not colored.called
+
+
+def test_edit_row(data_dir):
+    p = project.Project('test', lazy=True)
+    p.edit_row(1, 'Changed', datetime(2016, 1, 20), [('Bob', 2)])
+    assert not p.loaded
+    p = project.Project('test')
+    assert [(line['Description'], line['Date'], line['Alice'], line['Bob'])
+            for line in p.data] == \
+        [('Changed', datetime(2016, 1, 20), 10.0, 2.0),
+         ('Second contribution', datetime(2016, 1, 22), 0.0, 5.0)]
+    p.edit_row(2, contribs=[('Carol', 1)])
+    p = project.Project('test', lazy=True)
+    assert p.users == ['Alice', 'Bob', 'Carol']
+    assert p.get_total_contribs() == [10.0, 7.0, 1.0]
+
+
+def test_edit_row_lazy(data_dir):
+    p = project.Project('test', lazy=True)
+    with patch.object(project.Project, 'load', side_effect=AssertionError):
+        p.edit_row(2, 'Two\nlines', contribs=[('Carol', 1)])
+        p.edit_row(1, contribs=[('Alice', 3)])
+        with pytest.raises(SRMLFException):
+            p.edit_row(3, 'Missing')
+    p = project.Project('test')
+    assert p.users == ['Alice', 'Bob', 'Carol']
+    assert [(line['Description'], line['Alice'], line['Bob'],
+             line['Carol']) for line in p.data] == \
+        [('First contribution', 3.0, 0.0, 0.0), ('Two\nlines', 0.0, 5.0, 1.0)]
+
+
+def test_delete_row(data_dir):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Third', [('Alice', 1)], datetime(2016, 1, 23))
+    p.save(append=True)
+    p.delete_row(p.find_row(datetime(2016, 1, 21), 'First contribution'))
+    assert len(p.data) == 2
+    assert project.Project('test', lazy=True).get_total_contribs() == \
+        [1.0, 5.0]
+    with pytest.raises(SRMLFException):
+        p.delete_row(3)
+    with pytest.raises(SRMLFException):
+        p.find_row(datetime(2016, 1, 21), 'First contribution')
+
+
+def test_add_contribs_currency(rates_file):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Hotel', [('Alice', 10, 'USD'), ('Carol', 4, 'USD')],
+                   datetime(2016, 1, 22))
+    with pytest.raises(SRMLFException):
+        p.add_contribs('Mixed', [('Alice', 10, 'USD'), ('Bob', 4)])
+    p.save(append=True)
+    p = project.Project('test', lazy=True)
+    assert p.users == ['Alice', 'Bob', 'Carol']
+    assert p.fieldnames[-2:] == ['Carol', 'Currency']
+    assert p.get_total_contribs() == [15.0, 5.0, 2.0]
+    p.add_contribs('Taxi', [('Bob', 8, 'USD')], datetime(2016, 1, 23))
+    assert p.get_total_contribs() == [15.0, 7.0, 2.0]
+    p.currency = 'USD'
+    assert p.get_total_contribs() == [30.0, 18.0, 4.0]
+    assert list(p.get_daily_contribs().values()) == \
+        [[20.0, 0.0, 0.0], [10.0, 10.0, 4.0], [0.0, 8.0, 0.0]]
+
+
+def test_total_rows_currency(rates_file):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Hotel', [('Alice', 10, 'USD')], datetime(2016, 1, 22))
+    formatter = project.CellFormatter(False)
+    with patch('locale.currency', lambda v, symbol=True: '{:.2f}'.format(v)
+               if not symbol else '${:.2f}'.format(v)):
+        assert formatter.row(p.data[0], p.fieldnames) == \
+            ['Hotel', formatter.date(datetime(2016, 1, 22)), '10.00 USD', '',
+             'USD']
+        assert p.total_rows(formatter)[0] == \
+            ['', 'TOTAL', '$15.00', '$5.00', 'EUR']
+        p.currency = 'USD'
+        assert p.total_rows(formatter)[0] == \
+            ['', 'TOTAL', '30.00 USD', '10.00 USD', 'USD']
+
+
+def test_add_contribs_meta_field(data_dir):
+    p = project.Project('test', lazy=True)
+    with pytest.raises(SRMLFException):
+        p.add_contribs('test', [('Currency', 5)])
+    assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob']
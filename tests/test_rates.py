@@ -0,0 +1,77 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import project, rates
+from srmlf.exceptions import SRMLFException, RateNotFoundException
+
+RATES = ('Date,Currency,EUR\n'
+         '2016-01-20,USD,0.9\n'
+         '2016-01-01,USD,0.8\n'
+         '2016-01-01,GBP,1.5\n')
+
+
+def day(d):
+    return datetime(2016, 1, d).toordinal()
+
+
+@pytest.fixture
+def table(tmpdir):
+    tmpdir.join('.rates.csv').write(RATES)
+    return rates.load(str(tmpdir))
+
+
+def test_rates_path():
+    assert rates.rates_path('/data') == '/data/.rates.csv'
+
+
+def test_rate(table):
+    assert table.reference == 'EUR'
+    assert table.rate('EUR', day(1)) == 1.0
+    assert table.rate('USD', day(19)) == 0.8
+    assert table.rate('USD', day(20)) == 0.9
+    assert table.rate('USD', day(31)) == 0.9
+    with pytest.raises(RateNotFoundException):
+        table.rate('USD', datetime(2015, 12, 31).toordinal())
+    with pytest.raises(RateNotFoundException):
+        table.rate('JPY', day(1))
+
+
+def test_factor(table):
+    assert table.factor('USD', day(21), 'EUR') == 0.9
+    assert table.factor('GBP', day(21), 'USD') == pytest.approx(1.5 / 0.9)
+    assert table.factor('JPY', day(21), 'JPY') == 1.0
+    assert list(table.factors(['USD', 'EUR', 'USD'],
+                              [day(1), day(1), day(21)], 'EUR')) == \
+        [0.8, 1.0, 0.9]
+    with patch.object(table, 'rate') as rate:
+        # factors are looked up once by currency, day and target
+        assert table.factor('USD', day(1), 'EUR') == 0.8
+        assert table.factor('USD', day(21), 'EUR') == 0.9
+        assert not rate.called
+
+
+def test_load(tmpdir, table):
+    assert rates.load(str(tmpdir)) is table
+    tmpdir.join('.rates.csv').write(RATES + '2016-01-01,JPY,0.01\n')
+    assert rates.load(str(tmpdir)).rate('JPY', day(1)) == 0.01
+
+
+def test_load_missing(tmpdir):
+    table = rates.load(str(tmpdir))
+    assert table.factor('EUR', day(1), 'EUR') == 1.0
+    with pytest.raises(RateNotFoundException):
+        table.factor('USD', day(1), 'EUR')
+
+
+def test_load_invalid(tmpdir):
+    for content in ['Date,Currency,Rate\n', 'Date,Currency,EUR\nnope\n',
+                    'Date,Currency,EUR\n2016-01-01,USD,x\n']:
+        tmpdir.join('.rates.csv').write(content)
+        with pytest.raises(SRMLFException):
+            rates.load(str(tmpdir))
+
+
+def test_rates_not_a_project(rates_file):
+    assert project.Project.list_projects() == ['test']
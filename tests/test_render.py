@@ -0,0 +1,67 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import project, render
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('totals_only', [False, True])
+def test_stream_table(data_dir, dollars, lazy, totals_only):
+    p = project.Project('test', lazy=lazy)
+    p.add_contribs('A much longer description', [('Carol', 1234.5)])
+    fd = io.StringIO()
+    render.stream_table(p, fd, totals_only=totals_only, color=False)
+    expected = str(p.prettify(totals_only=totals_only, color=False))
+    assert fd.getvalue() == expected + '\n'
+
+
+def test_stream_table_rows(data_dir, dollars):
+    p = project.Project('test')
+    fd = io.StringIO()
+    render.stream_table(p, fd, rows=p.select_rows(last=1), color=False)
+    lines = fd.getvalue().splitlines()
+    assert len(lines) == 7
+    assert 'Second contribution' in lines[3]
+    assert '$10.00' in lines[4]
+
+
+def test_stream_table_color(data_dir, dollars):
+    p = project.Project('test')
+    with patch('srmlf.project.colored',
+               side_effect=lambda v, *a, **k: '\x1b[1m{}\x1b[0m'.format(v)):
+        fd = io.StringIO()
+        render.stream_table(p, fd)
+    lines = fd.getvalue().splitlines()
+    assert '\x1b[1mFirst contribution\x1b[0m' in lines[3]
+    assert len(set(len(line.replace('\x1b[1m', '').replace('\x1b[0m', ''))
+                   for line in lines)) == 1
+
+
+def test_write_delimited(data_dir, dollars):
+    p = project.Project('test', lazy=True)
+    fd = io.StringIO()
+    render.write_delimited(p, fd, delimiter='\t')
+    assert fd.getvalue().splitlines() == [
+        'Description\tDate\tAlice\tBob',
+        'First contribution\t2016-01-21\t10.0\t0.0',
+        'Second contribution\t2016-01-22\t0.0\t5.0']
+
+
+def test_write_jsonl(data_dir, dollars):
+    p = project.Project('test', lazy=True)
+    fd = io.StringIO()
+    render.render(p, 'jsonl', fd)
+    rows = [json.loads(line) for line in fd.getvalue().splitlines()]
+    assert rows[1] == {'Description': 'Second contribution',
+                       'Date': '2016-01-22', 'Alice': 0.0, 'Bob': 5.0}
+
+
+def test_render_csv(data_dir, dollars):
+    p = project.Project('test')
+    fd = io.StringIO()
+    render.render(p, 'csv', fd, rows=p.select_rows(last=1))
+    assert fd.getvalue() == 'Description,Date,Alice,Bob\n' \
+        'Second contribution,2016-01-22,0.0,5.0\n'
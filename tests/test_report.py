@@ -0,0 +1,86 @@
+import io
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import project, report
+
+
+@pytest.fixture
+def test_project(data_dir):
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Third', [('Bob', 15)], datetime(2016, 2, 1))
+    p.add_contribs('Fourth', [('Alice', 2), ('Carol', 4)],
+                   datetime(2017, 1, 1))
+    return p
+
+
+def test_period_of():
+    date = datetime(2016, 1, 3)
+    assert report.period_of(date, 'year') == '2016'
+    assert report.period_of(date, 'month') == '2016-01'
+    assert report.period_of(date, 'week') == '2015-W53'
+    with pytest.raises(ValueError):
+        report.period_of(date, 'day')
+
+
+def test_daily_contribs(test_project):
+    days = test_project.get_daily_contribs()
+    assert list(days) == [datetime(2016, 1, 21).toordinal(),
+                          datetime(2016, 1, 22).toordinal(),
+                          datetime(2016, 2, 1).toordinal(),
+                          datetime(2017, 1, 1).toordinal()]
+    assert days[datetime(2017, 1, 1).toordinal()] == [2.0, 0.0, 4.0]
+    test_project.load()
+    assert test_project.get_daily_contribs() == days
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_report_month(test_project, lazy):
+    if not lazy:
+        test_project.load()
+    periods = report.report(test_project, 'month')
+    assert [p['period'] for p in periods] == ['2016-01', '2016-02', '2017-01']
+    assert periods[0]['totals'] == [10.0, 5.0, 0.0]
+    assert periods[1]['cumulative'] == [10.0, 20.0, 0.0]
+    assert periods[1]['balances'] == [0.0, 10.0, -10.0]
+    assert periods[2]['totals'] == [2.0, 0.0, 4.0]
+    assert periods[2]['cumulative'] == [12.0, 20.0, 4.0]
+
+
+def test_report_year(test_project):
+    periods = report.report(test_project, 'year')
+    assert [p['period'] for p in periods] == ['2016', '2017']
+    assert periods[0]['totals'] == [10.0, 20.0, 0.0]
+
+
+def test_report_cached(test_project):
+    report.report(test_project, 'week')
+    with patch('srmlf.cache.sum_csv') as sum_csv:
+        periods = report.report(test_project, 'week')
+        assert not sum_csv.called
+    assert [p['period'] for p in periods] == \
+        ['2016-W03', '2016-W05', '2016-W52']
+
+
+def test_format_report(test_project):
+    periods = report.report(test_project)
+    with patch('srmlf.report.colored', side_effect=lambda v, *a, **k: v), \
+            patch('locale.currency', side_effect='{:.2f}'.format):
+        table = report.format_report(test_project.users, periods)
+    lines = str(table).splitlines()
+    assert 'Carol' in lines[1]
+    assert '2016-02' in lines[5]
+    assert '(-10.00)' in lines[6]
+
+
+def test_write_report_jsonl(test_project):
+    fd = io.StringIO()
+    report.write_report_jsonl(test_project.users,
+                              report.report(test_project, 'year'), fd)
+    lines = [json.loads(line) for line in fd.getvalue().splitlines()]
+    assert lines[1]['period'] == '2017'
+    assert lines[1]['cumulative'] == {'Alice': 12.0, 'Bob': 20.0,
+                                      'Carol': 4.0}
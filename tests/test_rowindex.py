@@ -0,0 +1,91 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import rowindex
+from srmlf.cache import cache_path, load_totals
+from srmlf.exceptions import SRMLFException
+
+CONTENT = ('Description,Date,Alice,Bob\r\n'
+           'First,2016-01-21,10.0,\r\n'
+           '"Multi\r\nline, ""quoted""",2016-01-22,,5.0\r\n'
+           '\r\n'
+           'Third,2016-01-23,1.0,1.0')
+
+
+def write(tmpdir, content=CONTENT):
+    tmpdir.join('test.csv').write_binary(content.encode('utf-8'))
+    return str(tmpdir.join('test.csv'))
+
+
+def rows(path):
+    with open(path, 'rb') as fd:
+        return fd.read().decode('utf-8').split('\r\n')[1:]
+
+
+def test_rowindex_path():
+    assert rowindex.rowindex_path('/data/test.csv') == '/data/.test.csv.rows'
+
+
+def test_load(tmpdir):
+    path = write(tmpdir)
+    offsets = rowindex.load(path)
+    assert list(offsets) == [CONTENT.index('First'), CONTENT.index('"'),
+                             CONTENT.index('Third'), len(CONTENT)]
+    assert tmpdir.join('.test.csv.rows').check()
+    with patch('srmlf.rowindex._scan') as scan:
+        assert rowindex.load(path) == offsets
+        assert not scan.called
+
+
+def test_replace_row(tmpdir):
+    path = write(tmpdir)
+    line = {'Description': 'Second', 'Date': '2016-01-22', 'Alice': 2.0,
+            'Bob': ''}
+    assert rowindex.replace_row(path, 2, line, 3)
+    assert rows(path) == ['First,2016-01-21,10.0,', 'Second,2016-01-22,2.0,',
+                          'Third,2016-01-23,1.0,1.0']
+    assert rowindex.load(path) == rowindex._scan(open(path, 'rb'))
+    assert rowindex.replace_row(path, 1, None, 3)
+    assert rows(path) == ['Second,2016-01-22,2.0,', 'Third,2016-01-23,1.0,1.0']
+    assert not rowindex.replace_row(path, 1, dict(line, Carol=1.0), 2)
+
+
+def test_replace_row_by_chunks(tmpdir):
+    path = write(tmpdir, 'Description,Date,Alice\r\n' + ''.join(
+        'Row {},2016-01-21,1.0\r\n'.format(i) for i in range(100)))
+    line = {'Description': 'Longer row', 'Date': '2016-01-21', 'Alice': 2.0}
+    with patch('srmlf.rowindex.CHUNK_SIZE', 7):
+        rowindex.replace_row(path, 1, line, 100)
+        assert rows(path)[:2] == ['Longer row,2016-01-21,2.0',
+                                  'Row 1,2016-01-21,1.0']
+        rowindex.replace_row(path, 2, None, 100)
+    assert rows(path)[-2:] == ['Row 99,2016-01-21,1.0', '']
+    assert len(rows(path)) == 100
+    assert tmpdir.listdir(lambda f: f.ext == '.tmp') == []
+
+
+def test_replace_row_interrupted(tmpdir):
+    path = write(tmpdir)
+    with patch('os.replace', side_effect=OSError('disk full')), \
+            pytest.raises(OSError):
+        rowindex.replace_row(path, 1, None, 3)
+    with open(path, 'rb') as fd:
+        assert fd.read() == CONTENT.encode('utf-8')
+
+
+def test_replace_row_invalidates_cache(tmpdir):
+    path = write(tmpdir)
+    load_totals(path)
+    rowindex.replace_row(path, 1, {'Description': 'First',
+                                   'Date': '2016-01-21', 'Alice': 1.0,
+                                   'Bob': ''}, 3)
+    assert not os.path.exists(cache_path(path))
+    assert load_totals(path)[1] == {'Alice': 2.0, 'Bob': 6.0}
+
+
+def test_replace_row_changed_file(tmpdir):
+    path = write(tmpdir)
+    with pytest.raises(SRMLFException):
+        rowindex.replace_row(path, 1, None, 4)
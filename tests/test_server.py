@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+
+from srmlf import project, server, storage
+
+
+@pytest.fixture
+def app(data_dir):
+    return server.Application(project.Project)
+
+
+def test_list(app):
+    assert app.handle('GET', '/projects') == (200, {'projects': ['test']})
+
+
+def test_view(app):
+    status, result = app.handle('GET', '/projects/test')
+    assert status == 200
+    assert result['fieldnames'] == ['Description', 'Date', 'Alice', 'Bob']
+    assert result['rows'][0]['Date'] == '2016-01-21'
+    assert result['totals'] == {'Alice': 10.0, 'Bob': 5.0}
+    status, result = app.handle('GET', '/projects/test/totals')
+    assert status == 200
+    assert 'rows' not in result
+    assert list(result['shares']) == ['Alice', 'Bob']
+    assert round(sum(result['shares'].values())) == 100
+
+
+def test_errors(app):
+    assert app.handle('GET', '/projects/nope')[0] == 404
+    assert app.handle('GET', '/nope')[0] == 404
+    assert app.handle('GET', '/projects/test/nope')[0] == 404
+    assert app.handle('POST', '/projects/test')[0] == 405
+    assert app.handle('GET', '/projects/test/contributions')[0] == 405
+    for body in [b'nope', b'{}', b'{"contribs": {}}',
+                 b'{"contribs": ["Alice"]}',
+                 b'{"contribs": {"Alice": 1}, "date": "nope"}']:
+        status, _ = app.handle('POST', '/projects/test/contributions', body)
+        assert status == 400
+
+
+def test_add(app, data_dir):
+    body = json.dumps({'label': 'Third', 'date': '2016-01-23',
+                       'contribs': {'Alice': 2, 'Carol': 3}}).encode()
+    assert app.handle('POST', '/projects/test/contributions', body) == \
+        (201, {'added': 1})
+    body = b'{"label": "Fourth", "contribs": ["Bob:1"]}'
+    assert app.handle('POST', '/projects/test/contributions', body)[0] == 201
+    _, result = app.handle('GET', '/projects/test/totals')
+    assert result['totals'] == {'Alice': 12.0, 'Bob': 6.0, 'Carol': 3.0}
+    p = project.Project('test')
+    assert p.get_total_contribs() == [12.0, 6.0, 3.0]
+    assert p.data[2]['Date'].day == 23
+
+
+def test_cache_invalidation(app, data_dir):
+    cached = app.workspace.cache.get('test')
+    assert app.workspace.cache.get('test') is cached
+    p = project.Project('test', lazy=True)
+    p.add_contribs('External', [('Bob', 10)])
+    p.save(append=True)
+    assert app.workspace.cache.get('test') is not cached
+    _, result = app.handle('GET', '/projects/test/totals')
+    assert result['totals']['Bob'] == 15.0
+
+
+def test_sqlite(data_dir):
+    storage.SQLiteProject.create('test', ['Alice'])
+    app = server.Application(storage.SQLiteProject)
+    body = b'{"label": "First", "contribs": {"Alice": 4}}'
+    assert app.handle('POST', '/projects/test/contributions', body)[0] == 201
+    _, result = app.handle('GET', '/projects/test')
+    assert result['totals'] == {'Alice': 4.0}
+
+
+def test_serve_client(app):
+    async def request(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /projects/test/totals HTTP/1.1\r\n\r\n'
+                     b'GET /projects HTTP/1.1\r\nConnection: close\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        return response
+
+    loop = asyncio.new_event_loop()
+    try:
+        srv = loop.run_until_complete(
+            asyncio.start_server(app.serve_client, '127.0.0.1', 0))
+        port = srv.sockets[0].getsockname()[1]
+        response = loop.run_until_complete(request(port))
+        srv.close()
+        loop.run_until_complete(srv.wait_closed())
+    finally:
+        loop.close()
+    assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert response.count(b'HTTP/1.1 200 OK') == 2
+    assert response.endswith(b'{"projects": ["test"]}')
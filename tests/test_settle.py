@@ -0,0 +1,114 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import settle, summary
+
+
+def check_settled(user_balances, transfers, left):
+    result = dict(user_balances)
+    for debtor, creditor, amount in transfers:
+        assert amount > 0
+        result[debtor] += amount
+        result[creditor] -= amount
+    for user, balance in result.items():
+        assert abs(balance - left.get(user, 0.0)) < 0.01
+
+
+def test_balances():
+    assert settle.balances(['Alice', 'Bob'], [10.0, 5.0]) == \
+        {'Alice': 2.5, 'Bob': -2.5}
+    assert settle.balances(['Alice', 'Bob'], [10.0, 5.0], 100) == \
+        {'Alice': -40.0, 'Bob': -45.0}
+    assert settle.balances(['Alice', 'Bob'], []) == {'Alice': 0.0,
+                                                     'Bob': 0.0}
+    assert settle.balances([], []) == {}
+
+
+def test_settle():
+    user_balances = {'Alice': 30.0, 'Bob': -10.0, 'Carol': -15.0,
+                     'Dave': -5.0, 'Eve': 0.001}
+    transfers, left = settle.settle(user_balances)
+    assert transfers[0] == ('Carol', 'Alice', 15.0)
+    assert len(transfers) == 3
+    assert left == {}
+    check_settled(user_balances, transfers, left)
+
+
+def test_settle_not_balanced():
+    user_balances = settle.balances(['Alice', 'Bob', 'Carol'],
+                                    [50.0, 20.0, 0.0], 120)
+    transfers, left = settle.settle(user_balances)
+    assert transfers == [('Carol', 'Alice', 10.0)]
+    assert left == {'Bob': -20.0, 'Carol': -30.0}
+    check_settled(user_balances, transfers, left)
+
+
+def test_merge_balances():
+    merged = settle.merge_balances([{'Alice': 5.0, 'Bob': -5.0},
+                                    {'Bob': 2.0, 'Carol': -2.0}])
+    assert merged == {'Alice': 5.0, 'Bob': -3.0, 'Carol': -2.0}
+    transfers, left = settle.settle(merged)
+    assert sorted(transfers) == [('Bob', 'Alice', 3.0),
+                                 ('Carol', 'Alice', 2.0)]
+
+
+def test_settle_all_projects(tmpdir):
+    fixture = os.path.join('tests', 'fixtures', 'project1.csv')
+    shutil.copy(fixture, str(tmpdir.join('first.csv')))
+    tmpdir.join('second.csv').write('Description,Date,Bob,Carol\n'
+                                    'x,2016-01-01,6.0,\n')
+    with patch('srmlf.project.DATA_DIR', str(tmpdir)):
+        summaries = summary.summarize_all(['first', 'second'], 1)
+    merged = settle.merge_balances(
+        settle.balances(s['users'], s['contribs'], s['total'])
+        for s in summaries)
+    assert merged == {'Alice': 2.5, 'Bob': 0.5, 'Carol': -3.0}
+    transfers, left = settle.settle_all(summaries)
+    assert transfers == [('Carol', 'Alice', 2.5), ('Carol', 'Bob', 0.5)]
+    assert left == {}
+
+
+def test_target_balances():
+    assert settle.target_balances(['Alice', 'Bob'], [10.0, 5.0], 100) == \
+        {'Alice': -42.5, 'Bob': -42.5}
+    assert settle.target_balances(['Alice', 'Bob'], [10.0, 5.0]) == {}
+
+
+def test_settle_all_targets():
+    summaries = [
+        {'name': 'proj', 'users': ['Alice', 'Bob'], 'contribs': [10.0, 5.0],
+         'total': None, 'error': None},
+        {'name': 'trip', 'users': ['Alice', 'Bob'], 'contribs': [],
+         'total': 100, 'error': None},
+        {'name': 'broken', 'users': [], 'contribs': [], 'total': None,
+         'error': 'Invalid CSV fieldnames'}]
+    transfers, left = settle.settle_all(summaries)
+    # the debt of Bob to Alice is not cancelled by the trip Alice owes
+    assert transfers == [('Bob', 'Alice', 2.5)]
+    assert left == {'Alice': -50.0, 'Bob': -50.0}
+
+
+def test_format_transfers():
+    with patch('srmlf.settle.colored', side_effect=lambda v, *a, **k: v), \
+            patch('locale.currency', side_effect='{:.2f}'.format):
+        table = settle.format_transfers([('Bob', 'Alice', 2.5)],
+                                        {'Carol': -1.0})
+    lines = str(table).splitlines()
+    assert 'Bob' in lines[3] and 'Alice' in lines[3] and '2.50' in lines[3]
+    assert 'Carol' in lines[4] and '1.00' in lines[4]
+
+
+@pytest.mark.parametrize('users', [2, 10, 100])
+def test_settle_random(users):
+    import random
+    rng = random.Random(users)
+    names = ['user{}'.format(i) for i in range(users)]
+    user_balances = settle.balances(
+        names, [round(rng.uniform(0, 100), 2) for _ in names])
+    transfers, left = settle.settle(user_balances)
+    assert len(transfers) < users
+    assert left == {}
+    check_settled(user_balances, transfers, left)
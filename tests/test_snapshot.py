@@ -0,0 +1,101 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+from srmlf import project, snapshot
+from srmlf.columns import ColumnStore
+
+
+def append(data_dir, line):
+    with open(str(data_dir.join('test.csv')), 'a') as fd:
+        fd.write(line)
+
+
+def test_snapshot_path():
+    assert snapshot.snapshot_path('/data/test.csv') == \
+        '/data/.test.csv.snapshot'
+
+
+def test_write_read(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    tmpdir.join('test.csv').write('x')
+    store = ColumnStore(['Description', 'Date', 'Alice'])
+    store.append({'Description': 'Café', 'Date': datetime(2016, 1, 21),
+                  'Alice': 1.5})
+    store.add_column('Bob')
+    store.append({'Description': '', 'Date': datetime(2016, 1, 20),
+                  'Bob': 2.0})
+    snapshot.write(path, store, os.stat(path))
+    fieldnames = ['Description', 'Date', 'Alice', 'Bob']
+    mapped = snapshot.read(path, fieldnames)
+    assert isinstance(mapped.dates, memoryview)
+    assert list(mapped) == list(store)
+    assert not mapped.sorted
+    assert mapped.column_sums(['Alice', 'Bob']) == [1.5, 2.0]
+    assert mapped.descriptions[0] == 'Café'
+    assert snapshot.read(path, ['Description', 'Date', 'Alice']) is None
+
+
+def test_read_invalid(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    tmpdir.join('test.csv').write('x')
+    assert snapshot.read(path, []) is None
+    tmpdir.join('.test.csv.snapshot').write('')
+    assert snapshot.read(path, []) is None
+    tmpdir.join('.test.csv.snapshot').write('nope' * 10)
+    assert snapshot.read(path, []) is None
+
+
+def test_project_snapshot(snapshot_dir):
+    p = project.Project('test')
+    assert snapshot_dir.join('.test.csv.snapshot').check()
+    assert not isinstance(p.data.dates, memoryview)
+    with patch('srmlf.columns.ColumnStore.extend_csv') as extend_csv:
+        p = project.Project('test')
+        assert not extend_csv.called
+    assert isinstance(p.data.dates, memoryview)
+    assert p.get_total_contribs() == [10.0, 5.0]
+    assert p.data[1]['Description'] == 'Second contribution'
+    assert list(r['Description'] for r in p.select_rows(last=1)) == \
+        ['Second contribution']
+
+
+def test_project_snapshot_stale(snapshot_dir):
+    project.Project('test')
+    append(snapshot_dir, 'Third,2016-01-23,1.0,\n')
+    p = project.Project('test')
+    assert len(p.data) == 3
+    assert p.get_total_contribs() == [11.0, 5.0]
+    p = project.Project('test')
+    assert isinstance(p.data.dates, memoryview)
+    assert len(p.data) == 3
+
+
+def test_project_snapshot_changes(snapshot_dir):
+    p = project.Project('test')
+    p = project.Project('test')
+    p.add_contribs('Third', [('Carol', 3.0)], datetime(2016, 1, 23))
+    assert not isinstance(p.data.dates, memoryview)
+    p.save()
+    p = project.Project('test')
+    assert isinstance(p.data.dates, memoryview)
+    assert p.get_total_contribs() == [10.0, 5.0, 3.0]
+    assert p.data[2]['Carol'] == 3.0
+
+
+def test_lazy_project_snapshot(snapshot_dir):
+    project.Project('test')
+    p = project.Project('test', lazy=True)
+    p.add_contribs('Third', [('Carol', 3.0)], datetime(2016, 1, 23))
+    rows = list(p.iter_data())
+    assert [r['Carol'] for r in rows] == [0.0, 0.0, 3.0]
+    p.save(append=True)
+    p.load()
+    assert p.get_total_contribs() == [10.0, 5.0, 3.0]
+    assert isinstance(project.Project('test').data.dates, memoryview)
+
+
+def test_no_snapshot(snapshot_dir):
+    with patch('srmlf.project.Project.snapshot', False):
+        project.Project('test').save()
+    assert not snapshot_dir.join('.test.csv.snapshot').check()
@@ -0,0 +1,87 @@
+import argparse
+from datetime import datetime
+
+import pytest
+
+from srmlf.exceptions import SRMLFException
+from srmlf.project import Project
+from srmlf.srmlf import build_parser, valid_date, valid_user_contrib
+
+
+def run(*argv):
+    args = build_parser().parse_args(list(argv))
+    args.func(args)
+
+
+@pytest.mark.parametrize('output', ['csv', 'tsv', 'jsonl'])
+def test_view_totals_only_raw(data_dir, output):
+    with pytest.raises(SRMLFException):
+        run('view', 'test', '--totals-only', '-o', output)
+
+
+def test_view_totals_only(data_dir, dollars, capsys):
+    run('view', 'test', '--totals-only', '--no-color')
+    out = capsys.readouterr()[0]
+    assert 'TOTAL' in out
+    assert 'First contribution' not in out
+
+
+@pytest.fixture
+def long_project(data_dir):
+    p = Project('test')
+    for i in range(60):
+        p.add_contribs('Row {}'.format(i), [('Alice', 1)])
+    p.save()
+    return p
+
+
+def test_view_last_not_paginated(long_project, capsys):
+    run('view', 'test', '--last', '100', '-o', 'csv')
+    lines = capsys.readouterr()[0].splitlines()
+    assert len(lines) == 63
+    assert lines[-1].startswith('Row 59,')
+
+
+@pytest.mark.parametrize('argv,rows', [
+    (['--page', '2'], ['Row 48', 'Row 59']),
+    (['--page-size', '10'], ['First contribution', 'Row 7']),
+    (['--page', '2', '--page-size', '10'], ['Row 8', 'Row 17']),
+])
+def test_view_paginated(long_project, capsys, argv, rows):
+    run('view', 'test', '-o', 'csv', *argv)
+    lines = capsys.readouterr()[0].splitlines()
+    assert [lines[1].split(',')[0], lines[-1].split(',')[0]] == rows
+
+
+@pytest.mark.parametrize('contrib', ['Currency:5', 'Date:1', 'Alice'])
+def test_invalid_user_contrib(contrib):
+    with pytest.raises(argparse.ArgumentTypeError):
+        valid_user_contrib(contrib)
+
+
+def test_add_meta_field(data_dir):
+    with pytest.raises(SystemExit):
+        run('add', 'test', 'x', 'Alice:1', 'Currency:5')
+    assert data_dir.join('test.csv').read().splitlines()[0] == \
+        'Description,Date,Alice,Bob'
+
+
+def test_edit_options_anywhere(data_dir):
+    run('edit', 'test', '2', '-a', 'Bob:9', '-l', 'Changed', '--amount',
+        'Alice:1')
+    line = Project('test').data[1]
+    assert (line['Description'], line['Alice'], line['Bob']) == \
+        ('Changed', 1.0, 9.0)
+
+
+def test_valid_date_iso():
+    assert valid_date('2016-01-19') == datetime(2016, 1, 19)
+    with pytest.raises(argparse.ArgumentTypeError):
+        valid_date('2016-13-19')
+
+
+def test_view_since_iso(data_dir, capsys):
+    run('view', 'test', '--since', '2016-01-22', '-o', 'csv')
+    lines = capsys.readouterr()[0].splitlines()
+    assert [line.split(',')[0] for line in lines[1:]] == \
+        ['Second contribution']
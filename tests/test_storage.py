@@ -0,0 +1,131 @@
+from datetime import datetime
+
+import pytest
+
+from srmlf import project, storage
+from srmlf.exceptions import \
+    ProjectNotFoundException, ProjectDuplicateException
+
+
+@pytest.fixture
+def sqlite_project(empty_data_dir):
+    p = storage.SQLiteProject.create('test', ['Alice', 'Bob'])
+    p.add_contribs('First contribution', [('Alice', 10)],
+                   datetime(2016, 1, 21))
+    p.add_contribs('Second contribution', [('Bob', 5)],
+                   datetime(2016, 1, 22))
+    p.save()
+    return p
+
+
+def test_get_backend():
+    assert storage.get_backend('csv') is project.Project
+    assert storage.get_backend('sqlite') is storage.SQLiteProject
+
+
+def test_create(empty_data_dir):
+    p = storage.SQLiteProject.create('test', ['Alice', 'Bob'], 100)
+    assert empty_data_dir.join(storage.DATABASE_FILENAME).check()
+    assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob']
+    assert p.total == 100
+    assert len(p.data) == 0
+    with pytest.raises(ProjectDuplicateException):
+        storage.SQLiteProject.create('test', ['Alice'])
+
+
+def test_not_found(empty_data_dir):
+    with pytest.raises(ProjectNotFoundException):
+        storage.SQLiteProject('test')
+
+
+def test_load(sqlite_project):
+    p = storage.SQLiteProject('test')
+    assert p.loaded
+    assert p.total is None
+    assert len(p.data) == 2
+    assert p.data[0]['Description'] == 'First contribution'
+    assert p.data[0]['Date'] == datetime(2016, 1, 21)
+    assert p.data[1]['Bob'] == 5.0
+    assert p.get_total_contribs() == [10.0, 5.0]
+
+
+def test_lazy(sqlite_project):
+    p = storage.SQLiteProject('test', lazy=True)
+    assert not p.loaded
+    assert p.get_total_contribs() == [10.0, 5.0]
+    p.add_contribs('Third', [('Carol', 2), ('Alice', 1)],
+                   datetime(2016, 1, 23))
+    assert p.get_total_contribs() == [11.0, 5.0, 2.0]
+    assert [r['Description'] for r in p.iter_data()] == \
+        ['First contribution', 'Second contribution', 'Third']
+    p.save(append=True)
+    assert not p.loaded
+
+    p = storage.SQLiteProject('test', lazy=True)
+    assert p.fieldnames == ['Description', 'Date', 'Alice', 'Bob', 'Carol']
+    assert p.get_total_contribs() == [11.0, 5.0, 2.0]
+    p.load()
+    assert p.data[0]['Carol'] == 0.0
+    assert p.data[2]['Carol'] == 2.0
+
+
+def test_lazy_load_after_save(sqlite_project):
+    p = storage.SQLiteProject('test', lazy=True)
+    p.add_contribs('Third', [('Alice', 1)], datetime(2016, 1, 23))
+    p.save()
+    p.load()
+    assert len(p.data) == 3
+    assert p.get_total_contribs() == [11.0, 5.0]
+
+
+def test_lazy_repeated_saves(sqlite_project):
+    descriptions = ['First contribution', 'Second contribution', 'Row 0',
+                    'Row 1', 'Row 2', 'Unsaved']
+    p = storage.SQLiteProject('test', lazy=True)
+    for i in range(3):
+        p.add_contribs('Row {}'.format(i), [('Alice', 1)],
+                       datetime(2016, 1, 23))
+        p.save()
+    p.add_contribs('Unsaved', [('Bob', 2)], datetime(2016, 1, 24))
+    assert [line['Description'] for line in p.iter_data()] == descriptions
+    assert p.get_total_contribs() == [13.0, 7.0]
+    assert sum(map(sum, p.get_daily_contribs().values())) == 20.0
+    p.load()
+    assert [line['Description'] for line in p.iter_data()] == descriptions
+    assert p.get_total_contribs() == [13.0, 7.0]
+    p.save()
+    assert storage.SQLiteProject('test').get_total_contribs() == [13.0, 7.0]
+
+
+def test_list_projects(empty_data_dir):
+    assert storage.SQLiteProject.list_projects() == []
+    storage.SQLiteProject.create('b', ['Alice'])
+    storage.SQLiteProject.create('a', ['Alice'])
+    assert storage.SQLiteProject.list_projects() == ['a', 'b']
+
+
+def test_get_daily_contribs(sqlite_project):
+    p = storage.SQLiteProject('test', lazy=True)
+    p.add_contribs('Third', [('Alice', 1), ('Carol', 2)],
+                   datetime(2016, 1, 22))
+    day = datetime(2016, 1, 22).toordinal()
+    expected = {day - 1: [10.0, 0.0, 0.0], day: [1.0, 5.0, 2.0]}
+    assert p.get_daily_contribs() == expected
+    p.load()
+    assert p.get_daily_contribs() == expected
+
+
+def test_edit_delete_row(sqlite_project):
+    p = storage.SQLiteProject('test', lazy=True)
+    p.edit_row(2, 'Changed', contribs=[('Carol', 1)])
+    p.delete_row(1)
+    p = storage.SQLiteProject('test')
+    assert p.users == ['Alice', 'Bob', 'Carol']
+    assert [line['Description'] for line in p.data] == ['Changed']
+    assert p.get_total_contribs() == [0.0, 5.0, 1.0]
+
+
+def test_currency_unsupported(sqlite_project):
+    from srmlf.exceptions import SRMLFException
+    with pytest.raises(SRMLFException):
+        sqlite_project.add_contribs('Hotel', [('Alice', 10, 'USD')])
@@ -0,0 +1,48 @@
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from srmlf import summary
+
+
+@pytest.fixture
+def projects(data_dir):
+    shutil.copy(str(data_dir.join('test.csv')),
+                str(data_dir.join('second_(100).csv')))
+    data_dir.join('broken.csv').write('nope\n')
+    data_dir.join('.test.csv.totals').write('{}')
+    return data_dir
+
+
+def test_summarize(projects):
+    s = summary.summarize('second')
+    assert s['error'] is None
+    assert s['users'] == ['Alice', 'Bob']
+    assert s['contribs'] == [10.0, 5.0]
+    assert s['sum'] == 15.0
+    assert s['total'] == 100.0
+    assert summary.summarize('broken')['error'] is not None
+    assert summary.summarize('nope')['error'] is not None
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_summarize_all(projects, jobs):
+    summaries = summary.summarize_all(['test', 'second'], jobs)
+    assert [s['name'] for s in summaries] == ['test', 'second']
+    assert [s['sum'] for s in summaries] == [15.0, 15.0]
+    assert summaries[0]['total'] is None
+
+
+def test_format_summary(projects):
+    summaries = summary.summarize_all(['broken', 'test', 'second'], 1)
+    with patch('srmlf.summary.colored', side_effect=lambda v, *a, **k: v):
+        with patch('locale.currency', side_effect=str):
+            with patch('prettytable.PrettyTable') as pt:
+                table = summary.format_summary(summaries)
+                assert table.add_row.call_count == 4
+                table.add_row.assert_any_call(['second', 2, '15.0', '100.0',
+                                               '15.00%'])
+                table.add_row.assert_any_call(['test', 2, '15.0', '', ''])
+                table.add_row.assert_any_call(['', 'TOTAL', '30.0', '', ''])
+                assert pt.call_count == 1
@@ -0,0 +1,140 @@
+import argparse
+import pstats
+from unittest.mock import Mock, patch
+
+import pytest
+
+from srmlf import project, srmlf, timings
+
+
+@pytest.fixture
+def hook():
+    hook = Mock()
+    project.Project.add_hook(hook)
+    yield hook
+    project.Project.remove_hook(hook)
+
+
+def phases(hook):
+    return [c[0][0] for c in hook.call_args_list]
+
+
+def test_hooks(data_dir, hook):
+    p = project.Project('test', lazy=True)
+    assert phases(hook) == ['resolve', 'parse']
+    p.add_contribs('Third', [('Carol', 1)])
+    p.get_total_contribs()
+    p.save(append=True)
+    assert phases(hook)[2:] == ['add_user', 'totals', 'save']
+    name, duration, peak = hook.call_args[0]
+    assert duration >= 0
+    assert peak is None
+
+
+def test_hooks_prettify(data_dir, hook):
+    p = project.Project('test')
+    with patch('locale.currency', side_effect=str):
+        str(p)
+    assert phases(hook) == ['resolve', 'parse', 'format', 'totals',
+                            'render']
+
+
+def test_hooks_memory(data_dir, hook):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        project.Project('test')
+    finally:
+        tracemalloc.stop()
+    assert hook.call_args[0][2] > 0
+
+
+def test_nested_phases(data_dir, hook):
+    p = project.Project('test')
+    with patch('time.perf_counter', side_effect=[0.0, 1.0, 3.0, 7.0]):
+        with p.phase('outer'), p.phase('inner'):
+            pass
+    assert [c[0][:2] for c in hook.call_args_list[-2:]] == \
+        [('inner', 2.0), ('outer', 5.0)]
+
+
+def test_nested_phases_memory(data_dir, hook):
+    import tracemalloc
+    p = project.Project('test')
+    tracemalloc.start()
+    try:
+        with p.phase('outer'):
+            data = bytearray(1 << 20)
+            del data
+            with p.phase('inner'):
+                pass
+    finally:
+        tracemalloc.stop()
+    assert hook.call_args[0][0] == 'outer'
+    assert hook.call_args[0][2] >= 1 << 20
+
+
+def test_no_hooks(data_dir):
+    p = project.Project('test')
+    with patch('time.perf_counter') as perf_counter:
+        p.get_total_contribs()
+        assert not perf_counter.called
+
+
+def test_timings():
+    t = timings.Timings()
+    t('parse', 0.5, None)
+    t('parse', 0.25, 2048)
+    t('save', 0.125, 1024)
+    assert t.phases['parse'] == (2, 0.75, 2048)
+    lines = t.format(1.0, 512).splitlines()
+    assert lines[1].split() == ['parse', '2', '0.7500s', '2.0', 'KiB']
+    assert lines[-1].split() == ['total', '1.0000s', '2.0', 'KiB']
+
+
+def test_timings_without_memory():
+    t = timings.Timings()
+    t('parse', 0.5, None)
+    lines = t.format(1.0).splitlines()
+    assert lines[0].split() == ['Phase', 'Calls', 'Time']
+    assert lines[-1].split() == ['total', '1.0000s']
+
+
+def test_format_size():
+    assert timings.format_size(None) == ''
+    assert timings.format_size(10) == '10.0 B'
+    assert timings.format_size(3 * 1024 ** 2) == '3.0 MiB'
+    assert timings.format_size(5 * 1024 ** 3) == '5.0 GiB'
+
+
+def test_run_command(data_dir, capsys):
+    import tracemalloc
+    prof = str(data_dir.join('out.prof'))
+    tracing = []
+
+    def func(args):
+        tracing.append(tracemalloc.is_tracing())
+        project.Project('test').get_total_contribs()
+    args = argparse.Namespace(func=func, timings=True, memory=False,
+                              profile=prof)
+    srmlf.run_command(args)
+    err = capsys.readouterr()[1]
+    assert 'parse' in err
+    assert 'total' in err
+    assert 'Peak memory' not in err
+    assert tracing == [False]
+    assert pstats.Stats(prof).total_calls > 0
+    assert project.Project.hooks == []
+
+
+def test_run_command_memory(data_dir, capsys):
+    import tracemalloc
+    args = argparse.Namespace(
+        func=lambda args: project.Project('test').get_total_contribs(),
+        timings=False, memory=True, profile=None)
+    srmlf.run_command(args)
+    err = capsys.readouterr()[1]
+    assert 'Peak memory' in err
+    assert 'parse' in err
+    assert not tracemalloc.is_tracing()
+    assert project.Project.hooks == []
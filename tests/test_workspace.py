@@ -0,0 +1,132 @@
+import os
+import shutil
+from datetime import datetime
+
+import pytest
+
+from srmlf import project, storage
+from srmlf.exceptions import ProjectNotFoundException
+from srmlf.workspace import ProjectCache, Workspace
+
+
+@pytest.fixture
+def workspace(tmpdir):
+    fixture = os.path.join('tests', 'fixtures', 'project1.csv')
+    shutil.copy(fixture, str(tmpdir.join('test.csv')))
+    return Workspace(str(tmpdir))
+
+
+def test_data_dir(tmpdir):
+    p = project.Project.create('test', ['Alice'], data_dir=str(tmpdir))
+    assert p.data_dir == str(tmpdir)
+    assert tmpdir.join('test.csv').check()
+    assert project.Project.list_projects(str(tmpdir)) == ['test']
+    with pytest.raises(ProjectNotFoundException):
+        project.Project('test')
+
+
+def test_projects(workspace):
+    assert workspace.projects() == ['test']
+    result = workspace.create('other', ['Alice', 'Bob'], 100)
+    assert result['total'] == 100
+    assert result['totals'] == {}
+    assert workspace.projects() == ['other', 'test']
+
+
+def test_create_directory(tmpdir):
+    workspace = Workspace(str(tmpdir.join('new')), create=True)
+    assert workspace.projects() == []
+    assert tmpdir.join('new').check(dir=True)
+
+
+def test_totals(workspace):
+    result = workspace.totals('test')
+    assert result['name'] == 'test'
+    assert result['totals'] == {'Alice': 10.0, 'Bob': 5.0}
+    assert list(result['shares']) == ['Alice', 'Bob']
+    with pytest.raises(ProjectNotFoundException):
+        workspace.totals('nope')
+
+
+def test_add(workspace):
+    result = workspace.add('test', 'Third', {'Carol': 3},
+                           datetime(2016, 1, 23))
+    assert result['totals'] == {'Alice': 10.0, 'Bob': 5.0, 'Carol': 3.0}
+    workspace.add('test', 'Fourth', [('Alice', 1)])
+    p = project.Project('test', data_dir=workspace.data_dir)
+    assert p.get_total_contribs() == [11.0, 5.0, 3.0]
+
+
+def test_view(workspace):
+    result = workspace.view('test')
+    assert result['fieldnames'] == ['Description', 'Date', 'Alice', 'Bob']
+    assert result['rows'][0] == {'Description': 'First contribution',
+                                 'Date': '2016-01-21', 'Alice': 10.0,
+                                 'Bob': 0.0}
+    result = workspace.view('test', last=1)
+    assert [r['Description'] for r in result['rows']] == \
+        ['Second contribution']
+    assert result['totals'] == {'Alice': 10.0, 'Bob': 5.0}
+    result = workspace.view('test', since=datetime(2016, 1, 23))
+    assert result['rows'] == []
+
+
+def test_report(workspace):
+    periods = workspace.report('test', 'year')
+    assert periods == [{'period': '2016',
+                        'totals': {'Alice': 10.0, 'Bob': 5.0},
+                        'cumulative': {'Alice': 10.0, 'Bob': 5.0},
+                        'balances': {'Alice': 2.5, 'Bob': -2.5}}]
+
+
+def test_settle(workspace):
+    assert workspace.settle('test') == {
+        'transfers': [{'from': 'Bob', 'to': 'Alice', 'amount': 2.5}],
+        'left': {}}
+    workspace.create('other', ['Alice', 'Bob'])
+    workspace.add('other', 'x', {'Bob': 5})
+    assert workspace.settle()['transfers'] == []
+
+
+def test_summary(workspace):
+    summaries = workspace.summary()
+    assert [s['sum'] for s in summaries] == [15.0]
+
+
+def test_reuse(workspace):
+    p = workspace.project('test')
+    assert workspace.project('test') is p
+    other = project.Project('test', lazy=True, data_dir=workspace.data_dir)
+    other.add_contribs('External', [('Bob', 10)])
+    other.save(append=True)
+    assert workspace.project('test') is not p
+    assert workspace.totals('test')['totals']['Bob'] == 15.0
+
+
+def test_cache_size(workspace):
+    shutil.copy(os.path.join(workspace.data_dir, 'test.csv'),
+                os.path.join(workspace.data_dir, 'b.csv'))
+    cache = ProjectCache(lambda name: project.Project(
+        name, data_dir=workspace.data_dir), size=1)
+    cache.get('test')
+    cache.get('b')
+    assert list(cache.entries) == ['b']
+
+
+def test_sqlite(tmpdir):
+    workspace = Workspace(str(tmpdir), storage='sqlite')
+    workspace.create('test', ['Alice'])
+    workspace.add('test', 'First', {'Alice': 4})
+    assert workspace.totals('test')['totals'] == {'Alice': 4.0}
+    assert storage.SQLiteProject.list_projects(str(tmpdir)) == ['test']
+    assert workspace.projects() == ['test']
+
+
+def test_parallel_workspaces(tmpdir):
+    first = Workspace(str(tmpdir.join('a')), create=True)
+    second = Workspace(str(tmpdir.join('b')), create=True)
+    first.create('test', ['Alice'])
+    second.create('test', ['Bob'])
+    first.add('test', 'x', {'Alice': 1})
+    assert first.totals('test')['totals'] == {'Alice': 1.0}
+    assert second.totals('test')['totals'] == {}